@@ -4,8 +4,12 @@ import threading
 import subprocess
 import requests
 import json
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from flask import Flask, request, render_template_string, redirect, url_for, Response
-from prometheus_client import Gauge, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import Counter, Gauge, generate_latest, CONTENT_TYPE_LATEST
 from dotenv import load_dotenv
 
 # Load .env file into environment
@@ -17,6 +21,10 @@ _zones_env = os.getenv('ELECTRICITYMAP_ZONES', 'AT,TR,SK,US-CENT-SWPP')
 ZONES = [z.strip() for z in _zones_env.split(',') if z.strip()] if _zones_env else ['AT']
 
 REQUEST_TIMEOUT = int(os.getenv('REQUEST_TIMEOUT_SECONDS', '10'))
+CONNECT_TIMEOUT = float(os.getenv('CONNECT_TIMEOUT_SECONDS', '3'))
+FETCH_RETRIES = int(os.getenv('FETCH_RETRIES', '2'))
+FETCH_BACKOFF = float(os.getenv('FETCH_BACKOFF_SECONDS', '0.5'))
+FETCH_WORKERS = int(os.getenv('FETCH_WORKERS', '0')) or min(32, max(1, len(ZONES)))
 FETCH_INTERVAL_SECONDS = int(os.getenv('FETCH_INTERVAL_SECONDS', '3600'))
 PORT = int(os.getenv('EXPORTER_PORT', '9091'))
 
@@ -25,6 +33,13 @@ MAX_CI = float(os.getenv('MAX_CI')) if os.getenv('MAX_CI') else 200
 CHOOSER_COOLDOWN_SECONDS = int(os.getenv('CHOOSER_COOLDOWN_SECONDS', 0))
 CHOOSER_PATH = os.getenv('CHOOSER_PATH', 'monitoring/choose_green_region.py')
 
+# Upstream publishes one reading per zone and hour; a cached reading is kept
+# until the next one is due (reading time + cadence + grace).
+CACHE_CADENCE_SECONDS = int(os.getenv('CACHE_CADENCE_SECONDS', '3600'))
+CACHE_GRACE_SECONDS = int(os.getenv('CACHE_GRACE_SECONDS', '120'))
+CACHE_RETRY_SECONDS = int(os.getenv('CACHE_RETRY_SECONDS', '300'))
+CACHE_SNAPSHOT = os.getenv('CACHE_SNAPSHOT', 'carbon_cache.json')
+
 # --- Global State ---
 # Stores the latest known data for display: { 'AT': {'value': 230, 'source': 'API', 'ts': 12345} }
 zone_state = {z: {'value': 0.0, 'source': 'Init', 'ts': 0} for z in ZONES}
@@ -32,8 +47,31 @@ zone_state = {z: {'value': 0.0, 'source': 'Init', 'ts': 0} for z in ZONES}
 overrides = {}
 _last_trigger_ts = 0
 
+# --- HTTP ---
+# One keep-alive session shared by all fetch workers; the adapter's connection
+# pool is thread-safe and sized to the worker count. Connection errors and
+# 429/5xx responses are retried with exponential backoff (Retry-After honoured).
+def make_session():
+    retry = Retry(
+        total=FETCH_RETRIES,
+        backoff_factor=FETCH_BACKOFF,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET']),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=FETCH_WORKERS, max_retries=retry)
+    session = requests.Session()
+    session.headers.update({"auth-token": TOKEN})
+    session.mount("https://", adapter)
+    return session
+
+SESSION = make_session()
+FETCH_POOL = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="fetch")
+
 # --- Prometheus Metrics ---
 CARBON_INTENSITY = Gauge('carbon_intensity_gCo2perkWh', 'Current carbon intensity (gCO2eq/kWh)', ['zone'])
+API_REQUESTS = Counter('carbon_api_requests_total', 'Requests sent to the Electricity Maps API', ['zone', 'result'])
+CACHE_HITS = Counter('carbon_cache_hits_total', 'Zone lookups answered from the cache', ['zone'])
 
 app = Flask(__name__)
 
@@ -94,8 +132,136 @@ def run_region_chooser():
     except Exception as e:
         print(f"[bridge] Failed to run chooser: {e}")
 
+def parse_reading_time(text):
+    """'2026-01-08T19:00:00.000Z' -> epoch seconds, None if missing/invalid."""
+    if not text:
+        return None
+    try:
+        return datetime.fromisoformat(text.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+def fetch_zone(zone):
+    """One API request. Returns (value, reading time or None) or None on failure."""
+    url = f"https://api.electricitymaps.com/v3/carbon-intensity/latest?zone={zone}"
+    try:
+        resp = SESSION.get(url, timeout=(CONNECT_TIMEOUT, REQUEST_TIMEOUT))
+        if resp.ok:
+            data = resp.json()
+            API_REQUESTS.labels(zone=zone, result='ok').inc()
+            return float(data.get('carbonIntensity', 0.0)), parse_reading_time(data.get('datetime'))
+        API_REQUESTS.labels(zone=zone, result='error').inc()
+        print(f"Failed to fetch {zone}: {resp.status_code}")
+    except Exception as e:
+        API_REQUESTS.labels(zone=zone, result='error').inc()
+        print(f"Error fetching {zone}: {e}")
+    return None
+
+class ZoneCache:
+    """Per-zone TTL cache in front of the API.
+
+    A reading stays valid until the upstream's next one is due. Concurrent
+    lookups of the same zone share one in-flight request. Failed refreshes
+    keep the last value (marked stale) and retry after CACHE_RETRY_SECONDS.
+    Every change is snapshotted to disk, so a restart starts warm.
+    """
+
+    def __init__(self, path, pool):
+        self.path = path
+        self.pool = pool
+        # zone -> {'value', 'source', 'ts', 'reading_ts', 'expires'}
+        self.entries = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+
+    def expiry(self, reading_ts, now):
+        if reading_ts is None:
+            return now + CACHE_CADENCE_SECONDS
+        expires = reading_ts + CACHE_CADENCE_SECONDS + CACHE_GRACE_SECONDS
+        # Reading is already overdue upstream: ask again soon, but not per lookup
+        return min(max(expires, now + CACHE_RETRY_SECONDS), now + CACHE_CADENCE_SECONDS)
+
+    def lookup(self, zone, force=False):
+        """Future resolving to the zone's entry (None if never fetched successfully)."""
+        with self._lock:
+            entry = self.entries.get(zone)
+            if entry is not None and not force and entry['expires'] > time.time():
+                CACHE_HITS.labels(zone=zone).inc()
+                future = Future()
+                future.set_result(entry)
+                return future
+            future = self._inflight.get(zone)
+            if future is None:
+                future = self._inflight[zone] = self.pool.submit(self._refresh, zone)
+            return future
+
+    def get(self, zone, force=False):
+        return self.lookup(zone, force).result()
+
+    def _refresh(self, zone):
+        result = fetch_zone(zone)
+        now = time.time()
+        with self._lock:
+            entry = self.entries.get(zone)
+            if result is not None:
+                value, reading_ts = result
+                entry = {'value': value, 'source': 'API', 'ts': now,
+                         'reading_ts': reading_ts, 'expires': self.expiry(reading_ts, now)}
+            elif entry is not None:
+                entry = dict(entry, source='API (stale)', expires=now + CACHE_RETRY_SECONDS)
+            if entry is not None:
+                self.entries[zone] = entry
+            del self._inflight[zone]
+        if entry is not None:
+            self.save()
+        return entry
+
+    def next_expiry(self, zones):
+        with self._lock:
+            times = [self.entries[z]['expires'] if z in self.entries else 0 for z in zones]
+        return min(times) if times else time.time() + CACHE_CADENCE_SECONDS
+
+    def save(self):
+        with self._lock:
+            data = dict(self.entries)
+        tmp = self.path + '.tmp'
+        with self._snapshot_lock:
+            try:
+                with open(tmp, 'w') as f:
+                    json.dump(data, f)
+                os.replace(tmp, self.path)
+            except OSError as e:
+                print(f"[bridge] Could not write cache snapshot {self.path}: {e}")
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError) as e:
+            print(f"[bridge] Ignoring cache snapshot {self.path}: {e}")
+            return 0
+        with self._lock:
+            for zone, entry in data.items():
+                self.entries[zone] = dict(entry, source='Snapshot')
+        return len(data)
+
+CACHE = ZoneCache(CACHE_SNAPSHOT, FETCH_POOL)
+
+def show_zone(zone, entry):
+    """Publishes a cache entry unless the zone is overridden; returns its value."""
+    if zone in overrides:
+        return overrides[zone]
+    if entry is None:
+        return None
+    CARBON_INTENSITY.labels(zone=zone).set(entry['value'])
+    zone_state[zone] = {'value': entry['value'], 'source': entry['source'], 'ts': entry['ts']}
+    return entry['value']
+
 def update_zone(zone):
-    """Updates a single zone based on override OR API."""
+    """Updates a single zone based on override OR cache/API."""
     # 1. Check for Manual Override
     if zone in overrides:
         val = overrides[zone]
@@ -103,37 +269,55 @@ def update_zone(zone):
         zone_state[zone] = {'value': val, 'source': 'Manual Override', 'ts': time.time()}
         return val
 
-    # 2. Fetch from API
-    url = f"https://api.electricitymaps.com/v3/carbon-intensity/latest?zone={zone}"
-    headers = {"auth-token": TOKEN}
-    try:
-        resp = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
-        if resp.ok:
-            data = resp.json()
-            val = float(data.get('carbonIntensity', 0.0))
-            CARBON_INTENSITY.labels(zone=zone).set(val)
-            zone_state[zone] = {'value': val, 'source': 'API', 'ts': time.time()}
-            return val
+    # 2. Cached reading, fetched from the API when due
+    return show_zone(zone, CACHE.get(zone))
+
+def update_all_zones():
+    """Updates all zones concurrently; a slow zone only delays itself.
+
+    Returns {zone: value} (overrides included) and the zones whose value came
+    from the API in this call.
+    """
+    start = time.time()
+    futures = {}
+    results, fetched = {}, set()
+    for zone in ZONES:
+        if zone in overrides:
+            results[zone] = update_zone(zone)
         else:
-            print(f"Failed to fetch {zone}: {resp.status_code}")
-    except Exception as e:
-        print(f"Error fetching {zone}: {e}")
-    return None
+            futures[zone] = CACHE.lookup(zone)
+    for zone, future in futures.items():
+        entry = future.result()
+        results[zone] = show_zone(zone, entry)
+        if entry is not None and entry['ts'] >= start:
+            fetched.add(zone)
+    if fetched:
+        print(f"[bridge] Refreshed {len(fetched)}/{len(futures)} zones in {time.time() - start:.2f}s")
+    return results, fetched
+
+def check_threshold(zone, ci, reason="CI"):
+    if zone == CURRENT_ZONE and ci is not None and ci > MAX_CI:
+        print(f"[bridge] {reason} for {zone}. Value {ci} > {MAX_CI}. Triggering...")
+        run_region_chooser()
 
 def background_loop():
     """Background thread to update data and check thresholds."""
-    print(f"[bridge] Background loop started. Interval: {FETCH_INTERVAL_SECONDS}s")
+    print(f"[bridge] Background loop started. Max interval: {FETCH_INTERVAL_SECONDS}s, workers: {FETCH_WORKERS}")
+    last_check = 0
     while True:
-        for zone in ZONES:
-            ci = update_zone(zone)
-            
-            # Trigger Logic
-            if zone == CURRENT_ZONE and ci is not None:
-                if ci > MAX_CI:
-                    print(f"[bridge] {zone} CI {ci} > {MAX_CI}. Triggering...")
-                    run_region_chooser()
-        
-        time.sleep(FETCH_INTERVAL_SECONDS)
+        results, fetched = update_all_zones()
+
+        # Trigger Logic: on every new reading, and at least once per
+        # FETCH_INTERVAL_SECONDS for cached or overridden values (the chooser
+        # has its own cooldown)
+        now = time.time()
+        if CURRENT_ZONE in fetched or now - last_check >= FETCH_INTERVAL_SECONDS:
+            check_threshold(CURRENT_ZONE, results.get(CURRENT_ZONE))
+            last_check = now
+
+        # Sleep until the next reading is due
+        due = CACHE.next_expiry([z for z in ZONES if z not in overrides])
+        time.sleep(min(max(due - time.time(), 5), FETCH_INTERVAL_SECONDS))
 
 # --- Flask Web Interface ---
 
@@ -215,20 +399,17 @@ def override():
     if zone:
         if action == 'clear' and zone in overrides:
             del overrides[zone]
-            
-            # --- FIX STARTS HERE ---
-            # Define a small wrapper to update AND check the threshold
-            def reset_and_check(z):
-                # 1. Fetch real value from API
-                val = update_zone(z)
-                # 2. Check trigger immediately
+
+            # Restore the cached API value; fetched in the pool (shared with
+            # the background loop) only if due, so the page reloads instantly.
+            # The chooser is a subprocess: run it on its own thread, not on a
+            # fetch worker
+            def restore(future, z=zone):
+                val = show_zone(z, future.result())
                 if z == CURRENT_ZONE and val is not None and val > MAX_CI:
-                    print(f"[bridge] API restored for {z}. Value {val} > {MAX_CI}. Triggering...")
-                    run_region_chooser()
+                    threading.Thread(target=check_threshold, args=(z, val, "API restored"), daemon=True).start()
 
-            # Run this in a thread so the web page reloads instantly
-            threading.Thread(target=reset_and_check, args=(zone,)).start()
-            # --- FIX ENDS HERE ---
+            CACHE.lookup(zone).add_done_callback(restore)
 
         elif action == 'set':
             try:
@@ -250,6 +431,13 @@ def metrics():
     return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
 
 if __name__ == '__main__':
+    # Resume with the last known readings
+    loaded = CACHE.load()
+    if loaded:
+        print(f"[bridge] Loaded {loaded} cached zones from {CACHE_SNAPSHOT}")
+        for z in ZONES:
+            show_zone(z, CACHE.entries.get(z))
+
     # Start the background data fetcher
     t = threading.Thread(target=background_loop, daemon=True)
     t.start()
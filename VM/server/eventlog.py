@@ -0,0 +1,323 @@
+import os
+import mmap
+import struct
+import threading
+import time
+import zlib
+
+import numpy as np
+
+# ------------------------
+# Dauerhaftes, segmentiertes Event-Log des Servers
+#
+# Jede Kafka-Nachricht wird unverändert (Rohbytes + Content-Type) in
+# EVENTLOG_DIR/log-<id>.seg angehängt, batchweise mit fsync. Erst danach
+# werden die Kafka-Offsets committet. Beim Start baut replay() den
+# In-Memory-Store aus dem lokalen Log wieder auf, statt das Topic neu zu lesen.
+#
+# Record:   <I len> <I crc32> <d ts> <H devlen> <H ctlen> device content_type value
+# Index:    log-<id>.idx, je Record <d ts> <Q offset> <H devlen> device
+#           -> pro Segment und Gerät sortierbare Zeit-Indizes für read()
+#
+# Ein abgerissener letzter Record (Crash mitten im Schreiben) wird beim Start
+# abgeschnitten, der Index des Segments dann neu aufgebaut. Schlägt das
+# Schreiben eines Batches fehl (ENOSPC, EIO), werden Segment und Index auf den
+# Stand vor dem Batch gekürzt; Größe und Index im Speicher werden erst nach
+# erfolgreichem fsync übernommen. Segmente, deren
+# jüngstes Event älter als EVENTLOG_RETENTION_SECONDS ist, werden gelöscht.
+
+_RECORD = struct.Struct("<II")
+_HEAD = struct.Struct("<dHH")
+_INDEX = struct.Struct("<dQH")
+
+
+class Segment:
+    def __init__(self, seg_id, path, index_path):
+        self.seg_id = seg_id
+        self.path = path
+        self.index_path = index_path
+        self.size = 0
+        self.records = 0
+        self.min_ts = None
+        self.max_ts = None
+        self._index = None  # device -> (ts array, offset array), lazy
+
+    def note(self, ts):
+        self.records += 1
+        self.min_ts = ts if self.min_ts is None else min(self.min_ts, ts)
+        self.max_ts = ts if self.max_ts is None else max(self.max_ts, ts)
+
+    def device_index(self):
+        """Load the sidecar index: device -> (sorted ts, offsets)."""
+        if self._index is not None:
+            return self._index
+        entries = {}
+        with open(self.index_path, "rb") as f:
+            data = f.read()
+        pos = 0
+        while pos + _INDEX.size <= len(data):
+            ts, offset, dev_len = _INDEX.unpack_from(data, pos)
+            pos += _INDEX.size
+            device = data[pos:pos + dev_len].decode("utf-8")
+            pos += dev_len
+            entries.setdefault(device, ([], []))
+            entries[device][0].append(ts)
+            entries[device][1].append(offset)
+        index = {}
+        for device, (ts, offsets) in entries.items():
+            ts, offsets = np.asarray(ts, np.float64), np.asarray(offsets, np.uint64)
+            order = np.argsort(ts, kind="stable")
+            index[device] = (ts[order], offsets[order])
+        self._index = index
+        return index
+
+
+class EventLog:
+    def __init__(self, directory, segment_bytes=64 * 1024 * 1024, retention_seconds=7 * 24 * 3600, fsync=True):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.retention_seconds = retention_seconds
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        self._segments = {}
+        for name in sorted(os.listdir(directory)):
+            if name.startswith("log-") and name.endswith(".seg"):
+                seg_id = int(name[4:-4])
+                self._segments[seg_id] = self._recover(seg_id)
+
+        self._active = self._segments[max(self._segments)] if self._segments else None
+        if self._active is None:
+            self._active = self._new_segment(0)
+        self._writer = open(self._active.path, "ab")
+        self._index_writer = open(self._active.index_path, "ab")
+        self.appended = 0
+        self.batches = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            os.getenv("EVENTLOG_DIR", "eventlog"),
+            segment_bytes=int(os.getenv("EVENTLOG_SEGMENT_BYTES", str(64 * 1024 * 1024))),
+            retention_seconds=float(os.getenv("EVENTLOG_RETENTION_SECONDS", str(7 * 24 * 3600))),
+            fsync=os.getenv("EVENTLOG_FSYNC", "1") == "1",
+        )
+
+    # ------------------------
+    # Dateien / Recovery
+
+    def _paths(self, seg_id):
+        base = os.path.join(self.directory, f"log-{seg_id:012d}")
+        return base + ".seg", base + ".idx"
+
+    def _new_segment(self, seg_id):
+        segment = Segment(seg_id, *self._paths(seg_id))
+        self._segments[seg_id] = segment
+        return segment
+
+    def _recover(self, seg_id):
+        """Scan a segment, cut off a torn tail and rebuild the index if needed."""
+        segment = Segment(seg_id, *self._paths(seg_id))
+        size = os.path.getsize(segment.path)
+        index = []
+        pos = 0
+        if size:
+            with open(segment.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                while pos + _RECORD.size <= size:
+                    length, crc = _RECORD.unpack_from(mm, pos)
+                    end = pos + _RECORD.size + length
+                    if end > size or zlib.crc32(mm[pos + _RECORD.size:end]) != crc:
+                        break
+                    ts, dev_len, _ = _HEAD.unpack_from(mm, pos + _RECORD.size)
+                    body = pos + _RECORD.size + _HEAD.size
+                    index.append((ts, pos, bytes(mm[body:body + dev_len])))
+                    segment.note(ts)
+                    pos = end
+        if pos < size:
+            print(f"[SERVER] Event log: truncating torn tail of {segment.path} at {pos}", flush=True)
+            with open(segment.path, "r+b") as f:
+                f.truncate(pos)
+        segment.size = pos
+
+        expected = sum(_INDEX.size + len(dev) for _, _, dev in index)
+        if not os.path.exists(segment.index_path) or os.path.getsize(segment.index_path) != expected:
+            with open(segment.index_path, "wb") as f:
+                for ts, offset, dev in index:
+                    f.write(_INDEX.pack(ts, offset, len(dev)) + dev)
+                f.flush()
+                os.fsync(f.fileno())
+        return segment
+
+    # ------------------------
+    # Schreiben
+
+    def append_batch(self, events):
+        """Append (device_id, ts, content_type, value) tuples; durable when this returns.
+
+        On a write error nothing of the batch stays in the log and the error is raised.
+        """
+        if not events:
+            return
+        with self._lock:
+            first = self._active
+            saved = (first.size, first.records, first.min_ts, first.max_ts, self._index_writer.tell())
+            try:
+                self._append_locked(events)
+            except Exception:
+                self._rollback(first, saved)
+                raise
+            self.appended += len(events)
+            self.batches += 1
+
+    def _append_locked(self, events):
+        records, index, stamps = [], [], []
+        size = self._active.size
+        for device, ts, content_type, value in events:
+            dev = device.encode("utf-8")
+            ct = (content_type or "").encode("utf-8")
+            body = _HEAD.pack(ts, len(dev), len(ct)) + dev + ct + bytes(value)
+            record = _RECORD.pack(len(body), zlib.crc32(body)) + body
+
+            if size and size + len(record) > self.segment_bytes:
+                self._flush(records, index, size, stamps)
+                records, index, stamps = [], [], []
+                self._roll()
+                size = 0
+            index.append(_INDEX.pack(ts, size, len(dev)) + dev)
+            records.append(record)
+            stamps.append(ts)
+            size += len(record)
+        self._flush(records, index, size, stamps)
+
+    def _flush(self, records, index, size, stamps):
+        """Write one segment's part of a batch, then account for it in memory."""
+        if not records:
+            return
+        self._writer.write(b"".join(records))
+        self._index_writer.write(b"".join(index))
+        self._writer.flush()
+        self._index_writer.flush()
+        if self.fsync:
+            os.fsync(self._writer.fileno())
+            os.fsync(self._index_writer.fileno())
+        self._active.size = size
+        for ts in stamps:
+            self._active.note(ts)
+        self._active._index = None
+
+    def _rollback(self, first, saved):
+        """Cut the log back to the state before a failed batch."""
+        size, records, min_ts, max_ts, index_size = saved
+        # Gepufferte Reste landen beim Schließen evtl. noch in der Datei -> danach kürzen
+        for writer in (self._writer, self._index_writer):
+            try:
+                writer.close()
+            except OSError:
+                pass
+        try:
+            for seg_id in [k for k in self._segments if k > first.seg_id]:
+                segment = self._segments.pop(seg_id)
+                for path in (segment.path, segment.index_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+            os.truncate(first.path, size)
+            os.truncate(first.index_path, index_size)
+        except OSError as e:
+            # Beim nächsten Start schneidet _recover() defekte Reste ab
+            print(f"[SERVER] Event log: rollback of {first.path} failed: {e}", flush=True)
+        first.size, first.records, first.min_ts, first.max_ts = size, records, min_ts, max_ts
+        first._index = None
+        self._active = first
+        self._writer = open(first.path, "ab")
+        self._index_writer = open(first.index_path, "ab")
+
+    def _roll(self):
+        self._writer.close()
+        self._index_writer.close()
+        self._active = self._new_segment(self._active.seg_id + 1)
+        self._writer = open(self._active.path, "ab")
+        self._index_writer = open(self._active.index_path, "ab")
+        self._expire()
+
+    def _expire(self):
+        if not self.retention_seconds:
+            return
+        cutoff = time.time() - self.retention_seconds
+        for seg_id, segment in list(self._segments.items()):
+            if segment is self._active or segment.max_ts is None or segment.max_ts >= cutoff:
+                continue
+            os.remove(segment.path)
+            os.remove(segment.index_path)
+            del self._segments[seg_id]
+
+    # ------------------------
+    # Lesen
+
+    def _records(self, segment, offsets=None):
+        """Yield (ts, device, content_type, value) from a segment via mmap."""
+        if not segment.size:
+            return
+        with open(segment.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for pos in (offsets if offsets is not None else self._walk(mm, segment.size)):
+                pos = int(pos)
+                length, _ = _RECORD.unpack_from(mm, pos)
+                head = pos + _RECORD.size
+                ts, dev_len, ct_len = _HEAD.unpack_from(mm, head)
+                body = head + _HEAD.size
+                device = mm[body:body + dev_len].decode("utf-8")
+                content_type = mm[body + dev_len:body + dev_len + ct_len].decode("utf-8") or None
+                value = mm[body + dev_len + ct_len:head + length]
+                yield ts, device, content_type, value
+
+    @staticmethod
+    def _walk(mm, size):
+        pos = 0
+        while pos < size:
+            yield pos
+            pos += _RECORD.size + _RECORD.unpack_from(mm, pos)[0]
+
+    def replay(self, since=None):
+        """Yield every logged event in write order (optionally only newer segments)."""
+        with self._lock:
+            segments = [self._segments[k] for k in sorted(self._segments)]
+        for segment in segments:
+            if since is not None and segment.max_ts is not None and segment.max_ts < since:
+                continue
+            yield from self._records(segment)
+
+    def read(self, device_id, since=None, until=None):
+        """Yield (ts, content_type, value) of one device in time order using the sidecar indexes."""
+        with self._lock:
+            segments = [self._segments[k] for k in sorted(self._segments)]
+        for segment in segments:
+            if segment.max_ts is None:
+                continue
+            if (since is not None and segment.max_ts < since) or (until is not None and segment.min_ts >= until):
+                continue
+            # Unter dem Lock: der Index des aktiven Segments ändert sich mit jedem Batch
+            with self._lock:
+                if segment.seg_id not in self._segments:
+                    continue
+                entry = segment.device_index().get(device_id)
+            if entry is None:
+                continue
+            ts, offsets = entry
+            lo = 0 if since is None else int(np.searchsorted(ts, since, side="left"))
+            hi = len(ts) if until is None else int(np.searchsorted(ts, until, side="left"))
+            for rec_ts, _, content_type, value in self._records(segment, offsets[lo:hi]):
+                yield rec_ts, content_type, value
+
+    def stats(self):
+        with self._lock:
+            return {
+                "segments": len(self._segments),
+                "bytes": sum(s.size for s in self._segments.values()),
+                "appended": self.appended,
+                "batches": self.batches,
+            }
+
+    def close(self):
+        with self._lock:
+            self._writer.close()
+            self._index_writer.close()
@@ -1,14 +1,35 @@
 import os
 import json
+import time
 from flask import Flask, jsonify, request, Response
-from confluent_kafka import Consumer, KafkaException
-from prometheus_client import Gauge, generate_latest
+from confluent_kafka import TIMESTAMP_NOT_AVAILABLE, TopicPartition
+from prometheus_client import Gauge, Histogram, Counter, generate_latest, REGISTRY
 from threading import Thread
+from payload import decode, encode, content_type_from_headers, CONTENT_TYPE_HEADER
+from transport import create_consumer as create_transport_consumer, transport_from_env
+from store import TimeSeriesStore, parse_timestamp
+from eventlog import EventLog
+from rollups import Rollups, RollupCollector
 
 BOOTSTRAP = os.getenv("BOOTSTRAP_SERVERS", "kafka:9092")
 TOPIC = "edge-data"
 GROUP_ID = os.getenv("GROUP_ID", "server-group")
 
+# ------------------------
+# Consumer-Modus
+#   poll  – wie bisher: eine Nachricht pro poll(), Auto-Commit; mit Event-Log
+#           wird jede Nachricht erst nach dem Schreiben ins Log committet
+#   batch – consume(num_messages=CONSUMER_BATCH_SIZE), Batch am Stück anwenden,
+#           danach Offsets manuell committen (Standard)
+# CONSUMER_WORKERS startet mehrere Consumer in derselben Gruppe; Kafka verteilt
+# die Partitionen, und da der Key = device_id ist, bleibt die Reihenfolge pro
+# Gerät erhalten (eine Partition gehört immer genau einem Worker).
+CONSUMER_MODE = os.getenv("CONSUMER_MODE", "batch")
+CONSUMER_BATCH_SIZE = int(os.getenv("CONSUMER_BATCH_SIZE", "500"))
+CONSUMER_BATCH_TIMEOUT = float(os.getenv("CONSUMER_BATCH_TIMEOUT", "1.0"))
+CONSUMER_WORKERS = int(os.getenv("CONSUMER_WORKERS", "1"))
+EVENTLOG_ENABLED = os.getenv("EVENTLOG_ENABLED", "1") == "1"
+
 app = Flask(__name__)
 
 PERSONS_DETECTED = Gauge(
@@ -17,52 +38,367 @@ PERSONS_DETECTED = Gauge(
     ['device_id']
 )
 
-data_store = []
+# ------------------------
+# End-to-End-Latenz aus dem "trace" im Payload (siehe edge/tracing.py)
+#   capture_to_edge  Browser-Aufnahme -> Edge-Empfang   (Browser- vs. Edge-Uhr)
+#   edge_decode      Empfang -> JPEG dekodiert          (Edge, monoton)
+#   edge_infer       dekodiert -> Inferenz fertig       (Edge, monoton)
+#   edge_enqueue     Inferenz fertig -> Producer-Queue  (Edge, monoton)
+#   edge_to_broker   Producer-Queue -> Broker-Zeitstempel (Edge- vs. Broker-Uhr)
+#   broker_to_server Broker-Zeitstempel -> Consume hier (Broker- vs. Server-Uhr)
+# Negative Werte über Rechnergrenzen = Uhrversatz: auf 0 gesetzt und gezählt.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+HOP_LATENCY = Histogram(
+    'e2e_hop_latency_seconds',
+    'Latency per pipeline hop',
+    ['device_id', 'hop'],
+    buckets=LATENCY_BUCKETS
+)
+
+TOTAL_LATENCY = Histogram(
+    'e2e_total_latency_seconds',
+    'Latency from frame capture (or edge receive) to server consume',
+    ['device_id'],
+    buckets=LATENCY_BUCKETS
+)
+
+CLOCK_SKEW = Counter(
+    'e2e_clock_skew_total',
+    'Negative cross-host latencies clamped to zero',
+    ['hop']
+)
+
+def observe_hop(device, hop, seconds):
+    if seconds < 0:
+        CLOCK_SKEW.labels(hop=hop).inc()
+        seconds = 0.0
+    HOP_LATENCY.labels(device_id=device, hop=hop).observe(seconds)
+
+def observe_trace(payload, msg, consumed_at):
+    trace = payload.get("trace")
+    if not isinstance(trace, dict) or "edge_recv_ts" not in trace:
+        return
+    device = payload.get("device_id", "unknown")
+    recv = trace["edge_recv_ts"]
+    capture = trace.get("capture_ts")
+    decode_ms = trace.get("decode_ms")
+    infer_ms = trace.get("infer_ms")
+    enqueue_ms = trace.get("enqueue_ms")
+
+    if capture is not None:
+        observe_hop(device, "capture_to_edge", recv - capture)
+    if decode_ms is not None:
+        observe_hop(device, "edge_decode", decode_ms / 1000.0)
+    if decode_ms is not None and infer_ms is not None:
+        observe_hop(device, "edge_infer", (infer_ms - decode_ms) / 1000.0)
+    if infer_ms is not None and enqueue_ms is not None:
+        observe_hop(device, "edge_enqueue", (enqueue_ms - infer_ms) / 1000.0)
+
+    ts_type, broker_ms = msg.timestamp()
+    if ts_type != TIMESTAMP_NOT_AVAILABLE:
+        broker = broker_ms / 1000.0
+        if enqueue_ms is not None:
+            observe_hop(device, "edge_to_broker", broker - (recv + enqueue_ms / 1000.0))
+        observe_hop(device, "broker_to_server", consumed_at - broker)
+
+    total = consumed_at - (capture if capture is not None else recv)
+    if total < 0:
+        CLOCK_SKEW.labels(hop="total").inc()
+        total = 0.0
+    TOTAL_LATENCY.labels(device_id=device).observe(total)
+
+# Begrenzter Zeitreihen-Speicher (STORE_RETENTION_SECONDS, STORE_MAX_BYTES)
+store = TimeSeriesStore.from_env()
 
-def create_consumer():
-    return Consumer({
+# Rollups je Gerät (10s/1m/1h), als /rollups und als rollup_* Metriken;
+# ihr Speicher zählt zum STORE_MAX_BYTES-Budget
+rollups = Rollups.from_env(store.max_bytes)
+store.reserved_bytes = lambda: rollups.nbytes
+REGISTRY.register(RollupCollector(rollups))
+
+# ------------------------
+# Lokales Event-Log (eventlog.py): jede Nachricht wird vor dem Offset-Commit
+# dauerhaft geschrieben; beim Start wird der Store daraus wiederhergestellt
+eventlog = None
+
+def init_eventlog():
+    global eventlog
+    if not EVENTLOG_ENABLED:
+        return
+    eventlog = EventLog.from_env()
+    since = time.time() - store.retention_seconds if store.retention_seconds else None
+    start = time.monotonic()
+    batch, restored = [], 0
+    for _, _, content_type, value in eventlog.replay(since):
+        try:
+            batch.append(decode(value, [(CONTENT_TYPE_HEADER, content_type)] if content_type else None))
+        except Exception as e:
+            print("[SERVER] Event log: undecodable record skipped:", e, flush=True)
+        if len(batch) >= 10000:
+            apply_payloads(batch)
+            restored += len(batch)
+            batch = []
+    apply_payloads(batch)
+    restored += len(batch)
+    print(f"[SERVER] Event log: restored {restored} events in {time.monotonic() - start:.2f}s "
+          f"({eventlog.stats()['segments']} segments)", flush=True)
+
+def decode_messages(msgs):
+    """Decode a batch; returns (payloads, log events) for the valid messages."""
+    payloads, events = [], []
+    consumed_at = time.time()
+    for msg in msgs:
+        if msg.error():
+            print("[SERVER] Kafka error:", msg.error(), flush=True)
+            continue
+        try:
+            # JSON oder Binärformat – erkannt über content-type Header bzw. Magic-Bytes
+            payload = decode(msg.value(), msg.headers())
+            ts = parse_timestamp(payload.get("timestamp"))
+        except Exception as e:
+            # Kaputte Nachricht überspringen, sonst blockiert sie die Partition
+            print("[SERVER] Undecodable message:", e, flush=True)
+            continue
+        observe_trace(payload, msg, consumed_at)
+        payloads.append(payload)
+        value, content_type = msg.value(), content_type_from_headers(msg.headers())
+        if isinstance(value, dict):
+            # In-Prozess-Transport liefert das Objekt selbst; fürs Log serialisieren
+            value, content_type = encode(value, "json")
+        events.append((payload.get("device_id", "unknown"), ts, content_type, value))
+    return payloads, events
+
+def create_consumer(auto_commit=True):
+    # TRANSPORT=kafka|unix|inproc, siehe transport.py
+    return create_transport_consumer({
         "bootstrap.servers": BOOTSTRAP,
         "group.id": GROUP_ID,
         "auto.offset.reset": "earliest",
-        "enable.auto.commit": True,
+        "enable.auto.commit": auto_commit,
     })
 
+def apply_payloads(payloads):
+    """Store decoded payloads and update the gauges (last value per device wins)."""
+    store.extend(payloads)
+    rollups.add(payloads)
+    latest = {}
+    for payload in payloads:
+        latest[payload.get("device_id", "unknown")] = payload
+    for device, payload in latest.items():
+        PERSONS_DETECTED.labels(device_id=device).set(int(payload.get("persons_detected", 0)))
+
+def persist(msgs):
+    """Decode, write to the event log (fsync) and apply; raises if that fails."""
+    payloads, events = decode_messages(msgs)
+    # Erst ins Log (fsync), dann anwenden, dann committen -> at-least-once
+    if eventlog and events:
+        eventlog.append_batch(events)
+    apply_payloads(payloads)
+    return payloads
+
+def rewind(consumer, msgs):
+    """Seek every partition of a failed batch back to its first offset.
+
+    Returns False if that is not possible (local transports have no offsets);
+    the caller must then stop instead of consuming past the lost batch.
+    """
+    first = {}
+    for msg in msgs:
+        if msg.error() is None:
+            key = (msg.topic(), msg.partition())
+            first[key] = min(first.get(key, msg.offset()), msg.offset())
+    try:
+        for (topic, partition), offset in first.items():
+            consumer.seek(TopicPartition(topic, partition, offset))
+        return True
+    except Exception as e:
+        print("[SERVER] Cannot rewind consumer:", e, flush=True)
+        return False
+
 def kafka_loop():
-    consumer = create_consumer()
+    # Mit Event-Log kein Auto-Commit: librdkafka darf nichts vor dem fsync committen
+    consumer = create_consumer(auto_commit=eventlog is None)
     consumer.subscribe([TOPIC])
-    print(f"[SERVER] Kafka consumer started, bootstrap={BOOTSTRAP}, group={GROUP_ID}", flush=True)
+    print(f"[SERVER] Consumer started ({transport_from_env()}), bootstrap={BOOTSTRAP}, group={GROUP_ID}", flush=True)
 
     while True:
         try:
             msg = consumer.poll(1.0)
+        except Exception as e:
+            print("[SERVER] Kafka exception:", e, flush=True)
+            continue
+        if msg is None:
+            continue
 
-            if msg is None:
-                continue
+        try:
+            payloads = persist([msg])
+        except Exception as e:
+            print("[SERVER] Could not persist message, retrying:", e, flush=True)
+            if not rewind(consumer, [msg]):
+                print("[SERVER] Consumer stopped", flush=True)
+                return
+            time.sleep(1.0)
+            continue
 
-            if msg.error():
-                print("[SERVER] Kafka error:", msg.error(), flush=True)
-                continue
+        try:
+            if eventlog and msg.error() is None:
+                consumer.commit(message=msg, asynchronous=False)
+        except Exception as e:
+            # Nachricht liegt im Log; der nächste Commit deckt sie mit ab
+            print("[SERVER] Commit failed:", e, flush=True)
+        if payloads:
+            print("[SERVER] Received via Kafka:", payloads[0], flush=True)
 
-            payload = json.loads(msg.value().decode("utf-8"))
-            data_store.append(payload)
+def kafka_batch_loop(worker=0):
+    consumer = create_consumer(auto_commit=False)
+    consumer.subscribe([TOPIC])
+    print(f"[SERVER] Batch consumer {worker} started ({transport_from_env()}), bootstrap={BOOTSTRAP}, group={GROUP_ID}, "
+          f"batch={CONSUMER_BATCH_SIZE}", flush=True)
 
-            count = int(payload.get("persons_detected", 0))
-            device = payload.get("device_id", "unknown")
-            PERSONS_DETECTED.labels(device_id=device).set(count)
+    while True:
+        try:
+            msgs = consumer.consume(num_messages=CONSUMER_BATCH_SIZE, timeout=CONSUMER_BATCH_TIMEOUT)
+        except Exception as e:
+            print("[SERVER] Kafka exception:", e, flush=True)
+            continue
+        if not msgs:
+            continue
 
-            print("[SERVER] Received via Kafka:", payload, flush=True)
+        try:
+            payloads = persist(msgs)
+        except Exception as e:
+            # Nie über einen nicht gespeicherten Batch hinweg lesen oder committen
+            print(f"[SERVER] Worker {worker}: could not persist batch, retrying:", e, flush=True)
+            if not rewind(consumer, msgs):
+                print(f"[SERVER] Worker {worker} stopped", flush=True)
+                return
+            time.sleep(1.0)
+            continue
 
+        try:
+            consumer.commit(asynchronous=False)
         except Exception as e:
-            print("[SERVER] Kafka exception:", e, flush=True)
+            print(f"[SERVER] Worker {worker}: commit failed:", e, flush=True)
+        print(f"[SERVER] Worker {worker}: applied {len(payloads)}/{len(msgs)} messages", flush=True)
+
+def start_consumers():
+    if CONSUMER_MODE == "poll":
+        Thread(target=kafka_loop, daemon=True).start()
+        return
+    # Lokale Transporte haben keine Partitionen -> ein Worker
+    workers = max(1, CONSUMER_WORKERS) if transport_from_env() == "kafka" else 1
+    for worker in range(workers):
+        Thread(target=kafka_batch_loop, args=(worker,), daemon=True).start()
 
 @app.route("/metrics")
 def metrics():
     return Response(generate_latest(), mimetype="text/plain")
 
+# ------------------------
+# /data – Abfrage mit Filtern und Paging, Antwort wird gestreamt
+#   device_id    nur dieses Gerät
+#   since/until  ISO-Zeitstempel oder Unix-Sekunden, since <= ts < until
+#   limit        max. Anzahl Events; weitere Seite über X-Next-Cursor
+#   cursor       Wert aus X-Next-Cursor der vorigen Antwort
+#   format       json (Standard, JSON-Array) oder ndjson (ein Event pro Zeile);
+#                ndjson auch per Accept: application/x-ndjson
+#   source=log   direkt aus dem Event-Log lesen (vollständige Payloads, auch
+#                jenseits der Store-Retention); braucht device_id, kein cursor
+def parse_time_arg(name):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return parse_timestamp(value)
+
 @app.route("/data", methods=["GET"])
 def data_endpoint():
-    return jsonify(data_store)
+    if request.args.get("source") == "log":
+        return log_data_response()
+    try:
+        limit = request.args.get("limit", type=int)
+        chunks, next_cursor = store.query(
+            device_id=request.args.get("device_id"),
+            since=parse_time_arg("since"),
+            until=parse_time_arg("until"),
+            limit=limit if limit and limit > 0 else None,
+            cursor=request.args.get("cursor"),
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    ndjson = (request.args.get("format") == "ndjson"
+              or "application/x-ndjson" in request.headers.get("Accept", ""))
+
+    def generate():
+        # Zeilen erst beim Senden erzeugen – nichts wird komplett im Speicher aufgebaut
+        first = True
+        if not ndjson:
+            yield "["
+        for chunk in chunks:
+            for row in chunk.rows():
+                if ndjson:
+                    yield json.dumps(row) + "\n"
+                else:
+                    yield ("" if first else ",") + json.dumps(row)
+                first = False
+        if not ndjson:
+            yield "]"
+
+    response = Response(generate(), mimetype="application/x-ndjson" if ndjson else "application/json")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
+
+# ------------------------
+# /rollups – vorberechnete Buckets
+#   device_id    Pflicht
+#   resolution   10s | 1m | 1h (Standard 1m)
+#   since/until  wie bei /data, bezogen auf den Bucket-Start (since <= start < until)
+@app.route("/rollups", methods=["GET"])
+def rollups_endpoint():
+    device_id = request.args.get("device_id")
+    resolution = request.args.get("resolution", "1m")
+    if resolution not in rollups.resolutions:
+        return jsonify({"error": f"resolution must be one of {rollups.resolutions}"}), 400
+    if not device_id:
+        return jsonify({"devices": rollups.devices(), "resolutions": rollups.resolutions,
+                        "memory": rollups.stats()})
+    try:
+        since, until = parse_time_arg("since"), parse_time_arg("until")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({
+        "device_id": device_id,
+        "resolution": resolution,
+        "buckets": rollups.query(device_id, resolution, since, until),
+    })
+
+def log_data_response():
+    device_id = request.args.get("device_id")
+    if eventlog is None or not device_id:
+        return jsonify({"error": "source=log needs the event log and a device_id"}), 400
+    try:
+        since, until = parse_time_arg("since"), parse_time_arg("until")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    limit = request.args.get("limit", type=int)
+
+    def generate():
+        for i, (_, content_type, value) in enumerate(eventlog.read(device_id, since, until)):
+            if limit and i >= limit:
+                break
+            payload = decode(value, [(CONTENT_TYPE_HEADER, content_type)] if content_type else None)
+            yield json.dumps(payload) + "\n"
+
+    return Response(generate(), mimetype="application/x-ndjson")
 
 if __name__ == "__main__":
-    Thread(target=kafka_loop, daemon=True).start()
+    if transport_from_env() == "inproc":
+        raise SystemExit("[SERVER] TRANSPORT=inproc needs the edge in the same process: run edge/colocated.py")
+    init_eventlog()
+    start_consumers()
     app.run(host="0.0.0.0", port=5000, use_reloader=False)
@@ -0,0 +1,126 @@
+import json
+import struct
+
+# ------------------------
+# Payload-Formate für Edge-Events
+#
+#   json   – wie bisher: json.dumps(dict), Content-Type application/json
+#   binary – kompaktes, versioniertes Binärformat (v1):
+#
+#     Header  <2s B B I H H H I>
+#             magic "E2", version, flags, persons_detected, n_faces,
+#             len(device_id), len(timestamp), len(extras)
+#     device_id   UTF-8
+#     timestamp   UTF-8 (ISO-String wie im JSON)
+#     faces       n_faces x 5 float32: conf, xmin, ymin, width, height
+#     track_ids   n_faces x int32 (nur wenn flags & FLAG_TRACK_IDS)
+#     extras      kompaktes JSON mit allen übrigen Feldern (oder leer)
+#   object – nur für TRANSPORT=inproc: das Dict selbst, ohne Serialisierung
+#
+# Der Content-Type steht im Kafka-Header "content-type". decode() erkennt das
+# Format automatisch (Header, sonst Magic-Bytes), JSON funktioniert also weiter.
+#
+# Identische Kopie in edge/payload.py und VM/server/payload.py – beide Dateien
+# gemeinsam ändern; tests/test_shared_copies.py und die CI prüfen das.
+
+CONTENT_TYPE_JSON = "application/json"
+CONTENT_TYPE_BINARY = "application/vnd.e2c.event.v1"
+CONTENT_TYPE_OBJECT = "application/x-python-object"
+CONTENT_TYPE_HEADER = "content-type"
+
+MAGIC = b"E2"
+VERSION = 1
+FLAG_TRACK_IDS = 0x01
+
+_HEADER = struct.Struct("<2sBBIHHHI")
+_FACE_KEYS = ("conf", "xmin", "ymin", "width", "height")
+_CORE_KEYS = ("device_id", "timestamp", "persons_detected", "faces")
+
+class PayloadError(ValueError):
+    pass
+
+
+def encode(payload, fmt="json"):
+    """Encode an event dict; returns (bytes, content_type)."""
+    if fmt == "json":
+        return json.dumps(payload).encode("utf-8"), CONTENT_TYPE_JSON
+    if fmt == "binary":
+        return encode_binary(payload), CONTENT_TYPE_BINARY
+    if fmt == "object":
+        return payload, CONTENT_TYPE_OBJECT
+    raise PayloadError(f"unknown payload format: {fmt}")
+
+
+def encode_binary(payload):
+    faces = payload.get("faces") or []
+    device = str(payload.get("device_id", "")).encode("utf-8")
+    timestamp = str(payload.get("timestamp") or "").encode("utf-8")
+    extras = {k: v for k, v in payload.items() if k not in _CORE_KEYS}
+    extras = json.dumps(extras, separators=(",", ":")).encode("utf-8") if extras else b""
+
+    flags = 0
+    track_ids = b""
+    if faces and all("track_id" in f for f in faces):
+        flags |= FLAG_TRACK_IDS
+        track_ids = struct.pack(f"<{len(faces)}i", *(int(f["track_id"]) for f in faces))
+    face_data = struct.pack(f"<{len(faces) * 5}f", *(float(f[k]) for f in faces for k in _FACE_KEYS))
+
+    header = _HEADER.pack(
+        MAGIC, VERSION, flags, int(payload.get("persons_detected", 0)),
+        len(faces), len(device), len(timestamp), len(extras),
+    )
+    return b"".join((header, device, timestamp, face_data, track_ids, extras))
+
+
+def decode_binary(value):
+    if len(value) < _HEADER.size:
+        raise PayloadError("binary payload too short")
+    magic, version, flags, persons, n_faces, n_device, n_ts, n_extras = _HEADER.unpack_from(value)
+    if magic != MAGIC:
+        raise PayloadError("bad magic")
+    if version != VERSION:
+        raise PayloadError(f"unsupported payload version {version}")
+
+    pos = _HEADER.size
+    device = bytes(value[pos:pos + n_device]).decode("utf-8")
+    pos += n_device
+    timestamp = bytes(value[pos:pos + n_ts]).decode("utf-8") or None
+    pos += n_ts
+    flat = struct.unpack_from(f"<{n_faces * 5}f", value, pos)
+    pos += n_faces * 20
+    track_ids = None
+    if flags & FLAG_TRACK_IDS:
+        track_ids = struct.unpack_from(f"<{n_faces}i", value, pos)
+        pos += n_faces * 4
+
+    faces = [dict(zip(_FACE_KEYS, flat[i:i + 5])) for i in range(0, len(flat), 5)]
+    if track_ids is not None:
+        for face, track_id in zip(faces, track_ids):
+            face["track_id"] = track_id
+
+    payload = {
+        "device_id": device,
+        "timestamp": timestamp,
+        "persons_detected": persons,
+        "faces": faces,
+    }
+    if n_extras:
+        payload.update(json.loads(bytes(value[pos:pos + n_extras])))
+    return payload
+
+
+def content_type_from_headers(headers):
+    for key, val in headers or ():
+        if key.lower() == CONTENT_TYPE_HEADER:
+            return val.decode("utf-8") if isinstance(val, bytes) else val
+    return None
+
+
+def decode(value, headers=None):
+    """Decode an event, auto-detecting JSON vs. binary."""
+    if isinstance(value, dict):
+        return value
+    content_type = content_type_from_headers(headers)
+    if content_type == CONTENT_TYPE_BINARY or (content_type is None and value[:2] == MAGIC):
+        return decode_binary(value)
+    return json.loads(value)
@@ -0,0 +1,332 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from prometheus_client.core import GaugeMetricFamily
+
+from store import parse_timestamp, format_timestamp
+
+# ------------------------
+# Vorberechnete Rollups pro Gerät und Auflösung (Standard 10s, 1m, 1h)
+#
+# Je Bucket: count, sum, min, max, last von persons_detected sowie ein
+# Histogramm der Gesichter pro Event (Bins 0 .. FACE_BINS-1, letzter Bin = "und mehr").
+# Aktualisiert beim Eintreffen der Nachrichten (batchweise, vektorisiert);
+# Abfragen über Tage kosten damit O(Buckets) statt O(Events).
+#
+# Fenster-Zusammenfassungen (Payload mit "window", EDGE_PUBLISH_MODE=window)
+# gehen als vorab aggregierter Block in den Bucket ihres Fensterstarts ein:
+# count += frames, sum += persons_mean * frames, dazu min/max/last. Bei
+# gleitenden Fenstern zählt jeder Frame in seconds/slide Fenstern, count und
+# sum werden deshalb mit slide/seconds gewichtet. sum ist float64, damit der
+# Mittelwert von Blöcken nicht durch Runden verfälscht wird. face_hist zählt nur
+# Einzel-Events (die Zusammenfassung enthält keine Gesichter pro Frame).
+#
+# Speicher: je Gerät und Auflösung ein spaltenorientierter Ringpuffer mit
+# fester Größe, indiziert über die Bucket-Nummer (ts // Auflösung) modulo
+# Anzahl Buckets. Ein neuer Bucket überschreibt den abgelaufenen im selben
+# Slot – kein Suchen, kein Löschen. BUCKET_BYTES je Bucket, bei
+# "10s:360,1m:1440,1h:720" also ~160 KB je Gerät.
+#
+# ROLLUP_RETENTION legt fest, wie viele Buckets je Auflösung gehalten werden,
+# z.B. "10s:360,1m:1440,1h:720" (1 Stunde / 1 Tag / 30 Tage).
+# ROLLUP_MAX_BYTES begrenzt den Speicher über alle Geräte (Standard: ein
+# Viertel von STORE_MAX_BYTES, der Store bekommt den Rest); darüber werden die
+# Rollups des am längsten nicht aktualisierten Geräts verworfen.
+
+FACE_BINS = 6
+BUCKET_BYTES = 8 + 4 + 8 + 4 + 4 + 4 + 8 + 4 * FACE_BINS
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+_INT32_MAX = np.iinfo(np.int32).max
+_INT32_MIN = np.iinfo(np.int32).min
+SCALAR_MAX = 8  # bis zu so vielen Events je Gerät und Batch ohne Vektorisierung
+
+
+def parse_resolution(text):
+    """'10s' / '1m' / '1h' -> seconds."""
+    text = text.strip()
+    if text[-1:] in _UNITS:
+        return int(text[:-1]) * _UNITS[text[-1]]
+    return int(text)
+
+
+def parse_retention(text):
+    """'10s:360,1m:1440' -> {'10s': (10, 360), '1m': (60, 1440)}."""
+    result = {}
+    for part in text.split(","):
+        name, buckets = part.split(":")
+        result[name.strip()] = (parse_resolution(name), int(buckets))
+    return result
+
+
+class Ring:
+    """Fixed-size columnar ring of buckets for one device and resolution."""
+
+    def __init__(self, resolution, keep):
+        self.resolution = resolution
+        self.keep = keep
+        self.bucket = np.full(keep, -1, np.int64)   # Bucket-Nummer im Slot, -1 = leer
+        self.count = np.zeros(keep, np.uint32)
+        self.sum = np.zeros(keep, np.float64)
+        self.min = np.zeros(keep, np.int32)
+        self.max = np.zeros(keep, np.int32)
+        self.last = np.zeros(keep, np.int32)
+        self.last_ts = np.zeros(keep, np.float64)
+        self.faces = np.zeros((keep, FACE_BINS), np.uint32)
+        self.head = -1  # jüngste Bucket-Nummer
+
+    def _reset(self, slots, buckets):
+        self.bucket[slots] = buckets
+        self.count[slots] = 0
+        self.sum[slots] = 0
+        self.min[slots] = _INT32_MAX
+        self.max[slots] = _INT32_MIN
+        self.last_ts[slots] = -np.inf
+        self.faces[slots] = 0
+
+    def add_one(self, ts, persons, n_faces):
+        """Scalar path for single events (numpy call overhead dominates there)."""
+        b = int(ts // self.resolution)
+        if b <= self.head - self.keep:
+            return
+        self.head = max(self.head, b)
+        i = b % self.keep
+        if self.bucket[i] != b:
+            self._reset(i, b)
+        self.count[i] += 1
+        self.sum[i] += persons
+        if persons < self.min[i]:
+            self.min[i] = persons
+        if persons > self.max[i]:
+            self.max[i] = persons
+        self.faces[i, min(n_faces, FACE_BINS - 1)] += 1
+        if ts >= self.last_ts[i]:
+            self.last_ts[i] = ts
+            self.last[i] = persons
+
+    def add_window(self, start, end, count, total, lo, hi, last):
+        """Add a pre-aggregated window summary to the bucket of its start."""
+        b = int(start // self.resolution)
+        if b <= self.head - self.keep:
+            return
+        self.head = max(self.head, b)
+        i = b % self.keep
+        if self.bucket[i] != b:
+            self._reset(i, b)
+        self.count[i] += count
+        self.sum[i] += total
+        self.min[i] = min(int(self.min[i]), lo)
+        self.max[i] = max(int(self.max[i]), hi)
+        if end >= self.last_ts[i]:
+            self.last_ts[i] = end
+            self.last[i] = last
+
+    def add(self, ts, persons, n_faces):
+        """Add events given as equally long numpy arrays."""
+        b = (ts // self.resolution).astype(np.int64)
+        head = max(self.head, int(b.max()))
+        # Zu spät für das Fenster des Rings
+        inside = b > head - self.keep
+        if not inside.all():
+            b, ts, persons, n_faces = b[inside], ts[inside], persons[inside], n_faces[inside]
+            if not len(b):
+                return
+        self.head = head
+        idx = b % self.keep
+
+        # Slots mit abgelaufenem (oder leerem) Bucket neu belegen
+        target = self.bucket.copy()
+        np.maximum.at(target, idx, b)
+        reset = np.nonzero(target != self.bucket)[0]
+        if len(reset):
+            self._reset(reset, target[reset])
+
+        np.add.at(self.count, idx, 1)
+        np.add.at(self.sum, idx, persons)
+        np.minimum.at(self.min, idx, persons)
+        np.maximum.at(self.max, idx, persons)
+        np.add.at(self.faces, (idx, np.minimum(n_faces, FACE_BINS - 1)), 1)
+
+        # last: Event mit dem größten ts je Slot
+        order = np.lexsort((ts, idx))
+        idx_s, ts_s, persons_s = idx[order], ts[order], persons[order]
+        is_last = np.append(idx_s[1:] != idx_s[:-1], True)
+        slots, slot_ts, slot_persons = idx_s[is_last], ts_s[is_last], persons_s[is_last]
+        newer = slot_ts >= self.last_ts[slots]
+        self.last_ts[slots[newer]] = slot_ts[newer]
+        self.last[slots[newer]] = slot_persons[newer]
+
+    def select(self, since=None, until=None):
+        """Slot indices of live buckets with since <= start < until, oldest first."""
+        live = (self.bucket >= 0) & (self.bucket > self.head - self.keep)
+        start = self.bucket * self.resolution
+        if since is not None:
+            live &= start >= since
+        if until is not None:
+            live &= start < until
+        slots = np.nonzero(live)[0]
+        return slots[np.argsort(self.bucket[slots])]
+
+    def to_dict(self, i):
+        start = float(self.bucket[i] * self.resolution)
+        count = int(self.count[i])
+        total = float(self.sum[i])
+        return {
+            "start": format_timestamp(start),
+            "end": format_timestamp(start + self.resolution),
+            "count": count,
+            "sum": int(total) if total.is_integer() else total,
+            "min": int(self.min[i]),
+            "max": int(self.max[i]),
+            "mean": total / count if count else None,
+            "last": int(self.last[i]),
+            "face_hist": [int(n) for n in self.faces[i]],
+        }
+
+    @property
+    def nbytes(self):
+        return self.keep * BUCKET_BYTES
+
+
+class Rollups:
+    def __init__(self, retention=None, max_bytes=None):
+        self.retention = retention or parse_retention("10s:360,1m:1440,1h:720")
+        self.max_bytes = max_bytes
+        self.device_bytes = sum(keep for _, keep in self.retention.values()) * BUCKET_BYTES
+        # device -> {resolution name: Ring}, zuletzt aktualisiertes Gerät am Ende
+        self._devices = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted_devices = 0
+
+    @classmethod
+    def from_env(cls, budget_bytes=None):
+        default = str(budget_bytes // 4) if budget_bytes else "0"
+        return cls(
+            parse_retention(os.getenv("ROLLUP_RETENTION", "10s:360,1m:1440,1h:720")),
+            max_bytes=int(os.getenv("ROLLUP_MAX_BYTES", default)) or None,
+        )
+
+    @property
+    def resolutions(self):
+        return list(self.retention)
+
+    @property
+    def nbytes(self):
+        return len(self._devices) * self.device_bytes
+
+    def add(self, payloads):
+        columns = {}
+        windows = []
+        for payload in payloads:
+            if payload.get("window"):
+                windows.append(payload)
+                continue
+            ts, persons, faces = columns.setdefault(payload.get("device_id", "unknown"), ([], [], []))
+            ts.append(parse_timestamp(payload.get("timestamp")))
+            persons.append(int(payload.get("persons_detected", 0)))
+            faces.append(len(payload.get("faces") or []))
+        with self._lock:
+            for device, (ts, persons, faces) in columns.items():
+                rings = self._rings(device)
+                if len(ts) <= SCALAR_MAX:
+                    for ring in rings.values():
+                        for event in zip(ts, persons, faces):
+                            ring.add_one(*event)
+                    continue
+                ts = np.asarray(ts, np.float64)
+                persons = np.asarray(persons, np.int32)
+                faces = np.asarray(faces, np.int64)
+                for ring in rings.values():
+                    ring.add(ts, persons, faces)
+            for payload in windows:
+                self._add_window(payload)
+
+    def _add_window(self, payload):
+        window = payload["window"]
+        end = parse_timestamp(window.get("end") or payload.get("timestamp"))
+        seconds = float(window.get("seconds") or 0.0)
+        start = parse_timestamp(window["start"]) if window.get("start") else end - seconds
+        last = int(payload.get("persons_detected", window.get("persons_last", 0)))
+        weight = float(window.get("slide") or seconds) / seconds if seconds else 1.0
+        frames = int(window.get("frames", 1))
+        count = max(1, round(frames * weight))
+        total = float(window.get("persons_mean", last)) * frames * weight
+        lo = int(window.get("persons_min", last))
+        hi = int(window.get("persons_max", last))
+        for ring in self._rings(payload.get("device_id", "unknown")).values():
+            ring.add_window(start, end, count, total, lo, hi, last)
+
+    def _rings(self, device):
+        rings = self._devices.get(device)
+        if rings is not None:
+            self._devices.move_to_end(device)
+            return rings
+        if self.max_bytes:
+            while self._devices and self.nbytes + self.device_bytes > self.max_bytes:
+                self._devices.popitem(last=False)
+                self.evicted_devices += 1
+        rings = self._devices[device] = {
+            name: Ring(resolution, keep) for name, (resolution, keep) in self.retention.items()
+        }
+        return rings
+
+    def devices(self):
+        with self._lock:
+            return sorted(self._devices)
+
+    def query(self, device_id, resolution, since=None, until=None):
+        """Buckets of one device and resolution with since <= start < until, oldest first."""
+        with self._lock:
+            rings = self._devices.get(device_id)
+            if rings is None:
+                return []
+            ring = rings[resolution]
+            return [ring.to_dict(i) for i in ring.select(since, until)]
+
+    def latest(self):
+        """(device, resolution, most recent bucket as dict) for every series."""
+        with self._lock:
+            return [
+                (device, name, ring.to_dict(ring.head % ring.keep))
+                for device, rings in self._devices.items()
+                for name, ring in rings.items()
+                if ring.head >= 0
+            ]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "devices": len(self._devices),
+                "bytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "evicted_devices": self.evicted_devices,
+            }
+
+
+class RollupCollector:
+    """Prometheus collector: values of the most recent bucket per device and resolution."""
+
+    def __init__(self, rollups):
+        self.rollups = rollups
+
+    def collect(self):
+        labels = ["device_id", "resolution"]
+        mean = GaugeMetricFamily("rollup_persons_mean", "Mean persons_detected in the current bucket", labels=labels)
+        minimum = GaugeMetricFamily("rollup_persons_min", "Min persons_detected in the current bucket", labels=labels)
+        maximum = GaugeMetricFamily("rollup_persons_max", "Max persons_detected in the current bucket", labels=labels)
+        last = GaugeMetricFamily("rollup_persons_last", "Last persons_detected in the current bucket", labels=labels)
+        count = GaugeMetricFamily("rollup_events", "Events in the current bucket", labels=labels)
+        faces = GaugeMetricFamily("rollup_face_count_events", "Events per face count in the current bucket",
+                                  labels=labels + ["faces"])
+        for device, name, bucket in self.rollups.latest():
+            values = [device, name]
+            mean.add_metric(values, bucket["mean"])
+            minimum.add_metric(values, bucket["min"])
+            maximum.add_metric(values, bucket["max"])
+            last.add_metric(values, bucket["last"])
+            count.add_metric(values, bucket["count"])
+            for i, n in enumerate(bucket["face_hist"]):
+                label = f"{i}+" if i == FACE_BINS - 1 else str(i)
+                faces.add_metric(values + [label], n)
+        yield from (mean, minimum, maximum, last, count, faces)
@@ -0,0 +1,382 @@
+import base64
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+# ------------------------
+# Begrenzter, spaltenorientierter Zeitreihen-Speicher für Edge-Events
+#
+# Pro Gerät:
+#   ts        float64  Unix-Sekunden (aus "timestamp", UTC)
+#   persons   int32    persons_detected
+#   face_off  int64    Index des ersten Gesichts im Face-Puffer
+#   face_n    int16    Anzahl Gesichter
+#   win_*     Kennzahlen von Fenster-Zusammenfassungen (EDGE_PUBLISH_MODE=window):
+#             seconds float32 (0 = Einzel-Event), frames/persons_min/persons_max
+#             int32, persons_mean float32; persons_last steht in persons
+# und ein Face-Seitenpuffer float32 (n, 5): conf, xmin, ymin, width, height.
+#
+# Die Zeilen sind nach ts sortiert (Bereichsabfragen per np.searchsorted).
+# Alte Zeilen fallen vorne heraus; der Puffer wird kompaktiert, sobald mehr als
+# die Hälfte ungenutzt ist. Die Kapazität verdoppelt sich nur bis zum Bedarf,
+# der Speicher bleibt also flach.
+#
+# Retention:
+#   STORE_RETENTION_SECONDS – Zeilen älter als (neueste ts - Retention) fallen weg
+#   STORE_MAX_BYTES         – Obergrenze über alle Geräte; es wird beim Gerät mit
+#                             der ältesten Zeile zuerst gekürzt. Anderer Speicher
+#                             des Servers (Rollups) zählt über reserved_bytes mit.
+#
+# /data liefert für Fenster-Zeilen wieder ein "window"-Objekt mit diesen
+# Kennzahlen. conf_hist/heatmap sowie weitere Payload-Felder (frame_seq, ...)
+# werden nicht gespeichert.
+#
+# query() liefert Kopien der Spalten (Snapshot) plus einen Cursor
+# (device_id, ts, skip) für die nächste Seite; Cursor sind gegenüber Trimmen
+# und Kompaktieren stabil, da sie auf Zeitstempeln statt Indizes basieren.
+
+ROW_BYTES = 8 + 4 + 8 + 2 + 4 + 4 + 4 + 4 + 4
+FACE_BYTES = 5 * 4
+_FACE_KEYS = ("conf", "xmin", "ymin", "width", "height")
+_COLUMNS = ("ts", "persons", "face_off", "face_n",
+            "win_seconds", "win_frames", "win_min", "win_max", "win_mean")
+
+
+def parse_timestamp(value):
+    """ISO timestamp (naive = UTC) or number -> Unix seconds; None -> now."""
+    if value is None:
+        return time.time()
+    if isinstance(value, (int, float)):
+        return float(value)
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def format_timestamp(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None).isoformat()
+
+
+class DeviceSeries:
+    def __init__(self, capacity=1024):
+        self.ts = np.empty(capacity, np.float64)
+        self.persons = np.empty(capacity, np.int32)
+        self.face_off = np.empty(capacity, np.int64)
+        self.face_n = np.empty(capacity, np.int16)
+        self.win_seconds = np.empty(capacity, np.float32)
+        self.win_frames = np.empty(capacity, np.int32)
+        self.win_min = np.empty(capacity, np.int32)
+        self.win_max = np.empty(capacity, np.int32)
+        self.win_mean = np.empty(capacity, np.float32)
+        self.faces = np.empty((capacity, 5), np.float32)
+        self.start = 0   # erste gültige Zeile
+        self.end = 0     # hinter der letzten Zeile
+        self.face_start = 0
+        self.face_end = 0
+        self.face_live = 0  # Gesichter, die noch von Zeilen referenziert werden
+
+    def __len__(self):
+        return self.end - self.start
+
+    @property
+    def nbytes(self):
+        return len(self) * ROW_BYTES + self.face_live * FACE_BYTES
+
+    @property
+    def first_ts(self):
+        return self.ts[self.start] if len(self) else None
+
+    @property
+    def last_ts(self):
+        return self.ts[self.end - 1] if len(self) else None
+
+    # ------------------------
+    # Schreiben
+
+    def append(self, ts, persons, faces, window=None):
+        self._reserve_rows(1)
+        self._reserve_faces(len(faces))
+
+        face_off = self.face_end
+        for face in faces:
+            self.faces[self.face_end] = [face.get(k, 0.0) for k in _FACE_KEYS]
+            self.face_end += 1
+        self.face_live += len(faces)
+
+        if len(self) and ts < self.ts[self.end - 1]:
+            # Verspätetes Event (z.B. Spool-Replay): sortiert einfügen
+            pos = self.start + int(np.searchsorted(self.ts[self.start:self.end], ts, side="right"))
+            for name in _COLUMNS:
+                col = getattr(self, name)
+                col[pos + 1:self.end + 1] = col[pos:self.end]
+        else:
+            pos = self.end
+        self.ts[pos] = ts
+        self.persons[pos] = persons
+        self.face_off[pos] = face_off
+        self.face_n[pos] = len(faces)
+        if window:
+            self.win_seconds[pos] = float(window.get("seconds", 0.0))
+            self.win_frames[pos] = int(window.get("frames", 0))
+            self.win_min[pos] = int(window.get("persons_min", persons))
+            self.win_max[pos] = int(window.get("persons_max", persons))
+            self.win_mean[pos] = float(window.get("persons_mean", persons))
+        else:
+            self.win_seconds[pos] = 0.0
+            self.win_frames[pos] = self.win_min[pos] = self.win_max[pos] = 0
+            self.win_mean[pos] = 0.0
+        self.end += 1
+
+    def _reserve_rows(self, n):
+        if self.end + n <= len(self.ts):
+            return
+        live = len(self)
+        capacity = len(self.ts)
+        if live + n > capacity // 2:
+            capacity = max(capacity * 2, live + n)
+        for name in _COLUMNS:
+            old = getattr(self, name)
+            new = np.empty(capacity, old.dtype) if capacity != len(old) else old
+            new[:live] = old[self.start:self.end]
+            setattr(self, name, new)
+        self.start, self.end = 0, live
+
+    def _reserve_faces(self, n):
+        if self.face_end + n <= len(self.faces):
+            return
+        # Gesichter vor der ältesten noch referenzierten Zeile sind frei
+        if len(self):
+            self.face_start = int(self.face_off[self.start:self.end].min())
+        else:
+            self.face_start = self.face_end
+        live = self.face_end - self.face_start
+        capacity = len(self.faces)
+        if live + n > capacity // 2:
+            capacity = max(capacity * 2, live + n)
+        new = np.empty((capacity, 5), np.float32) if capacity != len(self.faces) else self.faces
+        new[:live] = self.faces[self.face_start:self.face_end]
+        self.faces = new
+        self.face_off[self.start:self.end] -= self.face_start
+        self.face_start, self.face_end = 0, live
+
+    # ------------------------
+    # Retention
+
+    def drop_before(self, ts):
+        """Drop rows older than ts; returns the number of rows removed."""
+        cut = int(np.searchsorted(self.ts[self.start:self.end], ts, side="left"))
+        return self.drop_oldest(cut)
+
+    def drop_oldest(self, n):
+        n = min(n, len(self))
+        # Face-Speicher wird erst beim nächsten Kompaktieren wiederverwendet
+        self.face_live -= int(self.face_n[self.start:self.start + n].sum())
+        self.start += n
+        return n
+
+    # ------------------------
+    # Lesen
+
+    def range(self, since=None, until=None):
+        """Row slice [lo, hi) for since <= ts < until (vectorised binary search)."""
+        ts = self.ts[self.start:self.end]
+        lo = 0 if since is None else int(np.searchsorted(ts, since, side="left"))
+        hi = len(ts) if until is None else int(np.searchsorted(ts, until, side="left"))
+        return self.start + lo, self.start + max(lo, hi)
+
+    def snapshot(self, device, lo, hi):
+        face_off = self.face_off[lo:hi]
+        face_n = self.face_n[lo:hi]
+        if hi > lo and int(face_n.sum()):
+            f_lo = int(face_off.min())
+            f_hi = int((face_off + face_n).max())
+        else:
+            f_lo = f_hi = 0
+        return Snapshot(
+            device,
+            self.ts[lo:hi].copy(),
+            self.persons[lo:hi].copy(),
+            face_off - f_lo,
+            face_n.copy(),
+            self.faces[f_lo:f_hi].copy(),
+            {name: getattr(self, name)[lo:hi].copy() for name in _COLUMNS[4:]},
+        )
+
+
+class Snapshot:
+    """Copied-out rows of one device, independent of later store changes."""
+
+    def __init__(self, device, ts, persons, face_off, face_n, faces, windows):
+        self.device = device
+        self.ts = ts
+        self.persons = persons
+        self.face_off = face_off
+        self.face_n = face_n
+        self.faces = faces
+        self.windows = windows  # win_* Spalten
+
+    def __len__(self):
+        return len(self.ts)
+
+    def rows(self):
+        # Kürzeste float32-Darstellung (0.9 statt 0.8999999761581421), wie im Payload
+        faces = [[float(v) for v in face] for face in self.faces.astype(str).tolist()]
+        windows = zip(*(self.windows[name].tolist() for name in _COLUMNS[4:]))
+        for ts, persons, off, n, window in zip(self.ts.tolist(), self.persons.tolist(),
+                                               self.face_off.tolist(), self.face_n.tolist(), windows):
+            row = {
+                "device_id": self.device,
+                "timestamp": format_timestamp(ts),
+                "persons_detected": persons,
+                "faces": [dict(zip(_FACE_KEYS, face)) for face in faces[off:off + n]],
+            }
+            seconds, frames, lo, hi, mean = window
+            if seconds:
+                row["window"] = {
+                    "start": format_timestamp(ts - seconds),
+                    "end": format_timestamp(ts),
+                    "seconds": seconds,
+                    "frames": frames,
+                    "persons_min": lo,
+                    "persons_max": hi,
+                    "persons_mean": mean,
+                    "persons_last": persons,
+                }
+            yield row
+
+
+def encode_cursor(device, ts, skip):
+    raw = json.dumps([device, ts, skip], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """Opaque /data cursor -> (device_id, ts, skip); ValueError if malformed."""
+    try:
+        device, ts, skip = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return str(device), float(ts), int(skip)
+    except Exception as e:
+        raise ValueError(f"invalid cursor: {cursor}") from e
+
+
+class TimeSeriesStore:
+    def __init__(self, retention_seconds=7 * 24 * 3600, max_bytes=256 * 1024 * 1024):
+        self.retention_seconds = retention_seconds
+        self.max_bytes = max_bytes
+        # Callable -> Bytes, die außerhalb des Stores vom Budget belegt sind
+        self.reserved_bytes = None
+        self._series = {}
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            retention_seconds=float(os.getenv("STORE_RETENTION_SECONDS", str(7 * 24 * 3600))),
+            max_bytes=int(os.getenv("STORE_MAX_BYTES", str(256 * 1024 * 1024))),
+        )
+
+    def extend(self, payloads):
+        with self._lock:
+            for payload in payloads:
+                self._append(payload)
+            self._enforce_bytes()
+
+    def append(self, payload):
+        self.extend([payload])
+
+    def _append(self, payload):
+        device = payload.get("device_id", "unknown")
+        series = self._series.get(device)
+        if series is None:
+            series = self._series[device] = DeviceSeries()
+        ts = parse_timestamp(payload.get("timestamp"))
+        series.append(ts, int(payload.get("persons_detected", 0)), payload.get("faces") or [],
+                      payload.get("window"))
+        if self.retention_seconds:
+            self.evicted += series.drop_before(series.last_ts - self.retention_seconds)
+
+    def _enforce_bytes(self):
+        total = self.nbytes
+        budget = self.max_bytes - (self.reserved_bytes() if self.reserved_bytes else 0)
+        while total > budget and len(self):
+            # Gerät mit der ältesten Zeile kürzen, in Blöcken
+            oldest = min((s for s in self._series.values() if len(s)), key=lambda s: s.first_ts)
+            before = oldest.nbytes
+            self.evicted += oldest.drop_oldest(max(1, len(oldest) // 100))
+            total -= before - oldest.nbytes
+
+    @property
+    def nbytes(self):
+        return sum(s.nbytes for s in self._series.values())
+
+    def __len__(self):
+        return sum(len(s) for s in self._series.values())
+
+    def devices(self):
+        return sorted(self._series)
+
+    def query(self, device_id=None, since=None, until=None, limit=None, cursor=None):
+        """Plan a range scan over one or all devices.
+
+        Returns (chunks, next_cursor). Row positions are found by binary
+        search under the lock and copied out as compact numpy slices, so the
+        rows can be streamed afterwards without holding the lock.
+        next_cursor is None when the result is complete.
+        """
+        after = decode_cursor(cursor) if cursor else None
+        devices = [device_id] if device_id is not None else self.devices()
+        if after is not None:
+            devices = [d for d in devices if d >= after[0]]
+
+        chunks = []
+        remaining = limit
+        last = None  # (device, series, hi) der zuletzt gelieferten Zeile
+        with self._lock:
+            for device in devices:
+                series = self._series.get(device)
+                if series is None or not len(series):
+                    continue
+                lo, hi = series.range(since, until)
+                if after is not None and device == after[0]:
+                    _, cursor_ts, skip = after
+                    lo = max(lo, series.range(cursor_ts, None)[0] + skip)
+                if lo >= hi:
+                    continue
+                if remaining is not None and remaining <= 0:
+                    # Limit erreicht und es gibt weitere Zeilen
+                    return chunks, self._cursor_at(*last)
+                end = hi if remaining is None else min(hi, lo + remaining)
+                chunks.append(series.snapshot(device, lo, end))
+                last = (device, series, end)
+                if remaining is not None:
+                    remaining -= end - lo
+                    if end < hi:
+                        return chunks, self._cursor_at(*last)
+        return chunks, None
+
+    @staticmethod
+    def _cursor_at(device, series, end):
+        last_ts = series.ts[end - 1]
+        skip = end - series.range(last_ts, None)[0]
+        return encode_cursor(device, float(last_ts), skip)
+
+    def rows(self, device_id=None, since=None, until=None, limit=None, cursor=None):
+        """Yield stored events as payload dicts, per device in time order."""
+        chunks, _ = self.query(device_id, since, until, limit, cursor)
+        for chunk in chunks:
+            yield from chunk.rows()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "devices": len(self._series),
+                "rows": len(self),
+                "bytes": self.nbytes,
+                "evicted": self.evicted,
+            }
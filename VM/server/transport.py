@@ -0,0 +1,335 @@
+import os
+import socket
+import struct
+import threading
+import time
+from collections import deque
+
+from confluent_kafka import Producer, Consumer, KafkaError, KafkaException, TIMESTAMP_CREATE_TIME
+
+# ------------------------
+# Austauschbarer Transport zwischen Edge und Server
+#
+#   TRANSPORT=kafka   – confluent_kafka Producer/Consumer (Standard)
+#   TRANSPORT=unix    – Unix-Domain-Socket TRANSPORT_SOCKET (Standard /tmp/e2c.sock);
+#                       der Consumer (Server) lauscht, Producer (Edges) verbinden sich
+#   TRANSPORT=inproc  – In-Prozess-Queue pro Topic; Events werden als Objekt
+#                       übergeben, ohne Serialisierung (PAYLOAD_FORMAT=object).
+#                       Eine gemeinsame Condition weckt Consumer bei Nachrichten
+#                       auf jedem ihrer Topics.
+#
+# Die lokalen Transporte bieten die Teilmenge der confluent_kafka-API, die
+# EdgePublisher, Simulator und Server-Consumer nutzen (produce/poll/flush/len/
+# list_topics bzw. subscribe/poll/consume/commit/close). Fehler kommen als
+# echte KafkaError, damit Delivery-Reports und error_cb unverändert bleiben.
+# Lokal gibt es keine Offsets: commit() ist ein No-op (at-most-once).
+#
+# Identische Kopie in edge/transport.py und VM/server/transport.py – beide
+# Dateien gemeinsam ändern; tests/test_shared_copies.py und die CI prüfen das.
+
+TRANSPORTS = ("kafka", "unix", "inproc")
+DEFAULT_SOCKET = "/tmp/e2c.sock"
+
+_FRAME = struct.Struct("<IHHH")  # body len, topic len, key len, content-type len
+
+
+def transport_from_env():
+    name = os.getenv("TRANSPORT", "kafka").lower()
+    if name not in TRANSPORTS:
+        raise ValueError(f"unknown TRANSPORT: {name}")
+    return name
+
+
+def create_producer(config, transport=None):
+    transport = transport or transport_from_env()
+    if transport == "kafka":
+        return Producer(config)
+    if transport == "unix":
+        return UnixProducer(os.getenv("TRANSPORT_SOCKET", DEFAULT_SOCKET), config.get("error_cb"))
+    return InProcProducer()
+
+
+def create_consumer(config, transport=None):
+    transport = transport or transport_from_env()
+    if transport == "kafka":
+        return Consumer(config)
+    if transport == "unix":
+        return UnixConsumer(os.getenv("TRANSPORT_SOCKET", DEFAULT_SOCKET))
+    return InProcConsumer()
+
+
+class LocalMessage:
+    """Message object with the confluent_kafka.Message accessors in use."""
+
+    __slots__ = ("_topic", "_key", "_value", "_headers", "_ts", "_offset", "_error")
+
+    def __init__(self, topic, value, key=None, headers=None, offset=-1, error=None, ts=None):
+        self._topic = topic
+        self._value = value
+        self._key = key.encode("utf-8") if isinstance(key, str) else key
+        self._headers = headers
+        self._ts = ts if ts is not None else time.time()
+        self._offset = offset
+        self._error = error
+
+    def topic(self):
+        return self._topic
+
+    def partition(self):
+        return 0
+
+    def offset(self):
+        return self._offset
+
+    def key(self):
+        return self._key
+
+    def value(self):
+        return self._value
+
+    def headers(self):
+        return self._headers
+
+    def error(self):
+        return self._error
+
+    def timestamp(self):
+        return TIMESTAMP_CREATE_TIME, int(self._ts * 1000)
+
+    def latency(self):
+        return time.time() - self._ts
+
+
+class _LocalProducer:
+    """Delivery reports are queued on produce() and served by poll()/flush()."""
+
+    def __init__(self):
+        self._reports = deque()
+        self._offset = 0
+
+    def _report(self, on_delivery, err, msg):
+        if on_delivery is not None:
+            self._reports.append((on_delivery, err, msg))
+
+    def poll(self, timeout=None):
+        served = 0
+        while self._reports:
+            on_delivery, err, msg = self._reports.popleft()
+            on_delivery(err, msg)
+            served += 1
+        if not served and timeout:
+            time.sleep(min(timeout, 0.05))
+        return served
+
+    def flush(self, timeout=None):
+        self.poll(0)
+        return 0
+
+    def __len__(self):
+        return len(self._reports)
+
+    def list_topics(self, topic=None, timeout=-1):
+        return None
+
+
+# ------------------------
+# In-Prozess
+
+_topics = {}
+_topics_cond = threading.Condition()  # Queues der Topics und Wecken der Consumer
+
+
+def _topic_queue(topic):
+    with _topics_cond:
+        q = _topics.get(topic)
+        if q is None:
+            q = _topics[topic] = deque()
+        return q
+
+
+class InProcProducer(_LocalProducer):
+    def produce(self, topic, value=None, key=None, headers=None, on_delivery=None, callback=None):
+        self._offset += 1
+        msg = LocalMessage(topic, value, key, headers, self._offset)
+        with _topics_cond:
+            _topic_queue(topic).append(msg)
+            _topics_cond.notify_all()
+        self._report(on_delivery or callback, None, msg)
+
+
+class InProcConsumer:
+    def __init__(self):
+        self._queues = []
+        self._cond = _topics_cond
+
+    def subscribe(self, topics):
+        with self._cond:
+            self._queues = [_topic_queue(t) for t in topics]
+
+    def consume(self, num_messages=1, timeout=-1):
+        deadline = None if timeout is None or timeout < 0 else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                msgs = self._drain(num_messages)
+                if msgs or not self._queues:
+                    return msgs
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return []
+                # wacht bei Nachrichten auf jedem abonnierten Topic auf
+                self._cond.wait(remaining)
+
+    def _drain(self, n):
+        msgs = []
+        for q in self._queues:
+            while q and len(msgs) < n:
+                msgs.append(q.popleft())
+        return msgs
+
+    def poll(self, timeout=None):
+        msgs = self.consume(1, timeout if timeout is not None else -1)
+        return msgs[0] if msgs else None
+
+    def commit(self, *args, **kwargs):
+        return None
+
+    def close(self):
+        with self._cond:
+            self._queues = []
+            self._cond.notify_all()
+
+
+# ------------------------
+# Unix-Domain-Socket
+
+def _encode_frame(topic, key, content_type, value):
+    topic = topic.encode("utf-8")
+    key = key.encode("utf-8") if isinstance(key, str) else (key or b"")
+    content_type = content_type or b""
+    value = value.encode("utf-8") if isinstance(value, str) else bytes(value)
+    body_len = len(topic) + len(key) + len(content_type) + len(value)
+    return _FRAME.pack(body_len, len(topic), len(key), len(content_type)) + topic + key + content_type + value
+
+
+def _content_type(headers):
+    for name, val in headers or ():
+        if name.lower() == "content-type":
+            return val.encode("utf-8") if isinstance(val, str) else val
+    return None
+
+
+class UnixProducer(_LocalProducer):
+    def __init__(self, path, error_cb=None):
+        super().__init__()
+        self.path = path
+        self.error_cb = error_cb
+        self._sock = None
+        self._lock = threading.Lock()
+        self._connect()
+
+    def _connect(self):
+        try:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.connect(self.path)
+            self._sock = sock
+            return True
+        except OSError as e:
+            self._sock = None
+            if self.error_cb is not None:
+                self.error_cb(KafkaError(KafkaError._ALL_BROKERS_DOWN, f"{self.path}: {e}"))
+            return False
+
+    def produce(self, topic, value=None, key=None, headers=None, on_delivery=None, callback=None):
+        self._offset += 1
+        msg = LocalMessage(topic, value, key, headers, self._offset)
+        frame = _encode_frame(topic, key, _content_type(headers), value)
+        with self._lock:
+            err = None
+            for _ in range(2):
+                if self._sock is None and not self._connect():
+                    err = KafkaError(KafkaError._TRANSPORT, f"cannot connect to {self.path}")
+                    break
+                try:
+                    self._sock.sendall(frame)
+                    err = None
+                    break
+                except OSError as e:
+                    self._sock.close()
+                    self._sock = None
+                    err = KafkaError(KafkaError._TRANSPORT, str(e))
+        self._report(on_delivery or callback, err, msg)
+
+    def list_topics(self, topic=None, timeout=-1):
+        with self._lock:
+            if self._sock is None and not self._connect():
+                raise KafkaException(KafkaError(KafkaError._TRANSPORT, f"cannot connect to {self.path}"))
+
+    def flush(self, timeout=None):
+        self.poll(0)
+        return 0
+
+
+class UnixConsumer(InProcConsumer):
+    """Listens on the socket; every connection is read by its own thread into one queue."""
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self._cond = threading.Condition()
+        self._inbox = deque()
+        self._topics = set()
+        if os.path.exists(path):
+            os.remove(path)
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(path)
+        self._server.listen()
+        self._offset = 0
+        self._offset_lock = threading.Lock()
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def subscribe(self, topics):
+        with self._cond:
+            self._topics = set(topics)
+            self._queues = [self._inbox]
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._read_loop, args=(conn,), daemon=True).start()
+
+    def _read_loop(self, conn):
+        reader = conn.makefile("rb")
+        try:
+            while True:
+                head = reader.read(_FRAME.size)
+                if len(head) < _FRAME.size:
+                    return
+                body_len, topic_len, key_len, ct_len = _FRAME.unpack(head)
+                body = reader.read(body_len)
+                if len(body) < body_len:
+                    return
+                topic = body[:topic_len].decode("utf-8")
+                if self._topics and topic not in self._topics:
+                    continue
+                key = body[topic_len:topic_len + key_len] or None
+                content_type = body[topic_len + key_len:topic_len + key_len + ct_len]
+                value = body[topic_len + key_len + ct_len:]
+                headers = [("content-type", content_type)] if content_type else None
+                with self._offset_lock:
+                    self._offset += 1
+                    offset = self._offset
+                with self._cond:
+                    self._inbox.append(LocalMessage(topic, value, key, headers, offset))
+                    self._cond.notify_all()
+        finally:
+            reader.close()
+            conn.close()
+
+    def close(self):
+        super().close()
+        self._server.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
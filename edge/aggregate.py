@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# ------------------------
+# Fenster-Aggregation vor dem Kafka-Producer (EDGE_PUBLISH_MODE=window)
+#
+# Statt jedes Einzelergebnisses wird pro Stream nur eine Zusammenfassung je
+# Fenster gesendet:
+#   persons_min / persons_max / persons_mean / persons_last
+#   conf_hist  – Histogramm der Face-Konfidenzen (AGG_CONF_BINS Bins über 0..1)
+#   heatmap    – AGG_GRID x AGG_GRID Zähler der Box-Mittelpunkte, zeilenweise
+#
+# AGG_WINDOW_SECONDS ist die Fensterlänge, AGG_SLIDE_SECONDS der Abstand der
+# Ausgaben (Standard = Fensterlänge -> tumbling; kleiner -> sliding). Fenster
+# sind an Vielfache von slide ausgerichtet; leere Fenster werden nicht gesendet.
+# persons_detected = persons_last und faces = [], damit bestehende Consumer
+# weiter funktionieren.
+
+
+class WindowAggregator:
+    def __init__(self, window_seconds=10.0, slide_seconds=None, conf_bins=10, grid=4):
+        slide_seconds = slide_seconds or window_seconds
+        if window_seconds <= 0 or slide_seconds <= 0 or slide_seconds > window_seconds:
+            raise ValueError("need 0 < slide_seconds <= window_seconds")
+        self.window_seconds = window_seconds
+        self.slide_seconds = slide_seconds
+        self.conf_bins = conf_bins
+        self.grid = grid
+        self._lock = threading.Lock()
+        # (ts, persons, [conf, ...], [cell, ...]) – nur was für ein Fenster noch gebraucht wird
+        self._samples = deque()
+        self._next_emit = None
+        self.device_id = None
+        self.emitted = 0
+
+    @classmethod
+    def from_env(cls):
+        window = float(os.getenv("AGG_WINDOW_SECONDS", "10"))
+        return cls(
+            window_seconds=window,
+            slide_seconds=float(os.getenv("AGG_SLIDE_SECONDS", "0")) or window,
+            conf_bins=int(os.getenv("AGG_CONF_BINS", "10")),
+            grid=int(os.getenv("AGG_GRID", "4")),
+        )
+
+    def _cell(self, face):
+        cx = face["xmin"] + face["width"] / 2
+        cy = face["ymin"] + face["height"] / 2
+        col = min(self.grid - 1, max(0, int(cx * self.grid)))
+        row = min(self.grid - 1, max(0, int(cy * self.grid)))
+        return row * self.grid + col
+
+    def add(self, result, now=None):
+        """Add one per-frame result; returns the window summaries that became due."""
+        now = now or time.time()
+        faces = result.get("faces") or []
+        sample = (
+            now,
+            int(result.get("persons_detected", 0)),
+            [float(f["conf"]) for f in faces],
+            [self._cell(f) for f in faces],
+        )
+        with self._lock:
+            self.device_id = result.get("device_id", self.device_id)
+            if self._next_emit is None:
+                self._next_emit = (now // self.slide_seconds + 1) * self.slide_seconds
+            summaries = self._due(now)
+            self._samples.append(sample)
+        return summaries
+
+    def flush(self, now=None):
+        """Emit windows that closed without new frames (called periodically)."""
+        with self._lock:
+            return self._due(now or time.time())
+
+    def _due(self, now):
+        summaries = []
+        while self._next_emit is not None and self._next_emit <= now:
+            end = self._next_emit
+            start = end - self.window_seconds
+            while self._samples and self._samples[0][0] < start:
+                self._samples.popleft()
+            window = [s for s in self._samples if s[0] < end]
+            if window:
+                summaries.append(self._summarize(window, start, end))
+            self._next_emit += self.slide_seconds
+            if not self._samples:
+                # Leerlauf: nicht jedes leere Fenster einzeln durchlaufen
+                self._next_emit = max(self._next_emit, (now // self.slide_seconds + 1) * self.slide_seconds)
+        self.emitted += len(summaries)
+        return summaries
+
+    def _summarize(self, window, start, end):
+        persons = [s[1] for s in window]
+        conf_hist = [0] * self.conf_bins
+        heatmap = [0] * (self.grid * self.grid)
+        for _, _, confs, cells in window:
+            for conf in confs:
+                conf_hist[min(self.conf_bins - 1, max(0, int(conf * self.conf_bins)))] += 1
+            for cell in cells:
+                heatmap[cell] += 1
+        return {
+            "device_id": self.device_id,
+            "timestamp": datetime.utcfromtimestamp(end).isoformat(),
+            "persons_detected": persons[-1],
+            "faces": [],
+            "window": {
+                "start": datetime.utcfromtimestamp(start).isoformat(),
+                "end": datetime.utcfromtimestamp(end).isoformat(),
+                "seconds": self.window_seconds,
+                "slide": self.slide_seconds,
+                "frames": len(window),
+                "persons_min": min(persons),
+                "persons_max": max(persons),
+                "persons_mean": sum(persons) / len(persons),
+                "persons_last": persons[-1],
+                "conf_hist": conf_hist,
+                "grid": self.grid,
+                "heatmap": heatmap,
+            },
+        }
@@ -1,149 +1,334 @@
-import time
-import json
 import os
 import sys
+import time
+import logging
 from datetime import datetime
-from confluent_kafka import Producer
 import threading
-import cv2
-from infer.infer_face_pose import get_person_data
-from flask import Flask, request, jsonify, make_response
-import base64
-import numpy as np
+from infer.worker_pool import InferencePool, workers_from_env
+from infer.motion_gate import MotionGate
+from infer.tracker import FaceTracker
+from infer.preprocess import input_max_side_from_env
+from hw.ingest import decode_frame_request, FrameDecodeError
+from hw.streams import StreamRegistry, StreamLimitError, DEFAULT_STREAM
+from flask import Flask, request, jsonify, make_response, Response
+from prometheus_client import generate_latest, REGISTRY, CONTENT_TYPE_LATEST
+from publish import EdgePublisher, producer_config_from_env
+from transport import transport_from_env
+from spool import SegmentSpool
+from aggregate import WindowAggregator
+from tracing import Trace, capture_ts_from_request
+from logsetup import setup_logging, sampled
+import metrics
 
 # ------------------------
 # Flask Setup
 app = Flask(__name__)
-CURRENT_FRAME_PATH = "/tmp/frame.jpg"
 DEVICE_ID = os.getenv("DEVICE_ID", "edge-3")
 TOPIC = os.getenv("TOPIC", "edge-data")
 BOOTSTRAP = os.getenv("BOOTSTRAP_SERVERS", "34.67.127.119:9092")
+SPOOL_ENABLED = os.getenv("SPOOL_ENABLED", "1") == "1"
+PUBLISH_MODE = os.getenv("EDGE_PUBLISH_MODE", "raw")  # raw | window
+INFER_WORKERS = workers_from_env()
+INPUT_MAX_SIDE = input_max_side_from_env()
 
 # ------------------------
-# Kafka Producer
-producer = None
-def delivery_report(err, msg):
-    if err is not None:
-        print(f"[EDGE] ❌ Delivery failed: {err}", flush=True)
-    else:
-        print(f"[EDGE] ✅ Delivered to {msg.topic()} [{msg.partition()}] @ offset {msg.offset()}", flush=True)
+# Kafka Publisher – jedes neue Ergebnis genau einmal, Key = device_id
+# Broker weg -> Events landen im Spool (SPOOL_DIR) und werden später nachgesendet
+publisher = None
 
-try:
-    producer = Producer({"bootstrap.servers": BOOTSTRAP, "linger.ms": 10})
-    print(f"[EDGE] Kafka producer initialized ({BOOTSTRAP})", flush=True)
-except Exception as e:
-    print("⚠️ Kafka disabled:", e, flush=True)
+def init_publisher():
+    # Nicht beim Import: spawn-Worker importieren dieses Modul erneut
+    global publisher
+    try:
+        spool = SegmentSpool.from_env() if SPOOL_ENABLED else None
+        publisher = EdgePublisher(TOPIC, producer_config_from_env(BOOTSTRAP), spool=spool,
+                                  on_delivered=metrics.DELIVERY_SECONDS.observe)
+        print(f"[EDGE] Kafka producer initialized ({BOOTSTRAP})", flush=True)
+    except Exception as e:
+        print("⚠️ Kafka disabled:", e, flush=True)
 
-sys.stdout.reconfigure(line_buffering=True)
-print("[EDGE] Edge running", flush=True)
+# ------------------------
+# EDGE_PUBLISH_MODE=window: je Stream nur Fenster-Statistiken statt jedes Ergebnisses
+aggregators = {}
+
+def publish_result(stream, result):
+    if not publisher:
+        return
+    if PUBLISH_MODE != "window":
+        with metrics.PRODUCE_SECONDS.time():
+            publisher.publish(result)
+        return
+    aggregator = aggregators.get(stream.stream_id)
+    if aggregator is None:
+        aggregator = aggregators[stream.stream_id] = WindowAggregator.from_env()
+    for summary in aggregator.add(result):
+        with metrics.PRODUCE_SECONDS.time():
+            publisher.publish(summary)
+
+def window_flush_loop():
+    # Fenster schließen auch, wenn keine neuen Frames mehr kommen
+    while True:
+        time.sleep(1.0)
+        for aggregator in list(aggregators.values()):
+            for summary in aggregator.flush():
+                with metrics.PRODUCE_SECONDS.time():
+                    publisher.publish(summary)
 
 # ------------------------
-# Globaler Speicher für letzte Inferenz
-last_result = {
-    "device_id": DEVICE_ID,
-    "timestamp": None,
-    "persons_detected": 0,
-    "faces": []
-}
+# Streams (Kameras): je Stream ein Frame-Slot (latest wins) und die letzte Inferenz
+# Ohne ?stream=... landet alles im Default-Stream mit DEVICE_ID
+streams = StreamRegistry.from_env(DEVICE_ID)
+
+def stream_id_from_request():
+    return request.args.get("stream") or request.headers.get("X-Stream-Id") or DEFAULT_STREAM
 
 # ------------------------
 # Flask /frame POST – nur Frame speichern
+# Akzeptiert image/jpeg, multipart/form-data oder die alte base64 data-URL
 @app.route("/frame", methods=["POST"])
 def frame():
-    data = request.data.decode()
-    if "," not in data:
-        return "invalid data", 400
     try:
-        jpg = base64.b64decode(data.split(",", 1)[1])
-    except Exception as e:
-        print("[EDGE] base64 decode failed:", e, flush=True)
-        return "bad image", 400
-
-    npimg = np.frombuffer(jpg, dtype=np.uint8)
-    image = cv2.imdecode(npimg, cv2.IMREAD_COLOR)
-    if image is None:
-        print("[EDGE] cv2.imdecode failed", flush=True)
-        return "bad jpeg", 400
-
-    cv2.imwrite(CURRENT_FRAME_PATH, image)
-    print("[EDGE] wrote /tmp/frame.jpg", flush=True)
+        stream = streams.get(stream_id_from_request())
+    except StreamLimitError as e:
+        return str(e), 429
+    metrics.INGEST_RATE.tick()
+    trace = Trace(capture_ts_from_request(request))
+    try:
+        with metrics.DECODE_SECONDS.labels(stream=stream.stream_id).time():
+            image = decode_frame_request(request, INPUT_MAX_SIDE)
+    except FrameDecodeError as e:
+        sampled("decode_error", logging.WARNING, "%s", e)
+        return e.reply, 400
+    trace.mark("decode")
+
+    stream.slot.put(image, trace=trace)
     return "ok"
 
 # ------------------------
-# Flask /frame_data GET – liefert letzte Bounding Boxes
+# Flask /frame_data GET – liefert letzte Bounding Boxes des Streams
 @app.route("/frame_data", methods=["GET"])
 def frame_data():
-    global last_result
-    response = make_response(jsonify({"faces": last_result["faces"]}))
+    stream = streams.get(stream_id_from_request(), create=False)
+    faces = stream.last_result["faces"] if stream else []
+    response = make_response(jsonify({"faces": faces}))
     response.headers["Access-Control-Allow-Origin"] = "*"
     return response
 
 # ------------------------
-# Inferenz-Loop – aktualisiert globalen Speicher
-def inference_loop():
-    global last_result
-    while True:
-        image = cv2.imread(CURRENT_FRAME_PATH)
-        if image is None:
-            time.sleep(1)
-            continue
-
-        persons_detected, faces, _ = get_person_data(image)
-
-        # Ergebnis in globalem Speicher aktualisieren
-        last_result = {
-            "device_id": DEVICE_ID,
-            "timestamp": datetime.utcnow().isoformat(),
-            "persons_detected": persons_detected,
-            "faces": faces
+# Flask /stats GET – Zähler je Stream (empfangen, verworfen, durch Gate gespart)
+# sowie Kafka-/Spool-Zustand
+@app.route("/stats", methods=["GET"])
+def stats():
+    result = {}
+    for stream in streams.streams():
+        gate = gates.get(stream.stream_id)
+        tracker = trackers.get(stream.stream_id)
+        result[stream.stream_id] = {
+            "device_id": stream.device_id,
+            "frames_received": stream.slot.received,
+            "frames_dropped": stream.slot.dropped,
+            "gate_checked": gate.checked if gate else 0,
+            "inferences_saved": gate.saved if gate else 0,
+            "detections": tracker.detections if tracker else 0,
+            "tracked_frames": tracker.tracked_frames if tracker else 0,
+            "unique_persons": tracker.unique_persons if tracker else 0,
+            "windows_published": aggregators[stream.stream_id].emitted if stream.stream_id in aggregators else 0,
         }
-
-        print("🚨 EDGE RUNNING 🚨", last_result, flush=True)
-        time.sleep(2)
+    return jsonify({
+        "streams": result,
+        "kafka": publisher.stats() if publisher else None,
+    })
 
 # ------------------------
-# Kafka-Loop – liest globalen Speicher
-def kafka_loop():
-    global last_result
-    while True:
-        if producer and last_result["timestamp"] is not None:
-            try:
-                producer.produce(TOPIC, json.dumps(last_result), callback=delivery_report)
-                producer.poll(1)
-            except Exception as e:
-                print("[EDGE] Kafka produce failed:", e, flush=True)
-        time.sleep(5)
+# Motion-Gate je Stream – statische Szenen übernehmen das letzte Ergebnis
+# hold=True: eine Detektion ist noch unterwegs; deren Ergebnis gilt auch für
+# diesen Frame, es wird nichts (Veraltetes) gespeichert
+gates = {}
+
+def scene_changed(stream, frame, hold=False):
+    gate = gates.get(stream.stream_id)
+    if gate is None:
+        gate = gates[stream.stream_id] = MotionGate.from_env()
+    if gate.should_infer(frame.image):
+        return True
+    if not hold:
+        previous = stream.last_result
+        store_result(frame, previous["persons_detected"], previous["faces"])
+    return False
 
 # ------------------------
-if __name__ == "__main__":
-    # Start Inferenz-Loop
-    t1 = threading.Thread(target=inference_loop, daemon=True)
-    t1.start()
-
-    # Start Kafka-Loop
-    t2 = threading.Thread(target=kafka_loop, daemon=True)
-    t2.start()
-
-    # Start Flask-App
-    app.run(host="0.0.0.0", port=9001)
-
-
-
-
-
-
-
-
-
-
+# Tracker je Stream – Detector nur alle TRACK_DETECT_EVERY Frames
+trackers = {}
 
+def stream_tracker(stream):
+    tracker = trackers.get(stream.stream_id)
+    if tracker is None:
+        tracker = trackers[stream.stream_id] = FaceTracker.from_env()
+    return tracker
 
+# ------------------------
+# Flask /metrics GET – Prometheus (Latenzen, fps, Zähler, Prozess-CPU/RSS)
+REGISTRY.register(metrics.EdgeCollector(streams, gates, trackers, lambda: publisher))
 
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    return Response(generate_latest(), mimetype=CONTENT_TYPE_LATEST)
 
+# ------------------------
+# Inferenz – aktualisiert globalen Speicher
+def store_result(frame, persons_detected, faces):
+    stream = streams.get(frame.stream_id)
+    if stream.last_result.get("frame_seq", 0) > frame.seq:
+        return  # Pool-Ergebnis eines älteren Frames, bereits überholt
+    if frame.trace is not None:
+        frame.trace.mark("infer")
+        if "dequeue_ms" in frame.trace.marks:
+            seconds = (frame.trace.marks["infer_ms"] - frame.trace.marks["dequeue_ms"]) / 1000.0
+            metrics.INFERENCE_SECONDS.labels(stream=stream.stream_id).observe(seconds)
+    metrics.FRAMES_INFERRED.labels(stream=stream.stream_id).inc()
+    metrics.INFERENCE_RATE.tick()
+    stream.last_result = {
+        "device_id": stream.device_id,
+        "timestamp": datetime.utcnow().isoformat(),
+        "frame_seq": frame.seq,
+        "captured_at": datetime.utcfromtimestamp(frame.captured_at).isoformat(),
+        "persons_detected": persons_detected,
+        "faces": faces,
+        "trace": frame.trace,
+    }
+    sampled("result", logging.INFO, "result %s dropped=%d", stream.last_result, stream.slot.dropped)
+    publish_result(stream, stream.last_result)
+
+def mark_dequeued(frame):
+    # Start der Inferenz-Latenz (edge_inference_seconds)
+    if frame.trace is not None:
+        frame.trace.mark("dequeue")
 
+def inference_loop():
+    from infer.infer_face_pose import get_person_data
+    while True:
+        # Wartet, bis irgendein Stream einen neuen Frame hat – kein Polling, kein Sleep
+        item = streams.next_frame(timeout=1.0)
+        if item is None:
+            continue
 
+        stream, frame = item
+        mark_dequeued(frame)
+        if not scene_changed(stream, frame):
+            continue
 
+        tracker = stream_tracker(stream)
+        if not tracker.enabled:
+            persons_detected, faces, _ = get_person_data(frame.image)
+        else:
+            # Graustufen vor get_person_data – das zeichnet in das Bild
+            gray = tracker.prepare(frame.image)
+            if tracker.needs_detection():
+                _, faces, _ = get_person_data(frame.image)
+                faces = tracker.update(gray, faces)
+            else:
+                faces = tracker.track(gray)
+            persons_detected = len(faces)
+        store_result(frame, persons_detected, faces)
 
+# ------------------------
+# Pool-Modus: offene Detektionen je Stream. Solange eine läuft, werden Frames
+# dieses Streams weder vom Gate wiederverwendet noch getrackt – ein solches
+# Ergebnis hätte die neuere seq und würde das ausstehende Pool-Ergebnis
+# in store_result() verdrängen. Pool-Ergebnisse untereinander kommen in
+# Einreichungsreihenfolge.
+pool_pending = {}
+pool_pending_lock = threading.Lock()
+
+def detection_in_flight(stream_id):
+    with pool_pending_lock:
+        return pool_pending.get(stream_id, 0) > 0
+
+def begin_pool_detection(frame):
+    with pool_pending_lock:
+        pool_pending[frame.stream_id] = pool_pending.get(frame.stream_id, 0) + 1
+
+def end_pool_detection(frame):
+    with pool_pending_lock:
+        pool_pending[frame.stream_id] -= 1
+
+def pool_result(frame, persons_detected, faces):
+    tracker = trackers.get(frame.stream_id)
+    if tracker is not None and tracker.enabled:
+        faces = tracker.finish_detection(frame.seq, faces)
+        persons_detected = len(faces)
+    # Erst speichern, dann freigeben: das Gate übernimmt danach dieses Ergebnis
+    store_result(frame, persons_detected, faces)
+    end_pool_detection(frame)
+
+def pool_error(frame):
+    # Worker-Fehler, -Absturz oder Frame zu groß: Gate und Tracker wieder freigeben
+    tracker = trackers.get(frame.stream_id)
+    if tracker is not None:
+        tracker.cancel_detection(frame.seq)
+    end_pool_detection(frame)
+
+def next_pool_frame():
+    # Gate und Tracker laufen im Hauptprozess; nur echte Detektionen gehen an den Pool
+    while True:
+        stream, frame = streams.next_frame()
+        mark_dequeued(frame)
+        held = detection_in_flight(stream.stream_id)
+        if not scene_changed(stream, frame, hold=held):
+            continue
+        tracker = stream_tracker(stream)
+        if not tracker.enabled:
+            begin_pool_detection(frame)
+            return frame
+        if held:
+            continue  # Tracker wartet auf die laufende Detektion
+        gray = tracker.prepare(frame.image)
+        if tracker.needs_detection():
+            tracker.begin_detection(frame.seq, gray)
+            begin_pool_detection(frame)
+            return frame
+        faces = tracker.track(gray)
+        store_result(frame, len(faces), faces)
+
+def pool_dispatch_loop(pool):
+    # Erst auf einen freien Shared-Memory-Slot warten, dann den jeweils neuesten Frame holen
+    while True:
+        slot = pool.reserve(timeout=1.0)
+        if slot is None:
+            continue
+        frame = next_pool_frame()
+        if not pool.submit(frame, slot):
+            pool_error(frame)
 
+# ------------------------
+def run(colocated=False):
+    """Start inference and serve the edge app (blocks).
+
+    TRANSPORT=inproc needs the server consumer in this process, see colocated.py.
+    """
+    sys.stdout.reconfigure(line_buffering=True)
+    if transport_from_env() == "inproc" and not colocated:
+        sys.exit("[EDGE] TRANSPORT=inproc needs the server in the same process: run colocated.py")
+    setup_logging()
+    init_publisher()
+    print(f"[EDGE] Edge running (publish mode: {PUBLISH_MODE})", flush=True)
+    if publisher and PUBLISH_MODE == "window":
+        threading.Thread(target=window_flush_loop, daemon=True).start()
+
+    # Start Inferenz: im Prozess oder über den Worker-Pool (INFER_WORKERS)
+    if INFER_WORKERS > 0:
+        pool = InferencePool(INFER_WORKERS, on_result=pool_result, on_error=pool_error)
+        t1 = threading.Thread(target=pool_dispatch_loop, args=(pool,), daemon=True)
+    else:
+        t1 = threading.Thread(target=inference_loop, daemon=True)
+    t1.start()
 
+    # Start Flask-App; beim Beenden ausstehende Kafka-Nachrichten flushen
+    try:
+        app.run(host="0.0.0.0", port=9001)
+    finally:
+        if publisher:
+            publisher.close()
 
+if __name__ == "__main__":
+    run()
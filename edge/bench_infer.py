@@ -0,0 +1,176 @@
+"""
+Offline benchmark for the edge inference pipeline.
+
+Replays a directory of JPEG/PNG frames or a video file through
+InferencePipeline as fast as possible (CPU only, no network) and reports
+throughput, per-stage latency percentiles and peak RSS as JSON.
+
+Usage:
+    PYTHONPATH=edge python edge/bench_infer.py --frames samples/ --profile prod
+    PYTHONPATH=edge python edge/bench_infer.py --video clip.mp4 --backend onnx \
+        --max-side 480 --output bench/onnx-480.json
+
+Frames are loaded and JPEG-encoded into memory before the timed run, so the
+"decode" stage is measured but disk I/O is not.
+"""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+# CPU-only: keine GPU-Delegates, auch falls vorhanden
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+
+import cv2
+import numpy as np
+
+from infer.pipeline import InferencePipeline, PROFILES, STAGES
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Benchmark the edge inference pipeline offline.")
+    src = p.add_mutually_exclusive_group(required=True)
+    src.add_argument("--frames", help="Directory with .jpg/.png frames (sorted by name).")
+    src.add_argument("--video", help="Video file to replay.")
+    p.add_argument("--profile", default="prod", choices=sorted(PROFILES), help="Pipeline profile.")
+    p.add_argument("--stages", help="Explicit comma-separated stages (overrides --profile); "
+                                    "decode is always added, frames are JPEG bytes.")
+    p.add_argument("--backend", default=os.getenv("FACE_DETECTOR", "mediapipe"), help="Face detector backend.")
+    p.add_argument("--max-side", type=int, default=640, help="Detector input long side, 0 = full resolution.")
+    p.add_argument("--max-frames", type=int, default=500, help="Frames to load from the source.")
+    p.add_argument("--repeat", type=int, default=1, help="Replay the loaded frames N times.")
+    p.add_argument("--warmup", type=int, default=10, help="Untimed frames before measuring.")
+    p.add_argument("--threads", type=int, default=0, help="cv2.setNumThreads (0 = OpenCV default).")
+    p.add_argument("--jpeg-quality", type=int, default=70, help="Re-encode quality for video frames.")
+    p.add_argument("--output", help="Write the JSON report here instead of stdout.")
+    args = p.parse_args()
+    if args.stages:
+        stages = {s.strip() for s in args.stages.split(",") if s.strip()}
+        unknown = stages - set(STAGES)
+        if unknown:
+            p.error(f"unknown stages {sorted(unknown)}, choose from {', '.join(STAGES)}")
+        # Die Frames liegen als JPEG-Bytes vor, ohne decode bricht run() ab
+        args.stages = ("decode",) + tuple(s for s in STAGES if s in stages and s != "decode")
+    return args
+
+
+def load_frames(args):
+    """Return a list of encoded JPEG/PNG byte strings."""
+    frames = []
+    if args.frames:
+        names = sorted(n for n in os.listdir(args.frames) if n.lower().endswith(IMAGE_EXTENSIONS))
+        for name in names[:args.max_frames]:
+            with open(os.path.join(args.frames, name), "rb") as f:
+                frames.append(f.read())
+    else:
+        cap = cv2.VideoCapture(args.video)
+        while len(frames) < args.max_frames:
+            ok, image = cap.read()
+            if not ok:
+                break
+            ok, buf = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, args.jpeg_quality])
+            if ok:
+                frames.append(buf.tobytes())
+        cap.release()
+    return frames
+
+
+def percentiles(samples):
+    arr = np.asarray(samples) * 1000.0
+    return {
+        "count": int(arr.size),
+        "mean_ms": float(arr.mean()),
+        "p50_ms": float(np.percentile(arr, 50)),
+        "p95_ms": float(np.percentile(arr, 95)),
+        "p99_ms": float(np.percentile(arr, 99)),
+        "max_ms": float(arr.max()),
+    }
+
+
+def peak_rss_bytes():
+    # Linux: ru_maxrss in KiB, macOS in Bytes
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def main():
+    args = parse_args()
+    if args.threads:
+        cv2.setNumThreads(args.threads)
+
+    frames = load_frames(args)
+    if not frames:
+        print("no frames found", file=sys.stderr)
+        return 1
+
+    stages = args.stages or PROFILES[args.profile]
+    pipeline = InferencePipeline(
+        stages,
+        output_path=os.path.join(tempfile.gettempdir(), "bench_frame_out.jpg"),
+        max_side=args.max_side,
+        face_backend=args.backend,
+    )
+
+    for i in range(min(args.warmup, len(frames))):
+        pipeline.run(frames[i])
+
+    stage_samples = {}
+    totals = []
+    persons = 0
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for jpg in frames:
+            t = time.perf_counter()
+            result = pipeline.run(jpg)
+            totals.append(time.perf_counter() - t)
+            persons += result.persons_detected
+            for stage, seconds in result.timings.items():
+                stage_samples.setdefault(stage, []).append(seconds)
+    wall = time.perf_counter() - start
+
+    report = {
+        "config": {
+            "source": args.frames or args.video,
+            "stages": list(pipeline.stages),
+            "backend": args.backend,
+            "max_side": args.max_side,
+            "threads": args.threads or cv2.getNumThreads(),
+            "frames_loaded": len(frames),
+            "repeat": args.repeat,
+        },
+        "env": {
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+        },
+        "frames": len(totals),
+        "wall_s": wall,
+        "throughput_fps": len(totals) / wall if wall > 0 else 0.0,
+        "persons_detected_total": persons,
+        "latency": {"total": percentiles(totals)},
+        "peak_rss_bytes": peak_rss_bytes(),
+    }
+    for stage, samples in stage_samples.items():
+        report["latency"][stage] = percentiles(samples)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+        print(f"[BENCH] {report['throughput_fps']:.1f} fps over {len(totals)} frames -> {args.output}")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
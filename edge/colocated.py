@@ -0,0 +1,56 @@
+"""
+Edge and server in one process, connected by the in-process transport.
+
+For a single box where the edge app and the VM server run side by side:
+events go from EdgePublisher to the server's batch consumer as Python
+objects through one shared queue (TRANSPORT=inproc, PAYLOAD_FORMAT=object),
+without a broker or serialisation. The spool and the server's event log
+still write JSON to disk.
+
+edge/ and VM/server/ keep identical copies of payload.py and transport.py;
+edge/ comes first on sys.path, so both sides import the same module and
+share its queues. The server's main.py is loaded under the name
+server_main because edge/ has a main.py of its own.
+
+Usage:
+    python edge/colocated.py            # edge on :9001, server on :5000
+"""
+
+import importlib.util
+import os
+import sys
+import threading
+
+EDGE_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_DIR = os.path.join(os.path.dirname(EDGE_DIR), "VM", "server")
+
+
+def load_server():
+    sys.path.append(SERVER_DIR)
+    spec = importlib.util.spec_from_file_location("server_main", os.path.join(SERVER_DIR, "main.py"))
+    server = importlib.util.module_from_spec(spec)
+    sys.modules["server_main"] = server
+    spec.loader.exec_module(server)
+    return server
+
+
+def main():
+    os.environ["TRANSPORT"] = "inproc"
+    os.environ.setdefault("PAYLOAD_FORMAT", "object")
+    sys.path.insert(0, EDGE_DIR)
+
+    server = load_server()
+    server.init_eventlog()
+    server.start_consumers()
+    threading.Thread(
+        target=server.app.run,
+        kwargs={"host": "0.0.0.0", "port": int(os.getenv("SERVER_PORT", "5000")), "use_reloader": False},
+        daemon=True,
+    ).start()
+
+    import app_edge
+    app_edge.run(colocated=True)
+
+
+if __name__ == "__main__":
+    main()
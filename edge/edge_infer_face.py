@@ -1,16 +1,13 @@
 import cv2
 import mediapipe as mp
+from infer.detectors import create_face_detector
 
 # MediaPipe Modules
-mp_face = mp.solutions.face_detection
 mp_pose = mp.solutions.pose
 mp_draw = mp.solutions.drawing_utils
 
-# Face Detector
-face_detector = mp_face.FaceDetection(
-    model_selection=0,
-    min_detection_confidence=0.3
-)
+# Face Detector (Backend per FACE_DETECTOR, Standard: MediaPipe)
+face_detector = create_face_detector()
 
 # Pose Detector
 pose_detector = mp_pose.Pose(
@@ -31,16 +28,13 @@ def infer(image_path="frame.jpg"):
     rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
 
     # ---------- FACE DETECTION ----------
-    face_results = face_detector.process(rgb)
-    if face_results.detections:
-        for det in face_results.detections:
-            score = det.score[0]
-            box = det.location_data.relative_bounding_box
-
-            x1 = int(box.xmin * w)
-            y1 = int(box.ymin * h)
-            x2 = int((box.xmin + box.width) * w)
-            y2 = int((box.xmin + box.height) * h)
+    detections = face_detector.detect(rgb)
+    if detections:
+        for score, xmin, ymin, width, height in detections:
+            x1 = int(xmin * w)
+            y1 = int(ymin * h)
+            x2 = int((xmin + width) * w)
+            y2 = int((ymin + height) * h)
 
             x1 = max(0, x1)
             y1 = max(0, y1)
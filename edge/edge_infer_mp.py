@@ -1,13 +1,8 @@
 import cv2
-import mediapipe as mp
+from infer.detectors import create_face_detector
 
-mp_face = mp.solutions.face_detection
-mp_draw = mp.solutions.drawing_utils
-
-detector = mp_face.FaceDetection(
-    model_selection=0,        # 0 = short-range (Webcam)
-    min_detection_confidence=0.3
-)
+# Backend per FACE_DETECTOR, Standard: MediaPipe short-range (Webcam)
+detector = create_face_detector()
 
 def infer(image_path="frame.jpg"):
     image = cv2.imread(image_path)
@@ -17,19 +12,16 @@ def infer(image_path="frame.jpg"):
 
     h, w = image.shape[:2]
 
-    # MediaPipe arbeitet intern in RGB
+    # Alle Detektor-Backends arbeiten mit RGB
     rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    results = detector.process(rgb)
-
-    if results.detections:
-        for det in results.detections:
-            score = det.score[0]
-            box = det.location_data.relative_bounding_box
-
-            x1 = int(box.xmin * w)
-            y1 = int(box.ymin * h)
-            x2 = int((box.xmin + box.width) * w)
-            y2 = int((box.ymin + box.height) * h)
+    detections = detector.detect(rgb)
+
+    if detections:
+        for score, xmin, ymin, width, height in detections:
+            x1 = int(xmin * w)
+            y1 = int(ymin * h)
+            x2 = int((xmin + width) * w)
+            y2 = int((ymin + height) * h)
 
             x1 = max(0, x1)
             y1 = max(0, y1)
@@ -1,39 +1,32 @@
 from flask import Flask, request
-import base64
-import cv2
-import numpy as np
-import os
-
-CURRENT_FRAME_PATH = "/tmp/frame.jpg"
+import threading
+from hw.ingest import decode_frame_request, FrameDecodeError
 
 app = Flask(__name__)
 
+# Letzter dekodierter Frame (im Speicher statt /tmp/frame.jpg)
+_frame_lock = threading.Lock()
+_latest_frame = None
+
+def get_latest_frame():
+    with _frame_lock:
+        return _latest_frame
+
 @app.route("/frame", methods=["POST"])
 def frame():
-    data = request.data.decode()
-    if "," not in data:
-        return "invalid data", 400
+    global _latest_frame
     try:
-        jpg = base64.b64decode(data.split(",", 1)[1])
-    except Exception as e:
-        print("base64 decode failed:", e, flush=True)
-        return "bad image", 400
+        image = decode_frame_request(request)
+    except FrameDecodeError as e:
+        print(e, flush=True)
+        return e.reply, 400
 
-    npimg = np.frombuffer(jpg, dtype=np.uint8)
-    image = cv2.imdecode(npimg, cv2.IMREAD_COLOR)
-    if image is None:
-        print("cv2.imdecode failed", flush=True)
-        return "bad jpeg", 400
-
-    cv2.imwrite(CURRENT_FRAME_PATH, image)
-    print("wrote /tmp/frame.jpg", flush=True)
+    with _frame_lock:
+        _latest_frame = image
     return "ok"
 
-if __name__ == "__main__":
+def start():
     app.run(port=9001, host="0.0.0.0")
 
-
-
-
-
-
+if __name__ == "__main__":
+    start()
@@ -0,0 +1,55 @@
+import time
+import threading
+from collections import namedtuple
+
+# ------------------------
+# Latest-wins Frame-Slot zwischen /frame (Producer) und Inferenz (Consumer)
+
+Frame = namedtuple("Frame", ["seq", "captured_at", "image", "stream_id", "trace"], defaults=(None, None))
+
+
+class FrameSlot:
+    """Holds only the newest frame; a waiting consumer is woken on every put().
+
+    Frames overwritten before the consumer took them are counted in `dropped`.
+    """
+
+    def __init__(self, cond=None, stream_id=None):
+        self._cond = cond or threading.Condition()
+        self.stream_id = stream_id
+        self._frame = None
+        self._seq = 0
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, image, captured_at=None, trace=None):
+        with self._cond:
+            if self._frame is not None:
+                self.dropped += 1
+            self._seq += 1
+            self.received += 1
+            self._frame = Frame(self._seq, captured_at or time.time(), image, self.stream_id, trace)
+            self._cond.notify_all()
+            return self._seq
+
+    def take_nowait(self):
+        """Return and clear the pending frame, or None."""
+        with self._cond:
+            frame, self._frame = self._frame, None
+            return frame
+
+    def take(self, timeout=None):
+        """Block until a frame is pending, then return and clear it (None on timeout)."""
+        with self._cond:
+            if self._cond.wait_for(lambda: self._frame is not None, timeout):
+                frame, self._frame = self._frame, None
+                return frame
+            return None
+
+    @property
+    def pending(self):
+        return self._frame is not None
+
+    @property
+    def seq(self):
+        return self._seq
@@ -0,0 +1,114 @@
+import base64
+import cv2
+import numpy as np
+
+# ------------------------
+# Frame-Ingest für POST /frame
+#
+# Unterstützte Formate:
+#   - image/jpeg (oder image/png)   -> roher Body, kein base64
+#   - multipart/form-data           -> erstes hochgeladenes File (Feld "frame" bevorzugt)
+#   - data-URL "data:image/jpeg;base64,..." (alter Browser-Client)
+
+
+class FrameDecodeError(ValueError):
+    """Raised when a /frame body cannot be turned into an image."""
+
+    def __init__(self, message, reply):
+        super().__init__(message)
+        self.reply = reply
+
+
+def read_jpeg_bytes(req):
+    """Return the encoded image bytes of a Flask request, whatever the ingest format."""
+    content_type = (req.mimetype or "").lower()
+
+    if content_type.startswith("image/") or content_type == "application/octet-stream":
+        return req.get_data(cache=False)
+
+    if content_type == "multipart/form-data":
+        upload = req.files.get("frame") or next(iter(req.files.values()), None)
+        if upload is None:
+            raise FrameDecodeError("multipart body without file", "invalid data")
+        return upload.read()
+
+    # Fallback: base64 data-URL wie bisher
+    data = req.get_data(cache=False)
+    if b"," not in data:
+        raise FrameDecodeError("no data-URL separator", "invalid data")
+    try:
+        return base64.b64decode(data.split(b",", 1)[1])
+    except Exception as e:
+        raise FrameDecodeError(f"base64 decode failed: {e}", "bad image")
+
+
+# ------------------------
+# Verkleinertes Dekodieren: libjpeg kann per DCT-Skalierung direkt in 1/2, 1/4
+# oder 1/8 Auflösung dekodieren – deutlich billiger als voll dekodieren + resize.
+# Boxen sind relativ (0..1) und gelten damit unverändert für das Originalbild.
+
+_REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+# SOF-Marker (Baseline, Progressive, ...) – ohne DHT (C4), JPG (C8), DAC (CC)
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def jpeg_size(buf):
+    """Read (width, height) from the JPEG SOF header, or None if not a JPEG."""
+    if len(buf) < 4 or buf[0] != 0xFF or buf[1] != 0xD8:
+        return None
+    i = 2
+    while i + 3 < len(buf):
+        if buf[i] != 0xFF:
+            return None
+        marker = buf[i + 1]
+        if marker == 0xFF:  # Füllbyte
+            i += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+            i += 2
+            continue
+        if marker in _SOF_MARKERS:
+            if i + 9 > len(buf):
+                return None
+            height = (buf[i + 5] << 8) | buf[i + 6]
+            width = (buf[i + 7] << 8) | buf[i + 8]
+            return width, height
+        i += 2 + ((buf[i + 2] << 8) | buf[i + 3])
+    return None
+
+
+def reduced_decode_flag(size, max_side):
+    """Largest IMREAD_REDUCED_* factor that keeps the long side >= max_side."""
+    if not max_side or size is None:
+        return cv2.IMREAD_COLOR
+    long_side = max(size)
+    for factor, flag in _REDUCED_FLAGS:
+        if long_side // factor >= max_side:
+            return flag
+    return cv2.IMREAD_COLOR
+
+
+def decode_jpeg(jpg, max_side=None):
+    """Decode JPEG/PNG bytes into a BGR image without touching the filesystem.
+
+    With `max_side`, JPEGs are decoded at reduced scale where that still
+    leaves at least `max_side` pixels on the long side.
+    """
+    npimg = np.frombuffer(jpg, dtype=np.uint8)
+    if not npimg.size:
+        raise FrameDecodeError("empty image body", "bad jpeg")
+    flag = reduced_decode_flag(jpeg_size(bytes(jpg)), max_side) if max_side else cv2.IMREAD_COLOR
+    image = cv2.imdecode(npimg, flag)
+    if image is None:
+        raise FrameDecodeError("cv2.imdecode failed", "bad jpeg")
+    return image
+
+
+def decode_frame_request(req, max_side=None):
+    """Read and decode the frame carried by a /frame request."""
+    return decode_jpeg(read_jpeg_bytes(req), max_side)
@@ -0,0 +1,119 @@
+import os
+import threading
+from collections import OrderedDict
+
+from hw.frame_slot import FrameSlot
+
+# ------------------------
+# Mehrere Kameras pro Edge-Prozess
+#
+# Jeder Stream hat einen eigenen Frame-Slot und eigenen Ergebnis-Speicher.
+# Alle Slots teilen sich eine Condition, damit ein einziger Scheduler
+# (Inferenz-Loop oder Pool-Dispatcher) auf "irgendein Stream hat einen Frame"
+# warten kann. Modelle werden nur einmal geladen, unabhängig von der Kamerazahl.
+
+DEFAULT_STREAM = "default"
+
+
+class StreamLimitError(Exception):
+    pass
+
+
+class Stream:
+    def __init__(self, stream_id, device_id, cond, priority=0):
+        self.stream_id = stream_id
+        self.device_id = device_id
+        self.priority = priority
+        self.slot = FrameSlot(cond=cond, stream_id=stream_id)
+        self.last_result = {
+            "device_id": device_id,
+            "timestamp": None,
+            "persons_detected": 0,
+            "faces": []
+        }
+
+
+def parse_stream_map(value):
+    """'cam1=edge-a,cam2=edge-b' -> {'cam1': 'edge-a', 'cam2': 'edge-b'}"""
+    mapping = {}
+    for item in (value or "").split(","):
+        if "=" in item:
+            key, val = item.split("=", 1)
+            mapping[key.strip()] = val.strip()
+    return mapping
+
+
+class StreamRegistry:
+    """Per-stream frame slots plus a shared round-robin/priority scheduler."""
+
+    def __init__(self, default_device_id, device_ids=None, priorities=None, max_streams=16):
+        self.default_device_id = default_device_id
+        self.device_ids = device_ids or {}
+        self.priorities = {k: int(v) for k, v in (priorities or {}).items()}
+        self.max_streams = max_streams
+        self._cond = threading.Condition()
+        self._streams = OrderedDict()
+        self._rr = 0
+
+    @classmethod
+    def from_env(cls, default_device_id):
+        return cls(
+            default_device_id,
+            device_ids=parse_stream_map(os.getenv("STREAM_DEVICE_IDS")),
+            priorities=parse_stream_map(os.getenv("STREAM_PRIORITIES")),
+            max_streams=int(os.getenv("MAX_STREAMS", "16")),
+        )
+
+    def device_id_for(self, stream_id):
+        if stream_id in self.device_ids:
+            return self.device_ids[stream_id]
+        if stream_id == DEFAULT_STREAM:
+            return self.default_device_id
+        return f"{self.default_device_id}-{stream_id}"
+
+    def get(self, stream_id=DEFAULT_STREAM, create=True):
+        with self._cond:
+            stream = self._streams.get(stream_id)
+            if stream is None and create:
+                if len(self._streams) >= self.max_streams:
+                    raise StreamLimitError(f"too many streams (max {self.max_streams})")
+                stream = Stream(
+                    stream_id,
+                    self.device_id_for(stream_id),
+                    self._cond,
+                    self.priorities.get(stream_id, 0),
+                )
+                self._streams[stream_id] = stream
+                print(f"[EDGE] new stream {stream_id} -> device {stream.device_id}", flush=True)
+            return stream
+
+    def streams(self):
+        with self._cond:
+            return list(self._streams.values())
+
+    def next_frame(self, timeout=None):
+        """Wait until any stream has a frame; return (stream, frame) or None on timeout.
+
+        Streams with the highest priority go first; ties are served round-robin.
+        """
+        with self._cond:
+            if not self._cond.wait_for(self._any_pending, timeout):
+                return None
+            streams = list(self._streams.values())
+            n = len(streams)
+            best = None
+            for i in range(n):
+                idx = (self._rr + i) % n
+                stream = streams[idx]
+                if stream.slot.pending and (best is None or stream.priority > best[1].priority):
+                    best = (idx, stream)
+            idx, stream = best
+            self._rr = (idx + 1) % n
+            return stream, stream.slot.take_nowait()
+
+    def _any_pending(self):
+        return any(s.slot.pending for s in self._streams.values())
+
+    @property
+    def dropped(self):
+        return sum(s.slot.dropped for s in self.streams())
@@ -0,0 +1,165 @@
+import os
+
+import cv2
+import numpy as np
+
+# ------------------------
+# Face-Detektoren mit gemeinsamer Schnittstelle
+#
+# Alle Backends bekommen RGB-Bilder (uint8, HxWx3) und liefern pro Bild eine
+# Liste von (score, xmin, ymin, width, height) in relativen Koordinaten.
+#
+# Backend-Auswahl per FACE_DETECTOR:
+#   mediapipe – mp.solutions.face_detection (Standard)
+#   opencv    – OpenCV DNN, SSD-Modell im Format res10_300x300 (Caffe/ONNX/TF)
+#   onnx      – ONNX Runtime, UltraFace-Format (Ausgaben "scores", "boxes");
+#               FACE_ONNX_QUANTIZED=1 lädt FACE_ONNX_MODEL_INT8 statt FACE_ONNX_MODEL
+
+
+class FaceDetector:
+    """Common interface for the face detection backends."""
+
+    name = "base"
+
+    def detect(self, rgb):
+        raise NotImplementedError
+
+    def detect_batch(self, images):
+        """Detect on several frames; backends override this where they batch natively."""
+        return [self.detect(rgb) for rgb in images]
+
+    def close(self):
+        pass
+
+
+class MediaPipeFaceDetector(FaceDetector):
+    name = "mediapipe"
+
+    def __init__(self, min_confidence=0.3, model_selection=0):
+        import mediapipe as mp
+        self._detector = mp.solutions.face_detection.FaceDetection(
+            model_selection=model_selection,
+            min_detection_confidence=min_confidence
+        )
+
+    def detect(self, rgb):
+        results = self._detector.process(rgb)
+        faces = []
+        for det in results.detections or []:
+            box = det.location_data.relative_bounding_box
+            faces.append((float(det.score[0]), box.xmin, box.ymin, box.width, box.height))
+        return faces
+
+    def close(self):
+        self._detector.close()
+
+
+class OpenCVDnnFaceDetector(FaceDetector):
+    """SSD face detector (e.g. res10_300x300_ssd) through cv2.dnn; batches via blobFromImages."""
+
+    name = "opencv"
+
+    def __init__(self, model, config=None, min_confidence=0.3, input_size=(300, 300),
+                 mean=(104.0, 177.0, 123.0), threads=None):
+        self._net = cv2.dnn.readNet(model, config or "")
+        self._net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self._net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        if threads:
+            cv2.setNumThreads(threads)
+        self.min_confidence = min_confidence
+        self.input_size = input_size
+        self.mean = mean
+
+    def detect(self, rgb):
+        return self.detect_batch([rgb])[0]
+
+    def detect_batch(self, images):
+        # Modell erwartet BGR -> swapRB, da wir RGB bekommen
+        blob = cv2.dnn.blobFromImages(images, 1.0, self.input_size, self.mean, swapRB=True, crop=False)
+        self._net.setInput(blob)
+        out = self._net.forward().reshape(-1, 7)  # [image_id, label, score, x1, y1, x2, y2]
+
+        results = [[] for _ in images]
+        for image_id, _, score, x1, y1, x2, y2 in out:
+            if score < self.min_confidence or not 0 <= int(image_id) < len(images):
+                continue
+            x1, y1 = max(0.0, float(x1)), max(0.0, float(y1))
+            x2, y2 = min(1.0, float(x2)), min(1.0, float(y2))
+            if x2 > x1 and y2 > y1:
+                results[int(image_id)].append((float(score), x1, y1, x2 - x1, y2 - y1))
+        return results
+
+
+class OnnxFaceDetector(FaceDetector):
+    """UltraFace-style ONNX model on ONNX Runtime (CPU), optionally int8-quantized."""
+
+    name = "onnx"
+
+    def __init__(self, model, min_confidence=0.3, nms_threshold=0.3, threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self._session = ort.InferenceSession(model, sess_options=options, providers=["CPUExecutionProvider"])
+
+        inp = self._session.get_inputs()[0]
+        self._input_name = inp.name
+        _, _, height, width = inp.shape
+        self.input_size = (int(width), int(height))
+        # Dynamische Batch-Dimension (z.B. "batch" oder None) -> echtes Batching
+        self._batched = not isinstance(inp.shape[0], int)
+        self.min_confidence = min_confidence
+        self.nms_threshold = nms_threshold
+
+    def _blob(self, images):
+        blob = cv2.dnn.blobFromImages(images, 1.0 / 128, self.input_size, (127.0, 127.0, 127.0))
+        return blob.astype(np.float32)
+
+    def detect(self, rgb):
+        return self._run(self._blob([rgb]))[0]
+
+    def detect_batch(self, images):
+        if not self._batched:
+            return super().detect_batch(images)
+        return self._run(self._blob(images))
+
+    def _run(self, blob):
+        scores, boxes = self._session.run(["scores", "boxes"], {self._input_name: blob})
+        results = []
+        for img_scores, img_boxes in zip(scores, boxes):
+            conf = img_scores[:, 1]
+            keep = conf >= self.min_confidence
+            conf, cand = conf[keep], np.clip(img_boxes[keep], 0.0, 1.0)
+            if not len(conf):
+                results.append([])
+                continue
+            xywh = np.column_stack([cand[:, 0], cand[:, 1], cand[:, 2] - cand[:, 0], cand[:, 3] - cand[:, 1]])
+            idx = cv2.dnn.NMSBoxes(xywh.tolist(), conf.tolist(), self.min_confidence, self.nms_threshold)
+            results.append([(float(conf[i]), *map(float, xywh[i])) for i in np.array(idx).reshape(-1)])
+        return results
+
+
+def create_face_detector(backend=None):
+    """Build the face detector selected by FACE_DETECTOR (or `backend`)."""
+    backend = (backend or os.getenv("FACE_DETECTOR", "mediapipe")).lower()
+    min_confidence = float(os.getenv("FACE_MIN_CONFIDENCE", "0.3"))
+    threads = int(os.getenv("FACE_DETECTOR_THREADS", "0")) or None
+
+    if backend == "mediapipe":
+        return MediaPipeFaceDetector(min_confidence)
+    if backend == "opencv":
+        return OpenCVDnnFaceDetector(
+            os.getenv("FACE_DNN_MODEL", "models/res10_300x300_ssd_iter_140000.caffemodel"),
+            os.getenv("FACE_DNN_CONFIG", "models/deploy.prototxt"),
+            min_confidence=min_confidence,
+            threads=threads,
+        )
+    if backend == "onnx":
+        if os.getenv("FACE_ONNX_QUANTIZED", "0") == "1":
+            model = os.getenv("FACE_ONNX_MODEL_INT8", "models/version-RFB-320-int8.onnx")
+        else:
+            model = os.getenv("FACE_ONNX_MODEL", "models/version-RFB-320.onnx")
+        return OnnxFaceDetector(model, min_confidence=min_confidence, threads=threads)
+    raise ValueError(f"unknown FACE_DETECTOR backend: {backend}")
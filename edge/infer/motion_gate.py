@@ -0,0 +1,59 @@
+import os
+import time
+
+import cv2
+import numpy as np
+
+# ------------------------
+# Bewegungs-/Änderungs-Gate vor get_person_data()
+#
+# Vergleicht ein stark verkleinertes Graustufenbild mit dem Bild der letzten
+# echten Inferenz. Ist die mittlere Differenz unter der Schwelle, wird das
+# vorige Ergebnis wiederverwendet. Nach MOTION_MAX_SKIP_SECONDS wird trotzdem
+# neu inferiert, damit sich kein Fehlergebnis festsetzt.
+
+
+class MotionGate:
+    def __init__(self, threshold=3.0, max_skip_seconds=10.0, size=(32, 24)):
+        self.threshold = threshold
+        self.max_skip_seconds = max_skip_seconds
+        self.size = size
+        self._reference = None
+        self._reference_ts = 0.0
+        self.checked = 0
+        self.saved = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            threshold=float(os.getenv("MOTION_THRESHOLD", "3.0")),
+            max_skip_seconds=float(os.getenv("MOTION_MAX_SKIP_SECONDS", "10")),
+        )
+
+    @property
+    def enabled(self):
+        return self.threshold > 0
+
+    def thumbnail(self, image):
+        small = cv2.resize(image, self.size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small.astype(np.int16)
+
+    def should_infer(self, image, now=None):
+        """True if the scene changed enough (or too long ago) to run the detectors."""
+        if not self.enabled:
+            return True
+        now = now or time.time()
+        self.checked += 1
+        thumb = self.thumbnail(image)
+
+        if self._reference is not None and now - self._reference_ts < self.max_skip_seconds:
+            diff = float(np.abs(thumb - self._reference).mean())
+            if diff < self.threshold:
+                self.saved += 1
+                return False
+
+        self._reference = thumb
+        self._reference_ts = now
+        return True
@@ -0,0 +1,166 @@
+import os
+import time
+from collections import namedtuple
+
+import cv2
+
+from hw.ingest import decode_jpeg, FrameDecodeError
+from infer.preprocess import Preprocessor, input_max_side_from_env, to_original_box
+from infer.detectors import create_face_detector
+
+# ------------------------
+# Konfigurierbare Inferenz-Pipeline
+#
+# Stufen (explizit einschalten):
+#   decode    – JPEG-Bytes -> BGR (nur wenn run() Bytes bekommt, ggf. verkleinert)
+#   (resize/convert laufen immer: auf max_side verkleinern, BGR -> RGB)
+#   faces     – Face Detection (Backend per FACE_DETECTOR, siehe infer.detectors)
+#   pose      – Pose Detection
+#   annotate  – Boxen/Text/Landmarks ins Bild zeichnen
+#   persist   – annotiertes Bild nach frame_out.jpg schreiben
+#
+# Profile:
+#   prod  – nur faces, kein Zeichnen, kein Schreiben
+#   debug – bisheriges Verhalten von get_person_data()
+
+STAGES = ("decode", "faces", "pose", "annotate", "persist")
+PROFILES = {
+    "prod": ("decode", "faces"),
+    "debug": ("decode", "faces", "pose", "annotate", "persist"),
+}
+
+PipelineResult = namedtuple("PipelineResult", ["persons_detected", "faces", "image", "timings"])
+
+
+class InferencePipeline:
+    def __init__(self, stages=PROFILES["prod"], output_path="frame_out.jpg", max_side=640, face_backend=None):
+        unknown = set(stages) - set(STAGES)
+        if unknown:
+            raise ValueError(f"unknown pipeline stages: {sorted(unknown)}")
+        self.stages = tuple(s for s in STAGES if s in stages)
+        self.output_path = output_path
+        self.max_side = max_side
+        self._pre = Preprocessor(max_side)
+        self._face_detector = None
+        self._pose_detector = None
+
+        # Modelle nur für eingeschaltete Stufen laden
+        if "faces" in self.stages:
+            self._face_detector = create_face_detector(face_backend)
+        if "pose" in self.stages:
+            self._pose_detector = self._create_pose_detector()
+
+    @classmethod
+    def from_env(cls):
+        """EDGE_PIPELINE_PROFILE (prod|debug) or an explicit EDGE_PIPELINE_STAGES list."""
+        stages = os.getenv("EDGE_PIPELINE_STAGES")
+        if stages:
+            stages = tuple(s.strip() for s in stages.split(",") if s.strip())
+        else:
+            profile = os.getenv("EDGE_PIPELINE_PROFILE", "prod")
+            if profile not in PROFILES:
+                raise ValueError(f"unknown pipeline profile: {profile}")
+            stages = PROFILES[profile]
+        return cls(
+            stages,
+            output_path=os.getenv("EDGE_OUTPUT_PATH", "frame_out.jpg"),
+            max_side=input_max_side_from_env(),
+        )
+
+    # ------------------------
+    # Modelle
+
+    @staticmethod
+    def _create_pose_detector():
+        import mediapipe as mp
+        return mp.solutions.pose.Pose(
+            static_image_mode=False,
+            model_complexity=1,
+            min_detection_confidence=0.3,
+            min_tracking_confidence=0.3
+        )
+
+    # ------------------------
+    # Ausführung
+
+    def run(self, image):
+        """Run the enabled stages on a BGR image (or encoded JPEG bytes)."""
+        timings = {}
+        t = time.perf_counter()
+
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            if "decode" not in self.stages:
+                raise ValueError("pipeline got encoded bytes but the decode stage is disabled")
+            try:
+                image = decode_jpeg(image, self.max_side)
+            except FrameDecodeError:
+                image = None
+            t = self._lap(timings, "decode", t)
+        if image is None:
+            return PipelineResult(0, [], image, timings)
+
+        # Boxen der Detektoren sind relativ -> werden auf das Originalbild (w x h) abgebildet
+        h, w = image.shape[:2]
+        small = self._pre.resize(image)
+        t = self._lap(timings, "resize", t)
+        rgb = self._pre.to_rgb(small)
+        t = self._lap(timings, "convert", t)
+
+        faces = []
+        if self._face_detector is not None:
+            for score, *box in self._face_detector.detect(rgb):
+                face = {"conf": score}
+                face.update(to_original_box(box, w, h))
+                faces.append(face)
+            t = self._lap(timings, "faces", t)
+
+        pose_landmarks = None
+        if self._pose_detector is not None:
+            pose_landmarks = self._pose_detector.process(rgb).pose_landmarks
+            t = self._lap(timings, "pose", t)
+
+        # Personen = Anzahl Gesichter; ohne Face-Stufe: Pose ja/nein
+        if self._face_detector is not None:
+            persons_detected = len(faces)
+        else:
+            persons_detected = 1 if pose_landmarks else 0
+
+        if "annotate" in self.stages:
+            self._annotate(image, faces, pose_landmarks)
+            t = self._lap(timings, "annotate", t)
+
+        if "persist" in self.stages:
+            cv2.imwrite(self.output_path, image)
+            t = self._lap(timings, "persist", t)
+
+        return PipelineResult(persons_detected, faces, image, timings)
+
+    @staticmethod
+    def _lap(timings, stage, start):
+        now = time.perf_counter()
+        timings[stage] = now - start
+        return now
+
+    @staticmethod
+    def _annotate(image, faces, pose_landmarks):
+        h, w = image.shape[:2]
+        for face in faces:
+            x1, y1 = int(face["xmin"] * w), int(face["ymin"] * h)
+            x2, y2 = int((face["xmin"] + face["width"]) * w), int((face["ymin"] + face["height"]) * h)
+            cv2.rectangle(image, (x1, y1), (x2, y2), (0, 255, 0), 2)
+            cv2.putText(
+                image,
+                f"face {face['conf']:.2f}",
+                (x1, y1 - 10),
+                cv2.FONT_HERSHEY_SIMPLEX,
+                0.6,
+                (0, 255, 0),
+                2
+            )
+        if pose_landmarks:
+            import mediapipe as mp
+            mp.solutions.drawing_utils.draw_landmarks(
+                image,
+                pose_landmarks,
+                mp.solutions.pose.POSE_CONNECTIONS
+            )
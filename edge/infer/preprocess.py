@@ -0,0 +1,67 @@
+import os
+
+import cv2
+import numpy as np
+
+# ------------------------
+# Vorverarbeitung vor den Detektoren
+#
+# MediaPipe rechnet intern ohnehin mit kleinen Eingaben (Face: 128x128).
+# Große Frames werden deshalb einmal auf EDGE_INPUT_MAX_SIDE verkleinert,
+# bevor sie nach RGB konvertiert werden. Resize- und RGB-Puffer werden
+# einmal angelegt und für alle Frames gleicher Größe wiederverwendet.
+
+
+def input_max_side_from_env():
+    """EDGE_INPUT_MAX_SIDE: längste Bildseite für die Detektoren, 0 = unverändert."""
+    return int(os.getenv("EDGE_INPUT_MAX_SIDE", "640"))
+
+
+class Preprocessor:
+    def __init__(self, max_side=640):
+        self.max_side = max_side
+        self._resized = None
+        self._rgb = None
+
+    def target_size(self, w, h):
+        if not self.max_side or max(w, h) <= self.max_side:
+            return w, h
+        scale = self.max_side / max(w, h)
+        return max(1, round(w * scale)), max(1, round(h * scale))
+
+    def _buffer(self, current, shape):
+        if current is None or current.shape != shape:
+            current = np.empty(shape, dtype=np.uint8)
+        return current
+
+    def resize(self, image):
+        """Downscale into the reused buffer; returns `image` itself if already small enough."""
+        h, w = image.shape[:2]
+        tw, th = self.target_size(w, h)
+        if (tw, th) == (w, h):
+            return image
+        self._resized = self._buffer(self._resized, (th, tw, image.shape[2]))
+        cv2.resize(image, (tw, th), dst=self._resized, interpolation=cv2.INTER_AREA)
+        return self._resized
+
+    def to_rgb(self, image):
+        """BGR -> RGB into the reused buffer. Valid until the next call."""
+        self._rgb = self._buffer(self._rgb, image.shape)
+        cv2.cvtColor(image, cv2.COLOR_BGR2RGB, dst=self._rgb)
+        return self._rgb
+
+
+def to_original_box(rel_box, w, h):
+    """Map a relative detector box (xmin, ymin, width, height) onto the original
+    w x h frame, clamp it to the image and return it as relative face dict fields."""
+    xmin, ymin, width, height = rel_box
+    x1 = max(0, int(xmin * w))
+    y1 = max(0, int(ymin * h))
+    x2 = min(w - 1, int((xmin + width) * w))
+    y2 = min(h - 1, int((ymin + height) * h))
+    return {
+        "xmin": x1 / w,
+        "ymin": y1 / h,
+        "width": (x2 - x1) / w,
+        "height": (y2 - y1) / h,
+    }
@@ -0,0 +1,196 @@
+import os
+import threading
+
+import cv2
+import numpy as np
+
+# ------------------------
+# Detect-every-N mit leichtem Box-Tracker dazwischen
+#
+# Der volle Face-Detector läuft nur alle N Frames (oder wenn die
+# Tracking-Konfidenz einbricht). Dazwischen werden die Boxen per
+# Lucas-Kanade Optical Flow auf Feature-Punkten innerhalb der Box
+# weitergeschoben. Neue Detektionen werden per IoU den bestehenden Tracks
+# zugeordnet, sodass jede Box eine stabile track_id behält.
+
+TRACK_WIDTH = 320  # Optical Flow auf verkleinertem Graustufenbild
+
+
+def iou(a, b):
+    ax2, ay2 = a[0] + a[2], a[1] + a[3]
+    bx2, by2 = b[0] + b[2], b[1] + b[3]
+    iw = max(0.0, min(ax2, bx2) - max(a[0], b[0]))
+    ih = max(0.0, min(ay2, by2) - max(a[1], b[1]))
+    inter = iw * ih
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / union if union > 0 else 0.0
+
+
+class Track:
+    def __init__(self, track_id, box, conf):
+        self.track_id = track_id
+        self.box = box          # (xmin, ymin, width, height) relativ
+        self.conf = conf        # Detektor-Konfidenz
+        self.quality = 1.0      # Anteil erfolgreich verfolgter Punkte
+        self.points = None      # Feature-Punkte (Pixel im Tracking-Bild)
+
+    def as_face(self):
+        xmin, ymin, width, height = self.box
+        return {
+            "conf": float(self.conf * self.quality),
+            "xmin": xmin,
+            "ymin": ymin,
+            "width": width,
+            "height": height,
+            "track_id": self.track_id,
+        }
+
+
+class FaceTracker:
+    """Decides when to run the detector and carries boxes forward in between."""
+
+    def __init__(self, detect_every=5, min_quality=0.5, iou_threshold=0.3):
+        self.detect_every = detect_every
+        self.min_quality = min_quality
+        self.iou_threshold = iou_threshold
+        self._lock = threading.Lock()
+        self._tracks = []
+        self._gray = None
+        self._since_detection = 0
+        self._pending = {}
+        self._next_id = 1
+        self.detections = 0
+        self.tracked_frames = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            detect_every=int(os.getenv("TRACK_DETECT_EVERY", "1")),
+            min_quality=float(os.getenv("TRACK_MIN_QUALITY", "0.5")),
+            iou_threshold=float(os.getenv("TRACK_IOU_THRESHOLD", "0.3")),
+        )
+
+    @property
+    def enabled(self):
+        return self.detect_every > 1
+
+    @property
+    def unique_persons(self):
+        """Number of distinct track ids handed out so far."""
+        return self._next_id - 1
+
+    @staticmethod
+    def prepare(image):
+        h, w = image.shape[:2]
+        if w > TRACK_WIDTH:
+            image = cv2.resize(image, (TRACK_WIDTH, int(h * TRACK_WIDTH / w)), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+
+    def needs_detection(self):
+        with self._lock:
+            if not self.enabled:
+                return True
+            if self._pending:
+                # Ergebnis verloren (z.B. Worker-Fehler)? Dann nicht ewig warten
+                if self._since_detection < 4 * self.detect_every:
+                    return False
+                self._pending.clear()
+            if self._gray is None:
+                return True
+            if self._since_detection + 1 >= self.detect_every:
+                return True
+            return any(t.quality < self.min_quality for t in self._tracks)
+
+    def begin_detection(self, key, gray):
+        """Mark a frame as sent to the detector (asynchronous pool mode)."""
+        with self._lock:
+            self._pending[key] = gray
+
+    def cancel_detection(self, key):
+        """Forget a detection that will not return (worker failure)."""
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def finish_detection(self, key, faces):
+        with self._lock:
+            gray = self._pending.pop(key, None)
+        if gray is None:
+            return faces
+        return self.update(gray, faces)
+
+    def update(self, gray, faces):
+        """Feed fresh detector output; returns the faces with stable track ids."""
+        with self._lock:
+            self.detections += 1
+            self._since_detection = 0
+            boxes = [(f["xmin"], f["ymin"], f["width"], f["height"]) for f in faces]
+
+            # Greedy IoU-Zuordnung: beste Paare zuerst
+            pairs = sorted(
+                ((iou(t.box, b), ti, bi) for ti, t in enumerate(self._tracks) for bi, b in enumerate(boxes)),
+                reverse=True,
+            )
+            used_tracks, assigned = set(), {}
+            for score, ti, bi in pairs:
+                if score < self.iou_threshold:
+                    break
+                if ti in used_tracks or bi in assigned:
+                    continue
+                used_tracks.add(ti)
+                assigned[bi] = self._tracks[ti].track_id
+
+            tracks = []
+            for bi, (box, face) in enumerate(zip(boxes, faces)):
+                track_id = assigned.get(bi)
+                if track_id is None:
+                    track_id = self._next_id
+                    self._next_id += 1
+                track = Track(track_id, box, face["conf"])
+                track.points = self._seed_points(gray, box)
+                tracks.append(track)
+
+            self._tracks = tracks
+            self._gray = gray
+            return [t.as_face() for t in tracks]
+
+    def track(self, gray):
+        """Move all boxes to the new frame with optical flow; returns the faces."""
+        with self._lock:
+            self.tracked_frames += 1
+            self._since_detection += 1
+            prev, self._gray = self._gray, gray
+            if prev is None or prev.shape != gray.shape:
+                return [t.as_face() for t in self._tracks]
+
+            h, w = gray.shape[:2]
+            for track in self._tracks:
+                if track.points is None or len(track.points) == 0:
+                    track.quality = 0.0
+                    continue
+                moved, status, _ = cv2.calcOpticalFlowPyrLK(prev, gray, track.points, None)
+                good = status.reshape(-1) == 1
+                track.quality = float(good.mean()) if len(good) else 0.0
+                if not good.any():
+                    track.points = None
+                    continue
+                dx, dy = np.median(moved[good] - track.points[good], axis=0).reshape(-1)
+                xmin, ymin, width, height = track.box
+                track.box = (
+                    min(max(0.0, xmin + dx / w), 1.0 - width),
+                    min(max(0.0, ymin + dy / h), 1.0 - height),
+                    width,
+                    height,
+                )
+                track.points = moved[good].reshape(-1, 1, 2)
+            return [t.as_face() for t in self._tracks]
+
+    @staticmethod
+    def _seed_points(gray, box):
+        h, w = gray.shape[:2]
+        x1, y1 = int(box[0] * w), int(box[1] * h)
+        x2, y2 = int((box[0] + box[2]) * w), int((box[1] + box[3]) * h)
+        if x2 - x1 < 4 or y2 - y1 < 4:
+            return None
+        mask = np.zeros_like(gray)
+        mask[y1:y2, x1:x2] = 255
+        return cv2.goodFeaturesToTrack(gray, maxCorners=30, qualityLevel=0.01, minDistance=3, mask=mask)
@@ -0,0 +1,239 @@
+import os
+import time
+import queue
+import logging
+import threading
+import multiprocessing as mp
+from collections import deque
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from logsetup import sampled
+
+# ------------------------
+# Prozess-Pool für die Inferenz
+#
+# Jeder Worker-Prozess hält eigene FaceDetection/Pose-Instanzen (Import von
+# infer.infer_face_pose im Worker). Frames werden nicht gepickelt, sondern in
+# einen von N Shared-Memory-Slots kopiert; über die Queue gehen nur
+# (slot, job, seq, shape, dtype). Ergebnisse kommen mit Job-ID und
+# Frame-Sequenznummer zurück und werden in Einreichungsreihenfolge ausgeliefert.
+#
+# Jeder Worker hat eine eigene Task-Queue, damit bekannt ist, welche Jobs er
+# hält. Stirbt ein Worker (Absturz, OOM-Kill) oder hängt ein Job länger als
+# INFER_JOB_TIMEOUT Sekunden, werden seine Jobs als verloren gemeldet, die
+# Slots freigegeben und der Worker neu gestartet – sonst blockiert der
+# Reorder-Puffer alle späteren Ergebnisse.
+
+DEFAULT_MAX_FRAME_BYTES = 1920 * 1080 * 3
+
+
+def _worker_main(slot_names, tasks, results, ready):
+    # Modelle erst im Worker laden – jeder Prozess hat seine eigenen Instanzen
+    from infer.infer_face_pose import get_person_data
+
+    slots = [shared_memory.SharedMemory(name=name) for name in slot_names]
+    ready.set()
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            slot, job, seq, shape, dtype = task
+            try:
+                image = np.ndarray(shape, dtype=np.dtype(dtype), buffer=slots[slot].buf)
+                persons_detected, faces, _ = get_person_data(image)
+                del image
+                results.put((slot, job, seq, persons_detected, faces, None))
+            except Exception as e:
+                results.put((slot, job, seq, 0, [], repr(e)))
+    finally:
+        for shm in slots:
+            shm.close()
+
+
+class InferencePool:
+    """Runs get_person_data() in `workers` processes fed through shared memory.
+
+    `on_result(frame, persons_detected, faces)` is called from a collector
+    thread, in the order frames were submitted. `frame` is the submitted
+    Frame without its image. Frames whose job failed (worker exception,
+    crash or timeout) go to `on_error(frame)` instead, in the same order.
+    """
+
+    def __init__(self, workers, on_result, max_frame_bytes=DEFAULT_MAX_FRAME_BYTES, slots=None,
+                 on_error=None, job_timeout=None):
+        self.workers = workers
+        self.max_frame_bytes = max_frame_bytes
+        self.job_timeout = job_timeout if job_timeout is not None else float(os.getenv("INFER_JOB_TIMEOUT", "30"))
+        self._on_result = on_result
+        self._on_error = on_error
+        n_slots = slots or workers
+
+        self._shm = [shared_memory.SharedMemory(create=True, size=max_frame_bytes) for _ in range(n_slots)]
+        self._free = queue.Queue()
+        for i in range(n_slots):
+            self._free.put(i)
+
+        # spawn: keine geforkten MediaPipe-/librdkafka-Threads im Worker
+        self._ctx = mp.get_context("spawn")
+        self._results = self._ctx.Queue()
+        self._names = [shm.name for shm in self._shm]
+        self._tasks = [None] * workers
+        self._procs = [None] * workers
+        self._ready = [None] * workers
+        self._ready_at = [None] * workers
+        self._closing = False
+        # Worker -> {job: (slot, submitted at)}
+        self._assigned = [{} for _ in range(workers)]
+
+        # Reorder-Puffer: eingereichte Frames in Reihenfolge, fertige Ergebnisse nach seq
+        self._lock = threading.Lock()
+        self._order = deque()
+        self._done = {}
+        self._next_job = 0
+        self.oversize = 0
+        self.errors = 0
+        self.restarts = 0
+
+        for i in range(workers):
+            self._spawn(i)
+
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+        print(f"[EDGE] Inference pool started: {workers} workers, {n_slots} shm slots", flush=True)
+
+    def reserve(self, timeout=None):
+        """Wait for a free shared-memory slot; None on timeout."""
+        try:
+            return self._free.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def release(self, slot):
+        self._free.put(slot)
+
+    def submit(self, frame, slot):
+        """Copy `frame.image` into the reserved slot and queue it for a worker."""
+        image = frame.image
+        if image.nbytes > self.max_frame_bytes:
+            self.oversize += 1
+            self.release(slot)
+            print(f"[EDGE] frame {frame.seq} too large for pool ({image.nbytes} bytes)", flush=True)
+            return False
+
+        view = np.ndarray(image.shape, dtype=image.dtype, buffer=self._shm[slot].buf)
+        view[...] = image
+        del view
+        with self._lock:
+            job = self._next_job
+            self._next_job += 1
+            self._order.append((job, frame._replace(image=None)))
+            # Worker mit den wenigsten offenen Jobs
+            worker = min(range(self.workers), key=lambda i: len(self._assigned[i]))
+            self._assigned[worker][job] = (slot, time.monotonic())
+            tasks = self._tasks[worker]
+        tasks.put((slot, job, frame.seq, image.shape, image.dtype.str))
+        return True
+
+    @property
+    def in_flight(self):
+        with self._lock:
+            return len(self._order)
+
+    def _spawn(self, i):
+        # Neue Queue: Tasks in der alten gehören zu bereits als verloren gemeldeten Jobs
+        self._tasks[i] = self._ctx.Queue()
+        self._ready[i] = self._ctx.Event()
+        self._ready_at[i] = None
+        self._procs[i] = self._ctx.Process(
+            target=_worker_main, args=(self._names, self._tasks[i], self._results, self._ready[i]), daemon=True
+        )
+        self._procs[i].start()
+
+    def _check_workers(self):
+        """Fail the jobs of dead or hung workers, free their slots and respawn them."""
+        if self._closing:
+            return
+        now = time.monotonic()
+        for i, proc in enumerate(self._procs):
+            with self._lock:
+                oldest = min((ts for _, ts in self._assigned[i].values()), default=None)
+            if proc.is_alive():
+                # Modell-Laden beim Start zählt nicht als Job-Laufzeit
+                if self._ready_at[i] is None:
+                    if not self._ready[i].is_set():
+                        continue
+                    self._ready_at[i] = now
+                if oldest is None or now - max(oldest, self._ready_at[i]) < self.job_timeout:
+                    continue
+                print(f"[EDGE] inference worker {i} stuck for {now - oldest:.0f}s, terminating", flush=True)
+                proc.terminate()
+                proc.join(timeout=5)
+            else:
+                print(f"[EDGE] inference worker {i} died (exit code {proc.exitcode})", flush=True)
+            with self._lock:
+                # Unter dem Lock, damit submit() nichts mehr in die alte Queue legt
+                lost, self._assigned[i] = self._assigned[i], {}
+                self._spawn(i)
+            for job, (slot, _) in lost.items():
+                self._finish(job, slot, 0, [], "worker died")
+            self.restarts += 1
+            print(f"[EDGE] inference worker {i} restarted, {len(lost)} jobs lost", flush=True)
+
+    def _collect(self):
+        while True:
+            try:
+                item = self._results.get(timeout=1.0)
+            except queue.Empty:
+                self._check_workers()
+                continue
+            if item is None:
+                break
+            slot, job, seq, persons_detected, faces, error = item
+            with self._lock:
+                known = any(self._assigned[i].pop(job, None) for i in range(self.workers))
+            # Ergebnis eines bereits als verloren gemeldeten Jobs: Slot ist schon frei
+            if known:
+                self._finish(job, slot, persons_detected, faces, error)
+            self._check_workers()
+
+    def _finish(self, job, slot, persons_detected, faces, error):
+        self._free.put(slot)
+        if error is not None:
+            self.errors += 1
+            sampled("worker_failed", logging.WARNING, "worker failed on job %d: %s", job, error)
+
+        ready = []
+        with self._lock:
+            self._done[job] = (persons_detected, faces, error)
+            while self._order and self._order[0][0] in self._done:
+                job, frame = self._order.popleft()
+                ready.append((frame, self._done.pop(job)))
+
+        for frame, (persons_detected, faces, error) in ready:
+            if error is None:
+                self._on_result(frame, persons_detected, faces)
+            elif self._on_error is not None:
+                self._on_error(frame)
+
+    def close(self):
+        self._closing = True
+        for tasks in self._tasks:
+            tasks.put(None)
+        for p in self._procs:
+            p.join(timeout=5)
+        self._results.put(None)
+        self._collector.join(timeout=5)
+        for shm in self._shm:
+            shm.close()
+            shm.unlink()
+
+
+def workers_from_env():
+    """INFER_WORKERS: 0 = Inferenz im Flask-Prozess, 'auto' = ein Worker pro Kern minus eins."""
+    value = os.getenv("INFER_WORKERS", "0").strip().lower()
+    if value == "auto":
+        return max(1, (os.cpu_count() or 2) - 1)
+    return int(value)
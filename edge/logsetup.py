@@ -0,0 +1,52 @@
+import itertools
+import logging
+import os
+import sys
+
+# ------------------------
+# Logging des Edge statt print() pro Nachricht
+#
+#   EDGE_LOG_LEVEL   DEBUG | INFO (Standard) | WARNING | ...
+#   EDGE_LOG_SAMPLE  nur jede N-te Meldung pro Nachricht/Frame ausgeben (Standard 100)
+#
+# Meldungen pro Frame/Nachricht laufen über sampled(); Start-/Statusmeldungen
+# bleiben unverändert. Andere Logger (werkzeug, ...) behalten ihre eigene Ausgabe.
+
+log = logging.getLogger("edge")
+
+
+def setup_logging():
+    """Attach the [EDGE] stdout handler to the "edge" logger only."""
+    # Nicht am Root-Logger: werkzeug (und der Server im gleichen Prozess)
+    # geben sonst jede Zeile doppelt aus
+    log.setLevel(os.getenv("EDGE_LOG_LEVEL", "INFO").upper())
+    log.propagate = False
+    if not log.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("[EDGE] %(levelname)s %(message)s"))
+        log.addHandler(handler)
+
+
+class Sampler:
+    """True for every n-th call (n <= 1: always)."""
+
+    def __init__(self, every=None):
+        self.every = every if every is not None else int(os.getenv("EDGE_LOG_SAMPLE", "100"))
+        self._count = itertools.count()
+
+    def __call__(self):
+        return self.every <= 1 or next(self._count) % self.every == 0
+
+
+_samplers = {}
+
+
+def sampled(key, level, msg, *args):
+    """Log msg at level, but only every EDGE_LOG_SAMPLE-th time per key."""
+    if not log.isEnabledFor(level):
+        return
+    sampler = _samplers.get(key)
+    if sampler is None:
+        sampler = _samplers.setdefault(key, Sampler())
+    if sampler():
+        log.log(level, msg, *args)
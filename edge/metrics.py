@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import deque
+
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# ------------------------
+# Prometheus-Metriken des Edge (/metrics)
+#
+# Latenzen als Histogramme, Raten (fps) über ein gleitendes 10-s-Fenster.
+# Zähler, die ohnehin schon an Slot, Motion-Gate, Tracker und Publisher
+# hängen (dropped, saved, delivered, ...), werden beim Scrape über
+# EdgeCollector ausgelesen statt doppelt gezählt. Prozess-CPU und -RSS
+# (process_cpu_seconds_total, process_resident_memory_bytes) liefert der
+# Standard-ProcessCollector von prometheus_client.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+DECODE_SECONDS = Histogram(
+    "edge_decode_seconds",
+    "JPEG decode (and downscale) time per frame",
+    ["stream"],
+    buckets=LATENCY_BUCKETS
+)
+
+INFERENCE_SECONDS = Histogram(
+    "edge_inference_seconds",
+    "Time from taking a frame to its stored result (detection, tracking or pool round trip)",
+    ["stream"],
+    buckets=LATENCY_BUCKETS
+)
+
+PRODUCE_SECONDS = Histogram(
+    "edge_produce_seconds",
+    "Time spent in publish() (encode and enqueue or spool)",
+    buckets=LATENCY_BUCKETS
+)
+
+DELIVERY_SECONDS = Histogram(
+    "edge_delivery_seconds",
+    "Kafka delivery latency from produce() to the delivery report",
+    buckets=LATENCY_BUCKETS + (10, 30)
+)
+
+FRAMES_INFERRED = Counter(
+    "edge_frames_inferred_total",
+    "Frames with a stored result",
+    ["stream"]
+)
+
+
+class RateMeter:
+    """Events per second over a sliding window of 1 s buckets."""
+
+    def __init__(self, window=10):
+        self.window = window
+        self._buckets = deque()
+        self._lock = threading.Lock()
+
+    def tick(self, n=1):
+        second = int(time.monotonic())
+        with self._lock:
+            if self._buckets and self._buckets[-1][0] == second:
+                self._buckets[-1][1] += n
+            else:
+                self._buckets.append([second, n])
+            self._trim(second)
+
+    def _trim(self, second):
+        while self._buckets and self._buckets[0][0] <= second - self.window:
+            self._buckets.popleft()
+
+    def rate(self):
+        with self._lock:
+            self._trim(int(time.monotonic()))
+            return sum(n for _, n in self._buckets) / self.window
+
+
+INGEST_RATE = RateMeter()
+INFERENCE_RATE = RateMeter()
+
+Gauge("edge_ingest_fps", "Frames received per second (10 s window)").set_function(INGEST_RATE.rate)
+Gauge("edge_inference_fps", "Frames inferred per second (10 s window)").set_function(INFERENCE_RATE.rate)
+
+
+class EdgeCollector:
+    """Exposes the counters kept by streams, gates, trackers and the publisher."""
+
+    def __init__(self, streams, gates, trackers, publisher_fn):
+        self.streams = streams
+        self.gates = gates
+        self.trackers = trackers
+        self.publisher_fn = publisher_fn
+
+    def collect(self):
+        received = CounterMetricFamily("edge_frames_received", "Frames received on /frame", labels=["stream"])
+        dropped = CounterMetricFamily("edge_frames_dropped", "Frames overwritten before inference", labels=["stream"])
+        skipped = CounterMetricFamily("edge_frames_skipped", "Frames that skipped detection",
+                                      labels=["stream", "reason"])
+        for stream in self.streams.streams():
+            sid = stream.stream_id
+            received.add_metric([sid], stream.slot.received)
+            dropped.add_metric([sid], stream.slot.dropped)
+            gate = self.gates.get(sid)
+            tracker = self.trackers.get(sid)
+            skipped.add_metric([sid, "motion_gate"], gate.saved if gate else 0)
+            skipped.add_metric([sid, "tracked"], tracker.tracked_frames if tracker else 0)
+        yield from (received, dropped, skipped)
+
+        publisher = self.publisher_fn()
+        if publisher is None:
+            return
+        stats = publisher.stats()
+        yield GaugeMetricFamily("edge_kafka_broker_up", "1 if the Kafka broker is reachable", value=int(stats["broker_up"]))
+        yield GaugeMetricFamily("edge_producer_queue_length", "Messages waiting in the producer queue",
+                                value=stats["queue_length"])
+        yield CounterMetricFamily("edge_messages_enqueued", "Messages handed to the producer", value=stats["enqueued"])
+        yield CounterMetricFamily("edge_messages_delivered", "Messages acknowledged by Kafka", value=stats["delivered"])
+        yield CounterMetricFamily("edge_delivery_errors", "Failed deliveries", value=stats["failed"])
+        yield CounterMetricFamily("edge_queue_full", "Results dropped because the queue was full",
+                                  value=stats["queue_full"])
+        spool = stats.get("spool")
+        if spool:
+            yield GaugeMetricFamily("edge_spool_depth_records", "Events waiting in the spool", value=spool["depth_records"])
+            yield GaugeMetricFamily("edge_spool_bytes", "Spool size on disk", value=spool["size_bytes"])
+            yield CounterMetricFamily("edge_spool_evicted", "Events evicted from the spool", value=spool["evicted"])
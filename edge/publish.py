@@ -0,0 +1,262 @@
+import os
+import time
+import threading
+import logging
+from confluent_kafka import KafkaError
+
+from payload import encode, content_type_from_headers, CONTENT_TYPE_HEADER
+from logsetup import sampled
+from transport import create_producer
+
+# ------------------------
+# Kafka-Publishing vom Edge
+#
+# Jedes neue Inferenz-Ergebnis wird genau einmal an den Producer übergeben
+# (kein periodisches Neu-Senden eines Snapshots). Key = device_id, damit alle
+# Nachrichten eines Geräts in derselben Partition und damit in Reihenfolge
+# landen. poll() läuft in einem eigenen Thread und blockiert niemanden.
+# Format der Nachricht per PAYLOAD_FORMAT (json|binary|object), siehe payload.py;
+# Transport per TRANSPORT (kafka|unix|inproc), siehe transport.py.
+#
+# Mit Spool (spool.py): Ist der Broker nicht erreichbar, der Producer nicht
+# anlegbar oder schlägt die Zustellung fehl, landen Events im Spool. Nach dem
+# Reconnect arbeitet der Drain-Thread ihn in Batches mit SPOOL_DRAIN_RATE
+# Nachrichten/s ab. Der Spool-Cursor rückt erst mit dem Delivery-Report vor;
+# schlägt die Zustellung eines nachgesendeten Events fehl, wird ab dem Cursor
+# neu gelesen statt hinten angehängt – bei jedem Fehler außer den dauerhaften
+# (PERMANENT_ERRORS, z.B. Nachricht zu groß); Timeouts und Transportfehler
+# melden retriable() == False, sind hier aber genau der Ausfall, für den der
+# Spool da ist. Solange der Spool nicht leer ist (auch
+# unbestätigte Events zählen), gehen neue Events dorthin, damit die
+# Reihenfolge pro Gerät erhalten bleibt.
+
+# Zustellfehler, bei denen erneutes Senden nie hilft: der Record wird übersprungen
+PERMANENT_ERRORS = frozenset((
+    KafkaError.MSG_SIZE_TOO_LARGE,
+    KafkaError.INVALID_MSG,
+    KafkaError.INVALID_RECORD,
+    KafkaError.TOPIC_AUTHORIZATION_FAILED,
+))
+
+
+def producer_config_from_env(bootstrap):
+    """Producer-Konfiguration aus KAFKA_* Umgebungsvariablen."""
+    idempotent = os.getenv("KAFKA_IDEMPOTENCE", "true").lower() in ("1", "true", "yes")
+    config = {
+        "bootstrap.servers": bootstrap,
+        "linger.ms": int(os.getenv("KAFKA_LINGER_MS", "20")),
+        "batch.size": int(os.getenv("KAFKA_BATCH_BYTES", "131072")),
+        "batch.num.messages": int(os.getenv("KAFKA_BATCH_MESSAGES", "1000")),
+        "compression.type": os.getenv("KAFKA_COMPRESSION", "lz4"),
+        "queue.buffering.max.messages": int(os.getenv("KAFKA_QUEUE_MAX_MESSAGES", "100000")),
+        # Fehlschläge kommen nach spätestens 30 s zurück (-> Spool) statt nach 5 min
+        "message.timeout.ms": int(os.getenv("KAFKA_MESSAGE_TIMEOUT_MS", "30000")),
+        "enable.idempotence": idempotent,
+    }
+    if idempotent:
+        config["acks"] = "all"
+    return config
+
+
+class EdgePublisher:
+    def __init__(self, topic, config, payload_format=None, poll_interval=0.1, spool=None,
+                 drain_batch=None, drain_rate=None, on_delivered=None):
+        self.topic = topic
+        self.payload_format = payload_format or os.getenv("PAYLOAD_FORMAT", "json")
+        self.config = dict(config, error_cb=self._on_error)
+        self.poll_interval = poll_interval
+        self.spool = spool
+        self.drain_batch = drain_batch or int(os.getenv("SPOOL_DRAIN_BATCH", "500"))
+        self.drain_rate = drain_rate or float(os.getenv("SPOOL_DRAIN_RATE", "2000"))
+        # Callback mit der Zustell-Latenz (Sekunden) jeder erfolgreichen Nachricht
+        self.on_delivered = on_delivered
+        self.enqueued = 0
+        self.delivered = 0
+        self.failed = 0
+        self.queue_full = 0
+        self.spooled = 0
+        self.replay_rate = 0.0
+        self.broker_up = False
+        self.producer = None
+        self._create_producer()
+
+        self._running = True
+        self._poller = threading.Thread(target=self._poll_loop, daemon=True)
+        self._poller.start()
+        self._drainer = None
+        if self.spool is not None:
+            self._drainer = threading.Thread(target=self._drain_loop, daemon=True)
+            self._drainer.start()
+
+    def _create_producer(self):
+        try:
+            self.producer = create_producer(self.config)
+            self.broker_up = True
+        except Exception as e:
+            if self.spool is None:
+                raise
+            print("[EDGE] Kafka producer unavailable, spooling:", e, flush=True)
+
+    def _on_error(self, err):
+        if err.code() == KafkaError._ALL_BROKERS_DOWN:
+            if self.broker_up:
+                print("[EDGE] ⚠️ All Kafka brokers down", flush=True)
+            self.broker_up = False
+
+    def delivery_report(self, err, msg):
+        if err is not None:
+            self.failed += 1
+            sampled("delivery_failed", logging.WARNING, "Delivery failed: %s", err)
+            if self.spool is not None:
+                self._to_spool(msg.key(), content_type_from_headers(msg.headers()), msg.value())
+        else:
+            self._delivered(msg)
+
+    def _delivered(self, msg):
+        self.delivered += 1
+        self.broker_up = True
+        if self.on_delivered is not None and msg.latency() is not None:
+            self.on_delivered(msg.latency())
+        sampled("delivered", logging.DEBUG, "Delivered to %s [%d] @ offset %d",
+                msg.topic(), msg.partition(), msg.offset())
+
+    def _spool_report(self, token):
+        """Delivery report for a drained record: moves the spool cursor, never re-appends."""
+        def report(err, msg):
+            if err is None:
+                self.spool.ack(token)
+                self._delivered(msg)
+                return
+            self.failed += 1
+            sampled("delivery_failed", logging.WARNING, "Delivery of spooled event failed: %s", err)
+            if err.code() in PERMANENT_ERRORS:
+                # Nicht zustellbar (z.B. zu groß): überspringen statt den Spool zu blockieren
+                self.spool.ack(token)
+            elif self.spool.rewind(token):
+                # Ab dem Cursor erneut in Originalreihenfolge senden
+                print("[EDGE] Spool drain failed, rewinding to the last delivered event", flush=True)
+        return report
+
+    def _to_spool(self, key, content_type, value):
+        if isinstance(value, dict):
+            # PAYLOAD_FORMAT=object (TRANSPORT=inproc): für die Platte serialisieren
+            value, content_type = encode(value, "json")
+        if self.spool.append(key, content_type, value):
+            self.spooled += 1
+            return True
+        return False
+
+    def _produce(self, key, content_type, value, on_delivery=None):
+        headers = [(CONTENT_TYPE_HEADER, content_type.encode())]
+        on_delivery = on_delivery or self.delivery_report
+        try:
+            self.producer.produce(self.topic, value, key=key, headers=headers, on_delivery=on_delivery)
+        except BufferError:
+            # lokale Queue voll: einmal Callbacks abarbeiten und erneut versuchen
+            self.producer.poll(0)
+            self.producer.produce(self.topic, value, key=key, headers=headers, on_delivery=on_delivery)
+
+    def publish(self, result):
+        """Enqueue one inference result (dict); never blocks on the broker."""
+        trace = result.get("trace")
+        if trace is not None and not isinstance(trace, dict):
+            # tracing.Trace des Frames: Enqueue-Zeitpunkt stempeln, dann serialisieren
+            trace.mark("enqueue")
+            result = dict(result, trace=trace.to_dict())
+        value, content_type = encode(result, self.payload_format)
+        key = result.get("device_id")
+
+        if self.spool is not None and (not self.broker_up or self.producer is None or self.spool.depth_records):
+            return self._to_spool(key, content_type, value)
+
+        try:
+            self._produce(key, content_type, value)
+        except BufferError:
+            if self.spool is not None:
+                return self._to_spool(key, content_type, value)
+            self.queue_full += 1
+            print("[EDGE] Kafka queue full, result dropped", flush=True)
+            return False
+        self.enqueued += 1
+        return True
+
+    def queue_length(self):
+        return len(self.producer) if self.producer is not None else 0
+
+    def _poll_loop(self):
+        while self._running:
+            if self.producer is None:
+                time.sleep(self.poll_interval)
+                continue
+            self.producer.poll(self.poll_interval)
+
+    def _probe(self):
+        """Check broker reachability while it is marked down."""
+        if self.producer is None:
+            self._create_producer()
+            return
+        try:
+            self.producer.list_topics(self.topic, timeout=5)
+            self.broker_up = True
+            print("[EDGE] Kafka broker reachable again", flush=True)
+        except Exception:
+            pass
+
+    def _drain_loop(self):
+        while self._running:
+            if not self.broker_up or self.producer is None:
+                self._probe()
+                if not self.broker_up:
+                    time.sleep(5)
+                continue
+            # Nur nachschieben, wenn die Producer-Queue nicht schon voll ist
+            if not self.spool.unread_records or self.queue_length() >= self.drain_batch:
+                self.replay_rate = 0.0
+                time.sleep(0.5)
+                continue
+
+            start = time.monotonic()
+            batch = self.spool.read_batch(self.drain_batch)
+            for token, key, content_type, value in batch:
+                while True:
+                    try:
+                        self._produce(key, content_type, value, on_delivery=self._spool_report(token))
+                        break
+                    except BufferError:
+                        self.producer.poll(0.5)
+                self.enqueued += 1
+            # Rate-Limit: Batch-Größe / Rate Sekunden pro Batch
+            budget = len(batch) / self.drain_rate
+            elapsed = time.monotonic() - start
+            if elapsed < budget:
+                time.sleep(budget - elapsed)
+            self.replay_rate = len(batch) / max(time.monotonic() - start, 1e-6)
+
+    def stats(self):
+        stats = {
+            "broker_up": self.broker_up,
+            "enqueued": self.enqueued,
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "queue_full": self.queue_full,
+            "queue_length": self.queue_length(),
+        }
+        if self.spool is not None:
+            stats["spool"] = {
+                "depth_records": self.spool.depth_records,
+                "size_bytes": self.spool.size_bytes,
+                "spooled": self.spooled,
+                "replayed": self.spool.replayed,
+                "evicted": self.spool.evicted,
+                "rejected": self.spool.rejected,
+                "replay_rate": self.replay_rate,
+            }
+        return stats
+
+    def close(self, timeout=10):
+        self._running = False
+        self._poller.join(timeout=1)
+        remaining = self.producer.flush(timeout) if self.producer is not None else 0
+        if self.spool is not None:
+            self.spool.close()
+        return remaining
@@ -1,70 +1,257 @@
-import random
+"""
+Kafka load generator for the VM consumer and the broker.
+
+Simulates many edge devices producing inference events at a target
+aggregate rate. Pacing is open-loop: message i is due at start + i / rate,
+whatever the broker does, and delivery latency is measured from that due
+time, so broker back-pressure shows up as latency instead of a lower send
+rate (no coordinated omission). produce() is asynchronous; delivery reports
+are served by poll(0) between sends and a final flush().
+
+Usage:
+    PYTHONPATH=edge python edge/simulator.py --devices 5000 --rate 2000 --duration 60
+    PYTHONPATH=edge python edge/simulator.py --devices 3 --rate 0.033 --duration 0   # old behaviour
+    PYTHONPATH=edge python edge/simulator.py --transport inproc --format object --rate 50000
+
+With --transport inproc an in-process consumer drains and decodes the
+events, so the run measures the pipeline's own overhead without a broker.
+
+At the end a JSON report (achieved rate, delivery latency percentiles,
+errors) is printed or written to --output.
+"""
+
+import argparse
 import json
+import math
+import os
+import random
+import sys
+import threading
 import time
+from collections import Counter
 from datetime import datetime
-from confluent_kafka import Producer
-import sys
 
-sys.stdout.reconfigure(line_buffering=True)
+import numpy as np
 
-BOOTSTRAP = "34.67.127.119:9092"
-TOPIC = "edge-data"
+from payload import encode, decode, CONTENT_TYPE_HEADER
+from publish import producer_config_from_env
+from transport import create_producer, create_consumer, TRANSPORTS
 
-# Optional: Callback to confirm the message was delivered
-def delivery_report(err, msg):
-    if err is not None:
-        print(f"[ERROR] Message delivery failed: {err}")
-    else:
-        print(f"[SUCCESS] Message delivered to {msg.topic()} [{msg.partition()}]")
-
-producer = Producer({"bootstrap.servers": BOOTSTRAP})
-print(f"[EDGE] Kafka producer starting, bootstrap={BOOTSTRAP}")
-
-def generate_simulated_faces(intensity):
-    faces_list = []
-    num_faces = random.randint(0, intensity)
-    
-    for _ in range(num_faces):
-        width = random.uniform(0.05, 0.3)
-        height = random.uniform(0.05, 0.4)
-        xmin = random.uniform(0, 1.0 - width)
-        ymin = random.uniform(0, 1.0 - height)
-        
-        face = {
-            "conf": random.uniform(0.5, 0.99),
-            "xmin": xmin,
-            "ymin": ymin,
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Simulate a fleet of edge devices producing to Kafka.")
+    p.add_argument("--bootstrap", default=os.getenv("BOOTSTRAP_SERVERS", "34.67.127.119:9092"))
+    p.add_argument("--topic", default=os.getenv("TOPIC", "edge-data"))
+    p.add_argument("--format", default=os.getenv("PAYLOAD_FORMAT", "json"), choices=("json", "binary", "object"))
+    p.add_argument("--transport", default=os.getenv("TRANSPORT", "kafka"), choices=TRANSPORTS)
+    p.add_argument("--devices", type=int, default=3, help="Number of simulated devices.")
+    p.add_argument("--rate", type=float, default=100.0, help="Target aggregate messages per second.")
+    p.add_argument("--duration", type=float, default=60.0, help="Seconds to run, 0 = until Ctrl+C.")
+    p.add_argument("--mean-persons", type=float, default=2.0, help="Fleet-wide mean persons per event.")
+    p.add_argument("--seed", type=int, help="Random seed for reproducible runs.")
+    p.add_argument("--verbose", action="store_true", help="Print every sent payload.")
+    p.add_argument("--output", help="Write the JSON report here instead of stdout.")
+    return p.parse_args()
+
+
+class Device:
+    """One simulated camera with its own busyness that drifts over time."""
+
+    def __init__(self, index, mean_persons, rng):
+        self.device_id = f"edge-sim-{index:05d}"
+        self.rng = rng
+        # Wenige sehr belebte, viele ruhige Standorte
+        self.base = mean_persons * rng.lognormvariate(0, 0.8) / math.exp(0.32)
+        self.level = self.base
+
+    def next_payload(self):
+        # Belegung als Random Walk um den Grundwert, Personen ~ Poisson
+        self.level = max(0.0, self.level + self.rng.gauss(0, 0.3) + 0.1 * (self.base - self.level))
+        n = poisson(self.rng, self.level)
+        faces = [self.face() for _ in range(n)]
+        return {
+            "device_id": self.device_id,
+            "timestamp": datetime.utcnow().isoformat(),
+            "persons_detected": n,
+            "faces": faces,
+        }
+
+    def face(self):
+        rng = self.rng
+        # Gesichtsgröße ~ Entfernung zur Kamera: meist klein, selten groß
+        width = min(0.6, rng.lognormvariate(math.log(0.08), 0.5))
+        height = min(0.8, width * rng.uniform(1.1, 1.4))
+        return {
+            "conf": min(0.99, max(0.3, rng.betavariate(8, 2))),
+            "xmin": rng.uniform(0, 1.0 - width),
+            "ymin": rng.uniform(0, 1.0 - height),
             "width": width,
-            "height": height
+            "height": height,
         }
-        faces_list.append(face)
-    
-    return faces_list # Return the list itself
 
-def simulate_edge_data():
+
+def poisson(rng, lam):
+    # Knuth; für die kleinen Mittelwerte hier ausreichend
+    if lam <= 0:
+        return 0
+    limit, k, p = math.exp(-min(lam, 30.0)), 0, 1.0
     while True:
-        # Intensity for randomness
-        intensity_val = random.randint(0, 10)
-        device_id = random.randint(1, 3)
-        
-        faces_data = generate_simulated_faces(intensity_val)
-        
-        payload = {
-            "device_id": f"edge-simulator-0{device_id}",
-            "timestamp": datetime.now().isoformat(),
-            "persons_detected": len(faces_data), # Actual count of generated faces
-            "faces": faces_data
-        }
-        
-        producer.produce(TOPIC, json.dumps(payload), callback=delivery_report)
-        producer.flush() # Forces the message out immediately
-        
-        print(f"[EDGE] Sent data for simulator-0{device_id} (Detected: {len(faces_data)})")
-        print("[EDGE] Sent:", payload)
-        time.sleep(30)
+        p *= rng.random()
+        if p <= limit:
+            return k
+        k += 1
 
-if __name__ == "__main__":
+
+class Stats:
+    def __init__(self):
+        self.sent = 0
+        self.delivered = 0
+        self.errors = Counter()
+        self.buffer_full = 0
+        self.max_lag = 0.0
+        self.latencies = []
+        self.consumed = 0
+        self.consume_latencies = []
+
+    def report(self, due):
+        def on_delivery(err, msg):
+            if err is not None:
+                self.errors[err.name()] += 1
+            else:
+                self.delivered += 1
+                self.latencies.append(time.perf_counter() - due)
+        return on_delivery
+
+
+def percentiles(samples):
+    if not samples:
+        return None
+    arr = np.asarray(samples) * 1000.0
+    return {
+        "p50_ms": float(np.percentile(arr, 50)),
+        "p95_ms": float(np.percentile(arr, 95)),
+        "p99_ms": float(np.percentile(arr, 99)),
+        "max_ms": float(arr.max()),
+    }
+
+
+def drain_loop(consumer, stats, stop):
+    """In-process consumer for --transport inproc: decode and time every event."""
+    while not stop.is_set() or stats.consumed < stats.sent:
+        msgs = consumer.consume(num_messages=500, timeout=0.1)
+        now = time.time()
+        for msg in msgs:
+            decode(msg.value(), msg.headers())
+            stats.consume_latencies.append(now - msg.timestamp()[1] / 1000.0)
+        stats.consumed += len(msgs)
+        if stop.is_set() and not msgs:
+            break
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    devices = [Device(i + 1, args.mean_persons, rng) for i in range(args.devices)]
+    producer = create_producer(producer_config_from_env(args.bootstrap), args.transport)
+    stats = Stats()
+    print(f"[SIM] {args.devices} devices, {args.rate} msg/s -> {args.bootstrap}/{args.topic} "
+          f"({args.transport}, {args.format})", file=sys.stderr)
+
+    stop = threading.Event()
+    drainer = None
+    if args.transport == "inproc":
+        consumer = create_consumer({}, "inproc")
+        consumer.subscribe([args.topic])
+        drainer = threading.Thread(target=drain_loop, args=(consumer, stats, stop), daemon=True)
+        drainer.start()
+
+    interval = 1.0 / args.rate
+    start = time.perf_counter()
+    end = start + args.duration if args.duration > 0 else float("inf")
+    i = 0
     try:
-        simulate_edge_data()
+        while True:
+            due = start + i * interval
+            if due >= end:
+                break
+            now = time.perf_counter()
+            if due > now:
+                # Wartezeit für Delivery-Reports nutzen
+                producer.poll(min(due - now, 0.05))
+                continue
+            stats.max_lag = max(stats.max_lag, now - due)
+
+            payload = devices[rng.randrange(len(devices))].next_payload()
+            value, content_type = encode(payload, args.format)
+            while True:
+                try:
+                    producer.produce(
+                        args.topic,
+                        value,
+                        key=payload["device_id"],
+                        headers=[(CONTENT_TYPE_HEADER, content_type.encode())],
+                        on_delivery=stats.report(due),
+                    )
+                    break
+                except BufferError:
+                    stats.buffer_full += 1
+                    producer.poll(0.05)
+            stats.sent += 1
+            i += 1
+            producer.poll(0)
+            if args.verbose:
+                print("[SIM] Sent:", payload, file=sys.stderr)
     except KeyboardInterrupt:
-        print("[EDGE] Stopping simulator...")
\ No newline at end of file
+        print("[SIM] Stopping simulator...", file=sys.stderr)
+
+    send_wall = time.perf_counter() - start
+    undelivered = producer.flush(30)
+    wall = time.perf_counter() - start
+    stop.set()
+    if drainer is not None:
+        drainer.join(30)
+    return {
+        "config": {
+            "devices": args.devices,
+            "target_rate": args.rate,
+            "duration_s": args.duration,
+            "format": args.format,
+            "transport": args.transport,
+            "topic": args.topic,
+        },
+        "sent": stats.sent,
+        "delivered": stats.delivered,
+        "undelivered_after_flush": undelivered,
+        "errors": dict(stats.errors),
+        "buffer_full": stats.buffer_full,
+        "send_wall_s": send_wall,
+        "achieved_send_rate": stats.sent / send_wall if send_wall > 0 else 0.0,
+        "achieved_delivery_rate": stats.delivered / wall if wall > 0 else 0.0,
+        "max_schedule_lag_ms": stats.max_lag * 1000.0,
+        "delivery_latency": percentiles(stats.latencies),
+        "consumed": stats.consumed if drainer is not None else None,
+        "consume_latency": percentiles(stats.consume_latencies),
+    }
+
+
+def main():
+    args = parse_args()
+    if args.rate <= 0 or args.devices <= 0:
+        print("--rate and --devices must be positive", file=sys.stderr)
+        return 1
+    if args.format == "object" and args.transport != "inproc":
+        print("--format object only works with --transport inproc", file=sys.stderr)
+        return 1
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+        print(f"[SIM] {report['achieved_send_rate']:.1f} msg/s sent, {report['delivered']} delivered -> {args.output}")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
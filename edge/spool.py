@@ -0,0 +1,292 @@
+import os
+import mmap
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+
+# ------------------------
+# Store-and-forward Spool für Edge-Events
+#
+# Append-only Segmentdateien (spool-<id>.seg) in SPOOL_DIR. Solange der
+# Broker nicht erreichbar ist, landen Events hier; nach dem Reconnect werden
+# sie in großen Batches (FIFO, damit pro Gerät in Reihenfolge) abgearbeitet.
+#
+# Record:  <I len> <I crc32> <H keylen> <H ctlen> key content_type value
+#
+# read_batch() liefert Records mit Token; der Cursor (Segment, Offset) in
+# SPOOL_DIR/cursor rückt erst mit ack(token) aus dem Delivery-Report vor, und
+# zwar nur über lückenlos bestätigte Records. Ein Crash während des Abarbeitens
+# sendet damit höchstens doppelt, verliert aber nichts. rewind() setzt das
+# Lesen nach einem Zustellfehler auf den Cursor zurück – die Records werden in
+# der ursprünglichen Reihenfolge erneut gelesen statt hinten angehängt.
+# Vollständig bestätigte Segmente werden gelöscht. Bei Überschreiten von
+# max_bytes greift die Eviction-Policy:
+#   drop-oldest – ältestes Segment verwerfen (Standard)
+#   drop-newest – neue Events ablehnen
+
+_RECORD = struct.Struct("<II")
+_FIELDS = struct.Struct("<HH")
+_CURSOR = struct.Struct("<QQ")
+CURSOR_SAVE_INTERVAL = 1.0
+
+
+class SegmentSpool:
+    def __init__(self, directory, segment_bytes=8 * 1024 * 1024, max_bytes=256 * 1024 * 1024,
+                 eviction="drop-oldest"):
+        if eviction not in ("drop-oldest", "drop-newest"):
+            raise ValueError(f"unknown spool eviction policy: {eviction}")
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.eviction = eviction
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        # Segment-Index: id -> [bytes, records]
+        self._segments = {}
+        for name in sorted(os.listdir(directory)):
+            if name.startswith("spool-") and name.endswith(".seg"):
+                seg_id = int(name[6:-4])
+                size, records = self._scan(self._path(seg_id))
+                self._segments[seg_id] = [size, records]
+
+        # Cursor: alles davor ist zugestellt; gelesen wird ab (_read_seg, _read_pos)
+        self._cursor_seg, self._cursor_pos = self._load_cursor()
+        if self._cursor_seg not in self._segments:
+            self._cursor_pos = 0
+            if self._segments:
+                self._cursor_seg = min(self._segments)
+        self._read_seg, self._read_pos = self._cursor_seg, self._cursor_pos
+        self._write_seg = max(self._segments) if self._segments else self._read_seg
+        self._writer = open(self._path(self._write_seg), "ab")
+        self._segments.setdefault(self._write_seg, [self._writer.tell(), 0])
+
+        # Gelesen, aber noch nicht bestätigt: (token, segment, Ende des Records)
+        self._inflight = deque()
+        self._acked = set()
+        self._next_token = 0
+        self._cursor_saved_at = 0.0
+
+        self.appended = 0
+        self.replayed = 0
+        self.evicted = 0
+        self.rejected = 0
+        self._pending_records = self._count_pending()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            os.getenv("SPOOL_DIR", "/tmp/edge-spool"),
+            segment_bytes=int(os.getenv("SPOOL_SEGMENT_BYTES", str(8 * 1024 * 1024))),
+            max_bytes=int(os.getenv("SPOOL_MAX_BYTES", str(256 * 1024 * 1024))),
+            eviction=os.getenv("SPOOL_EVICTION", "drop-oldest"),
+        )
+
+    # ------------------------
+    # Dateien
+
+    def _path(self, seg_id):
+        return os.path.join(self.directory, f"spool-{seg_id:012d}.seg")
+
+    def _cursor_path(self):
+        return os.path.join(self.directory, "cursor")
+
+    def _load_cursor(self):
+        try:
+            with open(self._cursor_path(), "rb") as f:
+                return _CURSOR.unpack(f.read(_CURSOR.size))
+        except (OSError, struct.error):
+            return 0, 0
+
+    def _save_cursor(self):
+        tmp = self._cursor_path() + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(_CURSOR.pack(self._cursor_seg, self._cursor_pos))
+        os.replace(tmp, self._cursor_path())
+        self._cursor_saved_at = time.monotonic()
+
+    @staticmethod
+    def _scan(path):
+        """Return (valid_bytes, records); a torn last record is cut off."""
+        size = os.path.getsize(path)
+        records, pos = 0, 0
+        if size == 0:
+            return 0, 0
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            while pos + _RECORD.size <= size:
+                length, crc = _RECORD.unpack_from(mm, pos)
+                end = pos + _RECORD.size + length
+                if end > size or zlib.crc32(mm[pos + _RECORD.size:end]) != crc:
+                    break
+                records += 1
+                pos = end
+        if pos < size:
+            with open(path, "r+b") as f:
+                f.truncate(pos)
+        return pos, records
+
+    def _count_pending(self):
+        """Unread records from the read position on."""
+        pending = 0
+        for seg_id, (size, records) in self._segments.items():
+            if seg_id > self._read_seg:
+                pending += records
+            elif seg_id == self._read_seg:
+                pending += sum(1 for _ in self._iter_records(seg_id, self._read_pos, size))
+        return pending
+
+    def _next_segment(self, seg_id):
+        return min(s for s in self._segments if s > seg_id)
+
+    def _iter_records(self, seg_id, start, end):
+        if end <= start:
+            return
+        with open(self._path(seg_id), "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = start
+            while pos + _RECORD.size <= end:
+                length, _ = _RECORD.unpack_from(mm, pos)
+                body = mm[pos + _RECORD.size:pos + _RECORD.size + length]
+                pos += _RECORD.size + length
+                key_len, ct_len = _FIELDS.unpack_from(body)
+                off = _FIELDS.size
+                key = body[off:off + key_len]
+                content_type = body[off + key_len:off + key_len + ct_len].decode("utf-8")
+                value = body[off + key_len + ct_len:]
+                yield pos, (key or None, content_type, value)
+
+    # ------------------------
+    # Schreiben
+
+    def append(self, key, content_type, value):
+        """Append one event; returns False if rejected by the drop-newest policy."""
+        if isinstance(key, str):
+            key = key.encode("utf-8")
+        key = key or b""
+        ct = (content_type or "").encode("utf-8")
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        body = _FIELDS.pack(len(key), len(ct)) + key + ct + value
+        record = _RECORD.pack(len(body), zlib.crc32(body)) + body
+
+        with self._lock:
+            while self.size_bytes + len(record) > self.max_bytes:
+                if self.eviction == "drop-newest" or not self._evict_oldest():
+                    self.rejected += 1
+                    return False
+            if self._segments[self._write_seg][0] + len(record) > self.segment_bytes:
+                self._roll()
+            self._writer.write(record)
+            self._writer.flush()
+            self._segments[self._write_seg][0] += len(record)
+            self._segments[self._write_seg][1] += 1
+            self._pending_records += 1
+            self.appended += 1
+            return True
+
+    def _roll(self):
+        self._writer.close()
+        self._write_seg += 1
+        self._writer = open(self._path(self._write_seg), "ab")
+        self._segments[self._write_seg] = [0, 0]
+
+    def _evict_oldest(self):
+        """Drop the oldest undelivered segment; False if only the active one is left."""
+        oldest = min(self._segments)
+        if oldest == self._write_seg:
+            return False
+        size, records = self._segments.pop(oldest)
+        # Bereits an den Producer übergebene Records dieses Segments nicht mehr verfolgen
+        while self._inflight and self._inflight[0][1] == oldest:
+            self._acked.discard(self._inflight.popleft()[0])
+        if oldest == self._read_seg:
+            unread = sum(1 for _ in self._iter_records(oldest, self._read_pos, size)) if self._read_pos else records
+            self._read_seg, self._read_pos = self._next_segment(oldest), 0
+        elif oldest < self._read_seg:
+            unread = 0
+        else:
+            unread = records
+        if oldest == self._cursor_seg:
+            self._cursor_seg, self._cursor_pos = self._next_segment(oldest), 0
+            self._save_cursor()
+        os.remove(self._path(oldest))
+        self.evicted += unread
+        self._pending_records -= unread
+        return True
+
+    # ------------------------
+    # Lesen / Replay
+
+    def read_batch(self, max_records=500):
+        """Return up to max_records unread (token, key, content_type, value) tuples.
+
+        The records stay in the spool until ack(token) confirms their delivery.
+        """
+        batch = []
+        with self._lock:
+            while len(batch) < max_records:
+                size = self._segments.get(self._read_seg, [0, 0])[0]
+                for pos, record in self._iter_records(self._read_seg, self._read_pos, size):
+                    self._next_token += 1
+                    self._inflight.append((self._next_token, self._read_seg, pos))
+                    batch.append((self._next_token,) + record)
+                    self._read_pos = pos
+                    if len(batch) >= max_records:
+                        break
+                if self._read_pos < size or self._read_seg == self._write_seg:
+                    break
+                self._read_seg, self._read_pos = self._next_segment(self._read_seg), 0
+            self._pending_records -= len(batch)
+        return batch
+
+    def ack(self, token):
+        """Confirm delivery; the cursor moves over every contiguously acked record."""
+        with self._lock:
+            if not self._inflight or token < self._inflight[0][0]:
+                return  # vor einem rewind() gelesen oder evicted
+            self._acked.add(token)
+            moved = False
+            while self._inflight and self._inflight[0][0] in self._acked:
+                token, seg_id, pos = self._inflight.popleft()
+                self._acked.discard(token)
+                self._cursor_seg, self._cursor_pos = seg_id, pos
+                self.replayed += 1
+                moved = True
+            # Vollständig zugestellte Segmente löschen
+            while (self._cursor_seg != self._write_seg
+                   and self._cursor_pos >= self._segments[self._cursor_seg][0]):
+                self._segments.pop(self._cursor_seg)
+                os.remove(self._path(self._cursor_seg))
+                self._cursor_seg, self._cursor_pos = self._next_segment(self._cursor_seg), 0
+            if moved and (not self._inflight or time.monotonic() - self._cursor_saved_at >= CURSOR_SAVE_INTERVAL):
+                self._save_cursor()
+
+    def rewind(self, token=None):
+        """Re-read everything after the cursor (delivery of `token` failed)."""
+        with self._lock:
+            if not self._inflight or (token is not None and token < self._inflight[0][0]):
+                return False  # schon zurückgesetzt
+            self._pending_records += len(self._inflight)
+            self._inflight.clear()
+            self._acked.clear()
+            self._read_seg, self._read_pos = self._cursor_seg, self._cursor_pos
+            return True
+
+    @property
+    def depth_records(self):
+        """Records not yet delivered (unread or waiting for their delivery report)."""
+        return self._pending_records + len(self._inflight)
+
+    @property
+    def unread_records(self):
+        return self._pending_records
+
+    @property
+    def size_bytes(self):
+        return sum(size for size, _ in self._segments.values())
+
+    def close(self):
+        with self._lock:
+            self._writer.close()
+            self._save_cursor()
@@ -0,0 +1,47 @@
+import time
+
+# ------------------------
+# Latenz-Trace eines Frames, wird als "trace" im Payload mitgeschickt
+#
+#   capture_ts    Aufnahmezeit laut Browser (Unix-Sekunden, Browser-Uhr)
+#   edge_recv_ts  Empfang auf dem Edge (Unix-Sekunden, Edge-Uhr)
+#   decode_ms / infer_ms / enqueue_ms
+#                 Abstand zum Empfang, gemessen mit time.monotonic() – unabhängig
+#                 von Uhrsprüngen (NTP) auf dem Edge
+#
+# Zeitstempel von verschiedenen Rechnern (Browser, Edge, Broker, Server) werden
+# erst auf dem Server verrechnet; dort werden negative Abstände (Uhrversatz)
+# auf 0 gesetzt und gezählt.
+
+
+class Trace:
+    __slots__ = ("capture_ts", "recv_ts", "recv_mono", "marks")
+
+    def __init__(self, capture_ts=None):
+        self.capture_ts = capture_ts
+        self.recv_ts = time.time()
+        self.recv_mono = time.monotonic()
+        self.marks = {}
+
+    def mark(self, stage):
+        self.marks[stage + "_ms"] = round((time.monotonic() - self.recv_mono) * 1000.0, 3)
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+    def to_dict(self):
+        trace = {"edge_recv_ts": self.recv_ts}
+        if self.capture_ts is not None:
+            trace["capture_ts"] = self.capture_ts
+        trace.update(self.marks)
+        return trace
+
+
+def capture_ts_from_request(req):
+    """Browser capture time in Unix seconds (form field or X-Capture-Ts header, ms), or None."""
+    value = req.form.get("capture_ts") if req.mimetype == "multipart/form-data" else None
+    value = value or req.headers.get("X-Capture-Ts")
+    try:
+        return float(value) / 1000.0 if value else None
+    except ValueError:
+        return None
@@ -0,0 +1,10 @@
+import os
+import sys
+
+# Edge und Server sind keine Pakete, ihre Module liegen direkt im Verzeichnis.
+# Nur Module mit eindeutigem Namen testen (payload.py/transport.py gibt es in
+# beiden Verzeichnissen).
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (os.path.join(ROOT, "edge"), os.path.join(ROOT, "VM", "server")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,184 @@
+import os
+
+import pytest
+
+from eventlog import EventLog
+
+
+def events(device, start, n, content_type="application/json"):
+    return [(device, float(start + i), content_type, f'{{"i": {i}}}'.encode()) for i in range(n)]
+
+
+def open_log(path, **kwargs):
+    kwargs.setdefault("fsync", False)
+    kwargs.setdefault("retention_seconds", 0)
+    return EventLog(str(path), **kwargs)
+
+
+def test_append_and_replay_in_write_order(tmp_path):
+    log = open_log(tmp_path)
+    batch = events("cam-a", 100, 3) + events("cam-b", 50, 2)
+    log.append_batch(batch)
+    log.append_batch([])
+
+    replayed = [(device, ts, ct, bytes(value)) for ts, device, ct, value in log.replay()]
+    assert replayed == batch
+    assert log.stats()["appended"] == 5
+    assert log.stats()["batches"] == 1
+    log.close()
+
+
+def test_reopen_replays_all_segments(tmp_path):
+    log = open_log(tmp_path, segment_bytes=256)
+    for i in range(10):
+        log.append_batch(events("cam", i * 10, 4))
+    log.close()
+    assert len([n for n in os.listdir(tmp_path) if n.endswith(".seg")]) > 1
+
+    log = open_log(tmp_path, segment_bytes=256)
+    assert [ts for ts, *_ in log.replay()] == [float(i * 10 + j) for i in range(10) for j in range(4)]
+    # Weiterschreiben hängt an das letzte Segment an
+    log.append_batch(events("cam", 1000, 1))
+    assert [ts for ts, *_ in log.replay()][-1] == 1000.0
+    log.close()
+
+
+def test_torn_tail_is_truncated(tmp_path):
+    log = open_log(tmp_path)
+    log.append_batch(events("cam", 0, 3))
+    log.close()
+    seg = os.path.join(tmp_path, "log-000000000000.seg")
+    good_size = os.path.getsize(seg)
+
+    # Crash mitten im Schreiben: halber Record am Ende
+    with open(seg, "rb") as f:
+        record = f.read()[:good_size // 3]
+    with open(seg, "ab") as f:
+        f.write(record[:len(record) // 2])
+
+    log = open_log(tmp_path)
+    assert os.path.getsize(seg) == good_size
+    assert [ts for ts, *_ in log.replay()] == [0.0, 1.0, 2.0]
+    log.append_batch(events("cam", 3, 1))
+    assert [ts for ts, *_ in log.replay()] == [0.0, 1.0, 2.0, 3.0]
+    log.close()
+
+
+def test_corrupt_record_cuts_off_the_rest(tmp_path):
+    log = open_log(tmp_path)
+    log.append_batch(events("cam", 0, 3))
+    log.close()
+    seg = os.path.join(tmp_path, "log-000000000000.seg")
+    with open(seg, "r+b") as f:
+        data = bytearray(f.read())
+        data[-1] ^= 0xFF  # letzter Record: CRC passt nicht mehr
+        f.seek(0)
+        f.write(data)
+
+    log = open_log(tmp_path)
+    assert [ts for ts, *_ in log.replay()] == [0.0, 1.0]
+    assert [ts for ts, _, _ in log.read("cam")] == [0.0, 1.0]
+    log.close()
+
+
+def test_index_is_rebuilt(tmp_path):
+    log = open_log(tmp_path)
+    log.append_batch(events("cam-a", 0, 5) + events("cam-b", 0, 5))
+    log.close()
+    idx = os.path.join(tmp_path, "log-000000000000.idx")
+
+    os.remove(idx)
+    log = open_log(tmp_path)
+    assert os.path.exists(idx)
+    assert [ts for ts, _, _ in log.read("cam-a", since=1, until=4)] == [1.0, 2.0, 3.0]
+    log.close()
+
+    # Abgeschnittener Index (Crash zwischen Segment- und Index-Write)
+    with open(idx, "r+b") as f:
+        f.truncate(os.path.getsize(idx) - 3)
+    log = open_log(tmp_path)
+    assert [ts for ts, _, _ in log.read("cam-b")] == [0.0, 1.0, 2.0, 3.0, 4.0]
+    log.close()
+
+
+def test_read_by_device_and_range_across_segments(tmp_path):
+    log = open_log(tmp_path, segment_bytes=300)
+    # Verspätete Events: read() liefert pro Segment nach ts sortiert
+    log.append_batch(events("cam-a", 10, 5) + events("cam-b", 0, 5) + events("cam-a", 0, 5))
+    log.append_batch(events("cam-a", 20, 5))
+
+    got = [ts for ts, _, _ in log.read("cam-a", since=3, until=22)]
+    assert sorted(got) == [3.0, 4.0, 10.0, 11.0, 12.0, 13.0, 14.0, 20.0, 21.0]
+    values = [bytes(v) for _, _, v in log.read("cam-b", since=4)]
+    assert values == [b'{"i": 4}']
+    assert list(log.read("missing")) == []
+    log.close()
+
+
+def test_expired_segments_are_removed(tmp_path):
+    # Ein Record je Segment; abgelaufen wird nur beim Rollen und nie das aktive Segment
+    log = open_log(tmp_path, segment_bytes=1, retention_seconds=3600)
+    log.append_batch(events("cam", 0, 5))          # 1970: längst abgelaufen
+    log.append_batch(events("cam", 2 ** 32, 3))    # Zukunft
+    assert [ts for ts, *_ in log.replay()] == [float(2 ** 32 + i) for i in range(3)]
+    assert log.stats()["segments"] == 3
+    assert len([n for n in os.listdir(tmp_path) if n.endswith(".idx")]) == 3
+    log.close()
+
+
+def failing_fsync(monkeypatch, after):
+    """os.fsync raises ENOSPC from the (after + 1)-th call on."""
+    import errno
+    import eventlog
+    calls = []
+    real = os.fsync
+
+    def fsync(fd):
+        calls.append(fd)
+        if len(calls) > after:
+            raise OSError(errno.ENOSPC, "No space left on device")
+        real(fd)
+    monkeypatch.setattr(eventlog.os, "fsync", fsync)
+
+
+def test_failed_batch_is_rolled_back(tmp_path, monkeypatch):
+    log = open_log(tmp_path, fsync=True)
+    log.append_batch(events("cam", 0, 3))
+    seg = os.path.join(tmp_path, "log-000000000000.seg")
+    idx = os.path.join(tmp_path, "log-000000000000.idx")
+    sizes = os.path.getsize(seg), os.path.getsize(idx)
+
+    with monkeypatch.context() as m:
+        failing_fsync(m, after=0)
+        with pytest.raises(OSError):
+            log.append_batch(events("cam", 10, 3))
+    assert (os.path.getsize(seg), os.path.getsize(idx)) == sizes
+    assert log.stats()["appended"] == 3
+
+    # Wiederholung des Batches (Consumer hat zurückgespult): Offsets stimmen
+    log.append_batch(events("cam", 10, 3))
+    assert [ts for ts, _, _ in log.read("cam")] == [0.0, 1.0, 2.0, 10.0, 11.0, 12.0]
+    assert [bytes(v) for _, _, v in log.read("cam", since=10)] == [b'{"i": 0}', b'{"i": 1}', b'{"i": 2}']
+    log.close()
+
+    log = open_log(tmp_path)
+    assert [ts for ts, *_ in log.replay()] == [0.0, 1.0, 2.0, 10.0, 11.0, 12.0]
+    log.close()
+
+
+def test_failed_batch_across_segments_is_rolled_back(tmp_path, monkeypatch):
+    log = open_log(tmp_path, segment_bytes=200, fsync=True)
+    log.append_batch(events("cam", 0, 2))
+    segments = log.stats()["segments"]
+
+    with monkeypatch.context() as m:
+        # Erster Teil (altes Segment) geht durch, der Teil im neuen Segment nicht
+        failing_fsync(m, after=2)
+        with pytest.raises(OSError):
+            log.append_batch(events("cam", 10, 8))
+    assert log.stats()["segments"] == segments
+    assert [ts for ts, *_ in log.replay()] == [0.0, 1.0]
+
+    log.append_batch(events("cam", 10, 8))
+    assert [ts for ts, _, _ in log.read("cam", since=10)] == [float(10 + i) for i in range(8)]
+    log.close()
@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from payload import (CONTENT_TYPE_BINARY, CONTENT_TYPE_HEADER, CONTENT_TYPE_JSON, PayloadError,
+                     decode, encode)
+
+EVENT = {
+    "device_id": "cam-ä1",
+    "timestamp": "2026-01-08T19:00:00.123456",
+    "persons_detected": 3,
+    "faces": [
+        {"conf": 0.5, "xmin": 0.25, "ymin": 0.125, "width": 0.5, "height": 0.75},
+        {"conf": 1.0, "xmin": 0.0, "ymin": 0.0, "width": 1.0, "height": 1.0},
+    ],
+    "frame_seq": 42,
+    "window": {"frames": 10, "persons_mean": 1.5},
+}
+
+
+def test_binary_round_trip():
+    value, content_type = encode(EVENT, "binary")
+    assert content_type == CONTENT_TYPE_BINARY
+    assert len(value) < len(json.dumps(EVENT))
+    # Werte sind in float32 exakt darstellbar, der Vergleich ist also exakt
+    assert decode(value, [(CONTENT_TYPE_HEADER, content_type.encode())]) == EVENT
+    assert decode(value) == EVENT  # ohne Header über die Magic-Bytes
+
+
+def test_binary_track_ids_and_empty_fields():
+    event = dict(EVENT, faces=[dict(f, track_id=i) for i, f in enumerate(EVENT["faces"])])
+    assert decode(encode(event, "binary")[0]) == event
+
+    minimal = {"device_id": "cam", "timestamp": None, "persons_detected": 0, "faces": []}
+    assert decode(encode(minimal, "binary")[0]) == minimal
+
+
+def test_json_still_decodes():
+    value, content_type = encode(EVENT, "json")
+    assert content_type == CONTENT_TYPE_JSON
+    assert decode(value, [(CONTENT_TYPE_HEADER, content_type.encode())]) == EVENT
+    assert decode(value) == EVENT
+
+
+def test_binary_rejects_bad_input():
+    value, _ = encode(EVENT, "binary")
+    with pytest.raises(PayloadError):
+        decode(value[:10], [(CONTENT_TYPE_HEADER, CONTENT_TYPE_BINARY.encode())])
+    with pytest.raises(PayloadError):
+        decode(value[:2] + b"\x63" + value[3:])  # unbekannte Version
+    with pytest.raises(PayloadError):
+        encode(EVENT, "xml")
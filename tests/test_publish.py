@@ -0,0 +1,48 @@
+from confluent_kafka import KafkaError
+
+from publish import EdgePublisher
+from spool import SegmentSpool
+
+
+def make_publisher(tmp_path, monkeypatch):
+    monkeypatch.setenv("TRANSPORT", "inproc")
+    publisher = EdgePublisher("edge-topic", {}, payload_format="json")
+    # Spool erst nachträglich setzen: ohne Drain-Thread, die Reports kommen aus dem Test
+    publisher.spool = SegmentSpool(str(tmp_path / "spool"))
+    for i in range(3):
+        publisher.spool.append("cam", "application/json", f'{{"i": {i}}}'.encode())
+    return publisher
+
+
+def test_timed_out_delivery_rewinds_instead_of_dropping(tmp_path, monkeypatch):
+    publisher = make_publisher(tmp_path, monkeypatch)
+    spool = publisher.spool
+    batch = spool.read_batch(10)
+    err = KafkaError(KafkaError._MSG_TIMED_OUT)
+    assert not err.retriable()
+
+    for token, *_ in batch:
+        publisher._spool_report(token)(err, None)
+    assert publisher.failed == 3
+    assert spool.depth_records == 3
+    assert [bytes(v) for *_, v in spool.read_batch(10)] == [bytes(v) for *_, v in batch]
+    publisher.close(0)
+
+
+def test_transport_error_keeps_the_record(tmp_path, monkeypatch):
+    publisher = make_publisher(tmp_path, monkeypatch)
+    spool = publisher.spool
+    first = spool.read_batch(10)[0]
+    publisher._spool_report(first[0])(KafkaError(KafkaError._TRANSPORT, "cannot connect"), None)
+    assert spool.depth_records == 3
+    assert bytes(spool.read_batch(1)[0][3]) == bytes(first[3])
+    publisher.close(0)
+
+
+def test_permanent_error_skips_the_record(tmp_path, monkeypatch):
+    publisher = make_publisher(tmp_path, monkeypatch)
+    spool = publisher.spool
+    first = spool.read_batch(10)[0]
+    publisher._spool_report(first[0])(KafkaError(KafkaError.MSG_SIZE_TOO_LARGE), None)
+    assert spool.depth_records == 2
+    publisher.close(0)
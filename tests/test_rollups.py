@@ -0,0 +1,88 @@
+import pytest
+
+from rollups import BUCKET_BYTES, Rollups, parse_retention
+from store import format_timestamp
+
+
+def event(device, ts, persons=1, faces=0):
+    return {"device_id": device, "timestamp": ts, "persons_detected": persons, "faces": [{}] * faces}
+
+
+def small(**kwargs):
+    return Rollups(parse_retention("10s:4"), **kwargs)
+
+
+def starts(buckets):
+    return [b["start"] for b in buckets]
+
+
+def test_bucket_values():
+    rollups = small()
+    rollups.add([event("cam", 100.0, 2, 1), event("cam", 105.0, 4, 0), event("cam", 103.0, 9, 7)])
+    [bucket] = rollups.query("cam", "10s")
+    assert bucket["start"] == format_timestamp(100.0)
+    assert (bucket["count"], bucket["sum"], bucket["min"], bucket["max"]) == (3, 15, 2, 9)
+    assert bucket["mean"] == 5.0
+    assert bucket["last"] == 4  # jüngster Zeitstempel, nicht zuletzt angekommen
+    assert bucket["face_hist"] == [1, 1, 0, 0, 0, 1]
+
+
+@pytest.mark.parametrize("batch", [1, 5, 37])
+def test_ring_wraps_and_drops_late_events(batch):
+    rollups = small()
+    events = [event("cam", 10.0 * i + 1, persons=i) for i in range(10)]
+    for i in range(0, len(events), batch):
+        rollups.add(events[i:i + batch])
+    # Nur die letzten 4 Buckets (60..99 s) sind noch im Ring
+    buckets = rollups.query("cam", "10s")
+    assert starts(buckets) == [format_timestamp(t) for t in (60.0, 70.0, 80.0, 90.0)]
+    assert [b["last"] for b in buckets] == [6, 7, 8, 9]
+
+    # Zu spät für das Fenster des Rings: verworfen, überschreibt nichts
+    rollups.add([event("cam", 5.0, persons=50)])
+    assert rollups.query("cam", "10s") == buckets
+
+    # Ein Event in einem noch gehaltenen Bucket wird mitgezählt
+    rollups.add([event("cam", 65.0, persons=50)])
+    assert rollups.query("cam", "10s")[0]["count"] == 2
+
+
+def test_vectorised_and_scalar_paths_agree():
+    events = [event("cam", 1000.0 + (i * 7919) % 300, persons=i % 11, faces=i % 8) for i in range(400)]
+    one_by_one = Rollups(parse_retention("10s:8,1m:4"))
+    for e in events:
+        one_by_one.add([e])
+    batched = Rollups(parse_retention("10s:8,1m:4"))
+    batched.add(events)
+    for resolution in ("10s", "1m"):
+        assert batched.query("cam", resolution) == one_by_one.query("cam", resolution)
+
+
+def test_select_by_bucket_start():
+    rollups = small()
+    rollups.add([event("cam", t) for t in (100.0, 110.0, 120.0)])
+    assert starts(rollups.query("cam", "10s", since=105.0)) == [format_timestamp(110.0), format_timestamp(120.0)]
+    assert starts(rollups.query("cam", "10s", since=110.0, until=120.0)) == [format_timestamp(110.0)]
+
+
+def test_window_summary_keeps_the_mean():
+    rollups = small()
+    rollups.add([{
+        "device_id": "cam", "timestamp": 110.0, "persons_detected": 3, "faces": [],
+        "window": {"start": 100.0, "end": 110.0, "seconds": 10.0, "frames": 5,
+                   "persons_min": 1, "persons_max": 4, "persons_mean": 2.5, "persons_last": 3},
+    }])
+    [bucket] = rollups.query("cam", "10s")
+    assert (bucket["count"], bucket["mean"], bucket["min"], bucket["max"], bucket["last"]) == (5, 2.5, 1, 4, 3)
+
+
+def test_least_recently_updated_device_is_evicted():
+    rollups = small(max_bytes=3 * 4 * BUCKET_BYTES)
+    for device in ("a", "b", "c"):
+        rollups.add([event(device, 100.0)])
+    rollups.add([event("a", 101.0)])
+    rollups.add([event("d", 100.0)])
+    assert rollups.devices() == ["a", "c", "d"]
+    assert rollups.nbytes <= rollups.max_bytes
+    assert rollups.stats()["evicted_devices"] == 1
+    assert rollups.query("b", "10s") == []
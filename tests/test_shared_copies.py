@@ -0,0 +1,18 @@
+import os
+
+import pytest
+
+from conftest import ROOT
+
+# Module, die Edge und Server als identische Kopie mitbringen (jedes Image
+# kopiert nur sein eigenes Verzeichnis)
+SHARED = ("payload.py", "transport.py")
+
+
+@pytest.mark.parametrize("name", SHARED)
+def test_edge_and_server_copies_are_identical(name):
+    with open(os.path.join(ROOT, "edge", name), "rb") as f:
+        edge = f.read()
+    with open(os.path.join(ROOT, "VM", "server", name), "rb") as f:
+        server = f.read()
+    assert edge == server, f"edge/{name} and VM/server/{name} differ – change both"
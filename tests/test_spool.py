@@ -0,0 +1,143 @@
+import os
+
+import pytest
+
+from spool import SegmentSpool
+
+
+def fill(spool, n, start=0):
+    for i in range(start, start + n):
+        assert spool.append(f"cam-{i % 2}", "application/json", f'{{"i": {i}}}'.encode())
+
+
+def values(batch):
+    return [bytes(value) for _, _, _, value in batch]
+
+
+def expected(lo, hi):
+    return [f'{{"i": {i}}}'.encode() for i in range(lo, hi)]
+
+
+def test_read_and_ack_in_order(tmp_path):
+    spool = SegmentSpool(str(tmp_path), segment_bytes=200)
+    fill(spool, 20)
+    assert spool.depth_records == 20
+
+    batch = spool.read_batch(8)
+    assert values(batch) == expected(0, 8)
+    assert batch[0][1] == b"cam-0" and batch[0][2] == "application/json"
+    assert spool.unread_records == 12 and spool.depth_records == 20
+
+    for token, *_ in batch:
+        spool.ack(token)
+    assert spool.depth_records == 12
+    assert values(spool.read_batch(100)) == expected(8, 20)
+    spool.close()
+
+
+def test_acked_segments_are_deleted(tmp_path):
+    spool = SegmentSpool(str(tmp_path), segment_bytes=200)
+    fill(spool, 30)
+    segments = len([n for n in os.listdir(tmp_path) if n.endswith(".seg")])
+    assert segments > 2
+    for token, *_ in spool.read_batch(100):
+        spool.ack(token)
+    assert spool.depth_records == 0
+    assert len([n for n in os.listdir(tmp_path) if n.endswith(".seg")]) == 1
+    spool.close()
+
+
+def test_cursor_only_moves_over_contiguous_acks(tmp_path):
+    spool = SegmentSpool(str(tmp_path))
+    fill(spool, 5)
+    batch = spool.read_batch(5)
+    # Delivery-Reports außer der Reihe: 1, 3, 4 bestätigt, 2 fehlt noch
+    for token, *_ in (batch[0], batch[2], batch[3]):
+        spool.ack(token)
+    assert spool.depth_records == 4
+
+    # Zustellfehler für Record 2: ab dem Cursor erneut lesen, nicht hinten anhängen
+    assert spool.rewind(batch[1][0])
+    assert not spool.rewind(batch[1][0])
+    assert values(spool.read_batch(10)) == expected(1, 5)
+    spool.ack(batch[4][0])  # Token von vor dem rewind wird ignoriert
+    assert spool.depth_records == 4
+    spool.close()
+
+
+def test_cursor_survives_restart(tmp_path):
+    spool = SegmentSpool(str(tmp_path), segment_bytes=200)
+    fill(spool, 20)
+    batch = spool.read_batch(12)
+    for token, *_ in batch[:7]:
+        spool.ack(token)
+    spool.close()
+
+    # Gelesene, aber unbestätigte Records kommen nach dem Neustart wieder
+    spool = SegmentSpool(str(tmp_path), segment_bytes=200)
+    assert spool.depth_records == 13
+    assert values(spool.read_batch(100)) == expected(7, 20)
+    fill(spool, 2, start=20)
+    assert values(spool.read_batch(100)) == expected(20, 22)
+    spool.close()
+
+
+def test_torn_tail_is_dropped_on_restart(tmp_path):
+    spool = SegmentSpool(str(tmp_path))
+    fill(spool, 3)
+    spool.close()
+    seg = os.path.join(tmp_path, "spool-000000000000.seg")
+    with open(seg, "ab") as f:
+        f.write(b"\x10\x00\x00\x00garbage")
+
+    spool = SegmentSpool(str(tmp_path))
+    assert spool.depth_records == 3
+    fill(spool, 1, start=3)
+    assert values(spool.read_batch(10)) == expected(0, 4)
+    spool.close()
+
+
+def test_drop_oldest_evicts_whole_segments(tmp_path):
+    spool = SegmentSpool(str(tmp_path), segment_bytes=200, max_bytes=600)
+    fill(spool, 40)
+    assert spool.size_bytes <= 600
+    assert spool.evicted > 0
+    assert spool.rejected == 0
+    assert spool.depth_records == 40 - spool.evicted
+
+    # Übrig bleiben die neuesten Events, weiterhin in Reihenfolge
+    got = values(spool.read_batch(100))
+    assert got == expected(40 - len(got), 40)
+    spool.close()
+
+
+def test_eviction_moves_cursor_and_inflight(tmp_path):
+    spool = SegmentSpool(str(tmp_path), segment_bytes=200, max_bytes=600)
+    fill(spool, 10)
+    batch = spool.read_batch(3)
+    fill(spool, 30, start=10)
+
+    # Die gelesenen Records wurden verworfen, ihre Delivery-Reports laufen ins Leere
+    for token, *_ in batch:
+        spool.ack(token)
+    rest = values(spool.read_batch(100))
+    assert rest == expected(40 - len(rest), 40)
+    spool.close()
+
+    spool = SegmentSpool(str(tmp_path), segment_bytes=200, max_bytes=600)
+    assert values(spool.read_batch(100)) == rest
+    spool.close()
+
+
+def test_drop_newest_rejects(tmp_path):
+    spool = SegmentSpool(str(tmp_path), segment_bytes=200, max_bytes=600, eviction="drop-newest")
+    accepted = sum(spool.append("cam", "application/json", b"x" * 20) for _ in range(40))
+    assert spool.rejected == 40 - accepted > 0
+    assert spool.evicted == 0
+    assert spool.depth_records == accepted
+    spool.close()
+
+
+def test_unknown_eviction_policy(tmp_path):
+    with pytest.raises(ValueError):
+        SegmentSpool(str(tmp_path), eviction="drop-random")
@@ -0,0 +1,87 @@
+import pytest
+
+from store import TimeSeriesStore, decode_cursor, format_timestamp
+
+
+def event(device, ts, persons=1, faces=()):
+    return {"device_id": device, "timestamp": ts, "persons_detected": persons, "faces": list(faces)}
+
+
+def page_through(store, limit, **kwargs):
+    """All rows via cursor paging, plus the number of pages."""
+    rows, cursor, pages = [], None, 0
+    while True:
+        chunks, cursor = store.query(limit=limit, cursor=cursor, **kwargs)
+        rows += [row for chunk in chunks for row in chunk.rows()]
+        pages += 1
+        if cursor is None:
+            return rows, pages
+
+
+@pytest.fixture
+def store():
+    store = TimeSeriesStore(retention_seconds=0)
+    # Gleiche Zeitstempel über Seitengrenzen hinweg, mehrere Geräte, verspätete Events
+    store.extend([event("cam-b", 100.0 + i // 3, persons=i) for i in range(10)])
+    store.extend([event("cam-a", 50.0 + i, persons=i) for i in range(5)])
+    store.extend([event("cam-a", 49.5, persons=99)])
+    return store
+
+
+def test_rows_are_sorted_per_device(store):
+    rows = list(store.rows())
+    assert [r["device_id"] for r in rows] == ["cam-a"] * 6 + ["cam-b"] * 10
+    assert rows[0]["persons_detected"] == 99
+    assert rows[0]["timestamp"] == format_timestamp(49.5)
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 4, 7, 16, 100])
+def test_paging_returns_every_row_once(store, limit):
+    rows, pages = page_through(store, limit)
+    assert rows == list(store.rows())
+    assert pages == max(1, -(-16 // limit))
+
+
+def test_paging_with_range_and_device(store):
+    expected = list(store.rows("cam-b", since=101.0, until=103.0))
+    assert [r["persons_detected"] for r in expected] == [3, 4, 5, 6, 7, 8]
+    rows, _ = page_through(store, 4, device_id="cam-b", since=101.0, until=103.0)
+    assert rows == expected
+
+
+def test_cursor_survives_trimming_and_compaction(store):
+    chunks, cursor = store.query(device_id="cam-b", limit=4)
+    assert decode_cursor(cursor) == ("cam-b", 101.0, 1)
+    # Vorne kürzen und danach so viel anhängen, dass kompaktiert wird
+    series = store._series["cam-b"]
+    series.drop_oldest(2)
+    store.extend([event("cam-b", 200.0 + i, persons=100 + i) for i in range(2000)])
+    chunks, _ = store.query(device_id="cam-b", limit=3, cursor=cursor)
+    assert [r["persons_detected"] for c in chunks for r in c.rows()] == [4, 5, 6]
+
+
+def test_invalid_cursor(store):
+    with pytest.raises(ValueError):
+        store.query(cursor="not-a-cursor")
+
+
+def test_retention_and_byte_budget():
+    store = TimeSeriesStore(retention_seconds=10, max_bytes=10 ** 9)
+    store.extend([event("cam", float(i)) for i in range(30)])
+    assert [r["timestamp"] for r in store.rows()][0] == format_timestamp(19.0)
+
+    store = TimeSeriesStore(retention_seconds=0, max_bytes=2000)
+    store.extend([event("old", float(i)) for i in range(100)])
+    store.extend([event("new", 1000.0 + i) for i in range(20)])
+    assert store.nbytes <= 2000
+    assert store.evicted > 0
+    assert len(list(store.rows("new"))) == 20
+
+
+def test_faces_keep_their_payload_values():
+    face = {"conf": 0.9, "xmin": 0.1, "ymin": 0.2, "width": 0.3, "height": 0.123456}
+    store = TimeSeriesStore(retention_seconds=0)
+    store.extend([event("cam", 1.0, faces=[face, dict(face, conf=0.5)]), event("cam", 2.0)])
+    rows = list(store.rows())
+    assert rows[0]["faces"] == [face, dict(face, conf=0.5)]
+    assert rows[1]["faces"] == []
@@ -0,0 +1,51 @@
+import threading
+import time
+
+from transport import InProcConsumer, InProcProducer
+
+
+def test_inproc_consumer_wakes_on_any_subscribed_topic():
+    consumer = InProcConsumer()
+    consumer.subscribe(["t-first", "t-second"])
+    producer = InProcProducer()
+    got = []
+
+    def consume():
+        got.extend(consumer.consume(10, timeout=5))
+
+    thread = threading.Thread(target=consume)
+    start = time.monotonic()
+    thread.start()
+    time.sleep(0.05)
+    producer.produce("t-second", {"n": 1}, key="cam")
+    thread.join(5)
+    assert [m.value() for m in got] == [{"n": 1}]
+    assert time.monotonic() - start < 1.0
+    consumer.close()
+
+
+def test_inproc_consume_times_out_and_close_wakes():
+    consumer = InProcConsumer()
+    consumer.subscribe(["t-idle"])
+    start = time.monotonic()
+    assert consumer.consume(1, timeout=0.1) == []
+    assert 0.1 <= time.monotonic() - start < 1.0
+
+    thread = threading.Thread(target=consumer.consume, args=(1, -1))
+    thread.start()
+    time.sleep(0.05)
+    consumer.close()
+    thread.join(1)
+    assert not thread.is_alive()
+
+
+def test_inproc_consume_batches_across_topics():
+    consumer = InProcConsumer()
+    consumer.subscribe(["t-a", "t-b"])
+    producer = InProcProducer()
+    for i in range(3):
+        producer.produce("t-a", i)
+        producer.produce("t-b", 10 + i)
+    assert sorted(m.value() for m in consumer.consume(10, timeout=0)) == [0, 1, 2, 10, 11, 12]
+    assert consumer.poll(0) is None
+    consumer.close()